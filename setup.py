@@ -43,6 +43,11 @@ setup(name='qpid-interop-test',
                       'shims/qpid-proton-python/src/amqp_large_content_test/Sender.py',
                      ]
                   ),
+                  ('%s/qpid-proton-python/amqp_throughput_test' % SHIM_DIR,
+                     ['shims/qpid-proton-python/src/amqp_throughput_test/Receiver.py',
+                      'shims/qpid-proton-python/src/amqp_throughput_test/Sender.py',
+                     ]
+                  ),
                   ('%s/qpid-proton-python/jms_hdrs_props_test' % SHIM_DIR,
                      ['shims/qpid-proton-python/src/jms_hdrs_props_test/Receiver.py',
                       'shims/qpid-proton-python/src/jms_hdrs_props_test/Sender.py',
@@ -68,6 +73,11 @@ setup(name='qpid-interop-test',
                       'build/amqp_large_content_test/Sender',
                      ],
                   ),
+                  ('%s/qpid-proton-cpp/amqp_throughput_test' % SHIM_DIR,
+                     ['build/amqp_throughput_test/Receiver',
+                      'build/amqp_throughput_test/Sender',
+                     ],
+                  ),
                   ('%s/qpid-proton-cpp/jms_messages_test' % SHIM_DIR,
                      ['build/jms_messages_test/Receiver',
                       'build/jms_messages_test/Sender',
@@ -50,6 +50,7 @@ import javax.json.JsonObject;
 import javax.json.JsonObjectBuilder;
 import javax.json.JsonReader;
 import javax.json.JsonWriter;
+import org.apache.qpid.interop_test.shim_utils.ShimServer;
 import org.apache.qpid.jms.JmsConnectionFactory;
 
 public class Receiver {
@@ -72,11 +73,25 @@ public class Receiver {
     JsonObjectBuilder _jsonMessageHeaderMapBuilder;
     JsonObjectBuilder _jsonMessagePropertiesMapBuilder;
     
+    // args[0]: --server (run one test for each JSON argument list read from stdin, see ShimServer)
+    // or: arguments for a single test, see runShim()
+    public static void main(String[] args) throws Exception {
+        if (ShimServer.isServerMode(args)) {
+            ShimServer.serve(new ShimServer.ShimMain() {
+                public void run(String[] testArgs) throws Exception {
+                    runShim(testArgs);
+                }
+            });
+        } else {
+            runShim(args);
+        }
+    }
+
     // args[0]: Broker URL
     // args[1]: Queue name
     // args[2]: JMS message type
     // args[3]: JSON Test parameters containing 2 maps: [testValuesMap, flagMap]
-    public static void main(String[] args) throws Exception {
+    public static void runShim(String[] args) throws Exception {
         if (args.length != 4) {
             System.out.println("JmsReceiverShim: Incorrect number of arguments");
             System.out.println("JmsReceiverShim: Expected arguments: broker_address, queue_name, JMS_msg_type, JSON_receive_params");
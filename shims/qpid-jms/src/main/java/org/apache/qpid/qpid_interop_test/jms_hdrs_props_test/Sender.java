@@ -41,6 +41,7 @@ import javax.json.Json;
 import javax.json.JsonArray;
 import javax.json.JsonObject;
 import javax.json.JsonReader;
+import org.apache.qpid.interop_test.shim_utils.ShimServer;
 import org.apache.qpid.jms.JmsConnectionFactory;
 
 public class Sender {
@@ -59,11 +60,25 @@ public class Sender {
     int _msgsSent;
     
 
+    // args[0]: --server (run one test for each JSON argument list read from stdin, see ShimServer)
+    // or: arguments for a single test, see runShim()
+    public static void main(String[] args) throws Exception {
+        if (ShimServer.isServerMode(args)) {
+            ShimServer.serve(new ShimServer.ShimMain() {
+                public void run(String[] testArgs) throws Exception {
+                    runShim(testArgs);
+                }
+            });
+        } else {
+            runShim(args);
+        }
+    }
+
     // args[0]: Broker URL
     // args[1]: Queue name
     // args[2]: JMS message type
     // args[3]: JSON Test parameters containing 3 maps: [testValueMap, testHeadersMap, testPropertiesMap]
-    public static void main(String[] args) throws Exception {
+    public static void runShim(String[] args) throws Exception {
         if (args.length != 4) {
             System.out.println("JmsSenderShim: Incorrect number of arguments");
             System.out.println("JmsSenderShim: Expected arguments: broker_address, queue_name, JMS_msg_type, JSON_send_params");
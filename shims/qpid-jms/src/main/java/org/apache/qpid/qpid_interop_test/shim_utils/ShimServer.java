@@ -0,0 +1,116 @@
+/**
+ * Licensed to the Apache Software Foundation (ASF) under one or more
+ * contributor license agreements.  See the NOTICE file distributed with
+ * this work for additional information regarding copyright ownership.
+ * The ASF licenses this file to You under the Apache License, Version 2.0
+ * (the "License"); you may not use this file except in compliance with
+ * the License.  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+package org.apache.qpid.interop_test.shim_utils;
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.io.StringReader;
+import java.io.StringWriter;
+import javax.json.Json;
+import javax.json.JsonArray;
+import javax.json.JsonObject;
+import javax.json.JsonReader;
+import javax.json.JsonWriter;
+
+/**
+ * Server mode for shims: Instead of running a single test using its command-line arguments, the shim reads one
+ * test at a time from stdin, each as a single line containing a JSON array of the command-line arguments it would
+ * otherwise have been started with. Everything the shim prints while running the test is captured, and a single
+ * line containing the JSON object {"stdout": <text>, "stderr": <text>} is then written to stdout. The server exits
+ * when stdin is closed. This saves starting a new JVM for every test.
+ */
+public class ShimServer {
+    public static final String SERVER_MODE_ARG = "--server";
+
+    public interface ShimMain {
+        void run(String[] args) throws Exception;
+    }
+
+    private static volatile boolean _testInProgress = false;
+
+    public static boolean isServerMode(String[] args) {
+        return args.length == 1 && args[0].equals(SERVER_MODE_ARG);
+    }
+
+    public static void serve(ShimMain shimMain) throws IOException {
+        final PrintStream realOut = System.out;
+        final PrintStream realErr = System.err;
+        final ByteArrayOutputStream capturedOut = new ByteArrayOutputStream();
+        final ByteArrayOutputStream capturedErr = new ByteArrayOutputStream();
+
+        // The shims call System.exit() when a test fails badly. Make sure the output of that test is still returned.
+        Runtime.getRuntime().addShutdownHook(new Thread() {
+            public void run() {
+                if (_testInProgress) {
+                    System.setOut(realOut);
+                    System.setErr(realErr);
+                    writeResponse(realOut, capturedOut, capturedErr);
+                }
+            }
+        });
+
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.trim().isEmpty()) continue;
+            JsonReader jsonReader = Json.createReader(new StringReader(line));
+            JsonArray argArray = jsonReader.readArray();
+            jsonReader.close();
+            String[] testArgs = new String[argArray.size()];
+            for (int i=0; i<argArray.size(); ++i) {
+                testArgs[i] = argArray.getString(i);
+            }
+
+            capturedOut.reset();
+            capturedErr.reset();
+            System.setOut(new PrintStream(capturedOut, true, "UTF-8"));
+            System.setErr(new PrintStream(capturedErr, true, "UTF-8"));
+            _testInProgress = true;
+            try {
+                shimMain.run(testArgs);
+            } catch (Exception exc) {
+                exc.printStackTrace(System.err);
+            } finally {
+                System.setOut(realOut);
+                System.setErr(realErr);
+            }
+            writeResponse(realOut, capturedOut, capturedErr);
+            _testInProgress = false;
+        }
+    }
+
+    protected static void writeResponse(PrintStream out, ByteArrayOutputStream capturedOut,
+                                        ByteArrayOutputStream capturedErr) {
+        try {
+            JsonObject response = Json.createObjectBuilder()
+                .add("stdout", capturedOut.toString("UTF-8"))
+                .add("stderr", capturedErr.toString("UTF-8"))
+                .build();
+            StringWriter responseWriter = new StringWriter();
+            JsonWriter jsonWriter = Json.createWriter(responseWriter);
+            jsonWriter.writeObject(response);
+            jsonWriter.close();
+            out.println(responseWriter.toString());
+            out.flush();
+        } catch (IOException exc) {
+            exc.printStackTrace(System.err);
+        }
+    }
+}
@@ -0,0 +1,81 @@
+/*
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ *
+ */
+
+#include "qpidit/LatencyHistogram.hpp"
+
+#include <sys/time.h>
+
+namespace qpidit
+{
+
+    LatencyHistogram::LatencyHistogram() : _totalCount(0) {}
+
+    LatencyHistogram::~LatencyHistogram() {}
+
+    void LatencyHistogram::record(int64_t value) {
+        _countMap[getBucketIndex(value < 0 ? 0 : uint64_t(value))]++;
+        _totalCount++;
+    }
+
+    uint64_t LatencyHistogram::getCount() const {
+        return _totalCount;
+    }
+
+    Json::Value LatencyHistogram::toJson() const {
+        Json::Value bucketList(Json::arrayValue);
+        for (std::map<uint32_t, uint64_t>::const_iterator i=_countMap.begin(); i!=_countMap.end(); ++i) {
+            Json::Value bucket(Json::arrayValue);
+            bucket.append(Json::UInt64(getBucketLowestValue(i->first)));
+            bucket.append(Json::UInt64(i->second));
+            bucketList.append(bucket);
+        }
+        return bucketList;
+    }
+
+    // static
+    uint32_t LatencyHistogram::getBucketIndex(uint64_t value) {
+        if (value < SUB_BUCKET_COUNT) {
+            return value;
+        }
+        uint32_t bitLength = 0;
+        for (uint64_t v = value; v != 0; v >>= 1) {
+            bitLength++;
+        }
+        const uint32_t shift = bitLength - SUB_BUCKET_BITS - 1;
+        return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT;
+    }
+
+    // static
+    uint64_t LatencyHistogram::getBucketLowestValue(uint32_t index) {
+        if (index < 2 * SUB_BUCKET_COUNT) {
+            return index;
+        }
+        const uint32_t shift = index / SUB_BUCKET_COUNT - 1;
+        return (index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT) << shift;
+    }
+
+    int64_t getTimeUs() {
+        struct timeval tv;
+        ::gettimeofday(&tv, 0);
+        return int64_t(tv.tv_sec) * 1000000 + tv.tv_usec;
+    }
+
+} // namespace qpidit
@@ -0,0 +1,65 @@
+/*
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ *
+ */
+
+#ifndef SRC_QPIDIT_LATENCYHISTOGRAM_HPP_
+#define SRC_QPIDIT_LATENCYHISTOGRAM_HPP_
+
+#include <map>
+#include <stdint.h>
+#include <json/value.h>
+
+namespace qpidit
+{
+
+    /**
+     * HDR-style histogram of integer latency values (microseconds) with log-linear buckets. Each power of 2 range
+     * of values is divided into SUB_BUCKET_COUNT equal buckets. This is the same bucket layout as the Python module
+     * qpid_interop_test.latency_histogram, and the histogram is returned to the test programs in the same format: a
+     * JSON array of [lowest value in bucket, count] pairs in order of value.
+     */
+    class LatencyHistogram
+    {
+    public:
+        static const uint32_t SUB_BUCKET_BITS = 5;
+        static const uint64_t SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS;
+
+    protected:
+        std::map<uint32_t, uint64_t> _countMap; // bucket index -> number of values recorded in that bucket
+        uint64_t _totalCount;
+
+    public:
+        LatencyHistogram();
+        virtual ~LatencyHistogram();
+
+        void record(int64_t value); // Negative values (from unsynchronized clocks) are recorded as 0
+        uint64_t getCount() const;
+        Json::Value toJson() const;
+
+        static uint32_t getBucketIndex(uint64_t value);
+        static uint64_t getBucketLowestValue(uint32_t index);
+    };
+
+    // Return the current time in microseconds since the epoch, as sent in the throughput test annotations
+    int64_t getTimeUs();
+
+} // namespace qpidit
+
+#endif /* SRC_QPIDIT_LATENCYHISTOGRAM_HPP_ */
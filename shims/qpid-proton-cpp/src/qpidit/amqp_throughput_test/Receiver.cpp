@@ -0,0 +1,145 @@
+/*
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ *
+ */
+
+#include "qpidit/amqp_throughput_test/Receiver.hpp"
+
+#include <iostream>
+#include <json/json.h>
+#include <stdlib.h> // exit()
+#include "proton/connection.hpp"
+#include "proton/container.hpp"
+#include "proton/default_container.hpp"
+#include "proton/delivery.hpp"
+#include "proton/message.hpp"
+#include "proton/receiver.hpp"
+#include "qpidit/QpidItErrors.hpp"
+
+namespace qpidit
+{
+    namespace amqp_throughput_test
+    {
+
+        Receiver::Receiver(const std::string& brokerAddr,
+                           const std::string& queueName,
+                           const std::string& amqpType,
+                           const Json::Value& testParams) :
+                        AmqpReceiverBase("amqp_throughput_test::Receiver", brokerAddr, queueName),
+                        _amqpType(amqpType),
+                        _size(testParams["size"].asUInt()),
+                        _lastId(0ULL),
+                        _received(0ULL),
+                        _receivedBytes(0ULL),
+                        _sizeErrors(0ULL),
+                        _firstSendTimeUs(0LL),
+                        _lastReceiveTimeUs(0LL),
+                        _latencyHistogram()
+        {}
+
+        Receiver::~Receiver() {}
+
+        Json::Value Receiver::getResults() const {
+            Json::Value results(Json::objectValue);
+            results["sent"] = Json::UInt64(_lastId);
+            results["received"] = Json::UInt64(_received);
+            results["bytes"] = Json::UInt64(_receivedBytes);
+            results["size_errors"] = Json::UInt64(_sizeErrors);
+            results["first_send_time"] = _firstSendTimeUs == 0LL ? Json::Value() : Json::Value(Json::Int64(_firstSendTimeUs));
+            results["last_receive_time"] = _lastReceiveTimeUs == 0LL ? Json::Value() : Json::Value(Json::Int64(_lastReceiveTimeUs));
+            results["latency"] = _latencyHistogram.toJson();
+            return results;
+        }
+
+        void Receiver::on_message(proton::delivery &d, proton::message &m) {
+            const int64_t receiveTimeUs = qpidit::getTimeUs();
+            const uint64_t id = proton::coerce<uint64_t>(m.id());
+            if (id <= _lastId) return; // ignore duplicate
+            _lastId = id;
+            const proton::value sendTime = m.message_annotations().get(proton::symbol("x-opt-qit-send-time"));
+            if (!sendTime.empty()) {
+                const int64_t sendTimeUs = proton::coerce<int64_t>(sendTime);
+                if (_firstSendTimeUs == 0LL) {
+                    _firstSendTimeUs = sendTimeUs;
+                }
+                _latencyHistogram.record(receiveTimeUs - sendTimeUs);
+            }
+            _lastReceiveTimeUs = receiveTimeUs;
+            _received++;
+            const size_t bodySize = getBodySize(m.body());
+            _receivedBytes += bodySize;
+            if (bodySize != _size) {
+                _sizeErrors++;
+            }
+            const proton::value last = m.message_annotations().get(proton::symbol("x-opt-qit-last"));
+            if (!last.empty() && proton::coerce<bool>(last)) {
+                d.receiver().close();
+                d.connection().close();
+            }
+        }
+
+        // protected
+
+        size_t Receiver::getBodySize(const proton::value& body) const {
+            if (_amqpType.compare("binary") == 0) {
+                return body.get<proton::binary>().size();
+            }
+            if (_amqpType.compare("string") == 0) {
+                return body.get<std::string>().size();
+            }
+            throw qpidit::UnknownAmqpTypeError(_amqpType);
+        }
+
+    } /* namespace amqp_throughput_test */
+} /* namespace qpidit */
+
+
+/*
+ * --- main ---
+ * Args: 1: Broker address (ip-addr:port)
+ *       2: Queue name
+ *       3: AMQP type of message bodies
+ *       4: Test parameters as JSON string (see Sender.cpp)
+ */
+
+int main(int argc, char** argv) {
+    // TODO: improve arg management a little...
+    if (argc != 5) {
+        throw qpidit::ArgumentError("Incorrect number of arguments");
+    }
+
+    try {
+        Json::Value testParams;
+        Json::Reader jsonReader;
+        if (not jsonReader.parse(argv[4], testParams, false)) {
+            throw qpidit::JsonParserError(jsonReader);
+        }
+
+        qpidit::amqp_throughput_test::Receiver receiver(argv[1], argv[2], argv[3], testParams);
+        proton::default_container(receiver).run();
+
+        std::cout << argv[3] << std::endl;
+        Json::FastWriter fw;
+        std::cout << fw.write(receiver.getResults());
+    } catch (const std::exception& e) {
+        std::cerr << "amqp_throughput_test receiver error: " << e.what() << std::endl;
+        exit(-1);
+    }
+    exit(0);
+}
@@ -0,0 +1,63 @@
+/*
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ *
+ */
+
+#ifndef SRC_QPIDIT_AMQP_THROUGHPUT_TEST_RECEIVER_HPP_
+#define SRC_QPIDIT_AMQP_THROUGHPUT_TEST_RECEIVER_HPP_
+
+#include <json/value.h>
+#include "proton/value.hpp"
+#include "qpidit/AmqpReceiverBase.hpp"
+#include "qpidit/LatencyHistogram.hpp"
+
+namespace qpidit
+{
+    namespace amqp_throughput_test
+    {
+
+        class Receiver : public qpidit::AmqpReceiverBase
+        {
+        protected:
+            const std::string _amqpType;
+            const uint32_t _size;
+            uint64_t _lastId;
+            uint64_t _received;
+            uint64_t _receivedBytes;
+            uint64_t _sizeErrors;
+            int64_t _firstSendTimeUs;
+            int64_t _lastReceiveTimeUs;
+            qpidit::LatencyHistogram _latencyHistogram;
+        public:
+            Receiver(const std::string& brokerAddr,
+                     const std::string& queueName,
+                     const std::string& amqpType,
+                     const Json::Value& testParams);
+            virtual ~Receiver();
+
+            Json::Value getResults() const;
+            void on_message(proton::delivery &d, proton::message &m);
+        protected:
+            size_t getBodySize(const proton::value& body) const;
+        };
+
+    } /* namespace amqp_throughput_test */
+} /* namespace qpidit */
+
+#endif /* SRC_QPIDIT_AMQP_THROUGHPUT_TEST_RECEIVER_HPP_ */
@@ -0,0 +1,136 @@
+/*
+ *
+ * Licensed to the Apache Software Foundation (ASF) under one
+ * or more contributor license agreements.  See the NOTICE file
+ * distributed with this work for additional information
+ * regarding copyright ownership.  The ASF licenses this file
+ * to you under the Apache License, Version 2.0 (the
+ * "License"); you may not use this file except in compliance
+ * with the License.  You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing,
+ * software distributed under the License is distributed on an
+ * "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+ * KIND, either express or implied.  See the License for the
+ * specific language governing permissions and limitations
+ * under the License.
+ *
+ */
+
+#include "qpidit/amqp_throughput_test/Sender.hpp"
+
+#include <iostream>
+#include <json/json.h>
+#include <limits>
+#include "proton/container.hpp"
+#include "proton/default_container.hpp"
+#include "proton/connection.hpp"
+#include "proton/message.hpp"
+#include "proton/sender.hpp"
+#include "proton/tracker.hpp"
+#include "qpidit/LatencyHistogram.hpp"
+#include "qpidit/QpidItErrors.hpp"
+
+namespace qpidit
+{
+    namespace amqp_throughput_test
+    {
+
+        Sender::Sender(const std::string& brokerAddr,
+                       const std::string& queueName,
+                       const std::string& amqpType,
+                       const Json::Value& testParams) :
+                        AmqpSenderBase("amqp_throughput_test::Sender", brokerAddr, queueName, getTotalMsgs(testParams)),
+                        _amqpType(amqpType),
+                        _count(testParams["count"].asUInt()),
+                        _duration(testParams["duration"].asDouble()),
+                        _endTimeUs(0)
+        {
+            if (_count == 0 && _duration <= 0.0) {
+                throw qpidit::ArgumentError("Either a message count or a duration is required");
+            }
+            // All messages share the same body
+            if (_amqpType.compare("binary") == 0) {
+                _body = proton::binary(createTestString(testParams["size"].asUInt()));
+            } else if (_amqpType.compare("string") == 0) {
+                _body = createTestString(testParams["size"].asUInt());
+            } else {
+                throw qpidit::UnknownAmqpTypeError(_amqpType);
+            }
+        }
+
+        Sender::~Sender() {}
+
+        void Sender::on_sendable(proton::sender &s) {
+            // Send as long as there is credit: this is called again whenever more credit is granted
+            while (s.credit() > 0 && _msgsSent < _totalMsgs) {
+                const int64_t nowUs = qpidit::getTimeUs();
+                if (_endTimeUs == 0 && _duration > 0.0) {
+                    _endTimeUs = nowUs + int64_t(_duration * 1000000);
+                }
+                proton::message msg;
+                msg.id(uint64_t(_msgsSent + 1));
+                msg.body(_body);
+                msg.message_annotations().put(proton::symbol("x-opt-qit-send-time"), nowUs);
+                if (_msgsSent + 1 == _totalMsgs || (_endTimeUs != 0 && nowUs >= _endTimeUs)) {
+                    msg.message_annotations().put(proton::symbol("x-opt-qit-last"), true);
+                    _totalMsgs = _msgsSent + 1; // on_tracker_accept() closes the connection once this is accepted
+                }
+                s.send(msg);
+                _msgsSent++;
+            }
+        }
+
+        // protected
+
+        // static
+        uint32_t Sender::getTotalMsgs(const Json::Value& testParams) {
+            const uint32_t count = testParams["count"].asUInt();
+            return count > 0 ? count : std::numeric_limits<uint32_t>::max();
+        }
+
+        //static
+        std::string Sender::createTestString(uint32_t msgSizeBytes) {
+            std::string testString;
+            testString.reserve(msgSizeBytes);
+            for (uint32_t i=0; i<msgSizeBytes; ++i) {
+                testString.push_back(char('a' + (i%26)));
+            }
+            return testString;
+        }
+
+   } /* namespace amqp_throughput_test */
+} /* namespace qpidit */
+
+
+/*
+ * --- main ---
+ * Args: 1: Broker address (ip-addr:port)
+ *       2: Queue name
+ *       3: AMQP type of message bodies
+ *       4: Test parameters as JSON string: {"size": <bytes>, "count": <num messages>, "duration": <seconds>}
+ */
+
+int main(int argc, char** argv) {
+    // TODO: improve arg management a little...
+    if (argc != 5) {
+        throw qpidit::ArgumentError("Incorrect number of arguments");
+    }
+
+    try {
+        Json::Value testParams;
+        Json::Reader jsonReader;
+        if (not jsonReader.parse(argv[4], testParams, false)) {
+            throw qpidit::JsonParserError(jsonReader);
+        }
+
+        qpidit::amqp_throughput_test::Sender sender(argv[1], argv[2], argv[3], testParams);
+        proton::default_container(sender).run();
+    } catch (const std::exception& e) {
+        std::cerr << "amqp_throughput_test Sender error: " << e.what() << std::endl;
+        exit(1);
+    }
+    exit(0);
+}
@@ -23,23 +23,25 @@ AMQP large content test receiver shim for qpid-interop-test
 # under the License.
 #
 
-from json import dumps
 import os.path
 import sys
 from traceback import format_exc
 
 from proton import symbol
-from proton.handlers import MessagingHandler
 from proton.reactor import Container
+from qpid_interop_test.interop_test_errors import InteropTestError
+from qpid_interop_test.large_content import verify_body
+from qpid_interop_test.shim_utils import DeliverySettler, get_prefetch, run_shim, TimedMessagingHandler, write_results
 
-class AmqpLargeContentTestReceiver(MessagingHandler):
+class AmqpLargeContentTestReceiver(TimedMessagingHandler):
     """
     Reciver shim for AMQP dtx test
     ...
     """
     def __init__(self, broker_url, queue_name, amqp_type, num_expected_messages_str):
-        super(AmqpLargeContentTestReceiver, self).__init__()
+        super(AmqpLargeContentTestReceiver, self).__init__(prefetch=get_prefetch(), auto_accept=False)
         self.broker_url = broker_url
+        self.settler = DeliverySettler()
         self.queue_name = queue_name
         self.amqp_type = amqp_type
         self.received_value_list = []
@@ -57,74 +59,65 @@ class AmqpLargeContentTestReceiver(MessagingHandler):
 
     def on_message(self, event):
         """Event callback when a message is received by the client"""
+        self.settler.accept(event)
         if self.received < self.expected:
+            size, num_elts, _ = self.verify_message_body(event.message.body) # Raises if the content is wrong
+            size_mb = size / 1024 / 1024
             if self.amqp_type == 'binary' or self.amqp_type == 'string' or self.amqp_type == 'symbol':
-                self.received_value_list.append(self.get_str_message_size(event.message.body))
+                self.received_value_list.append(size_mb)
             else:
-                if self.amqp_type == 'list':
-                    size, num_elts = self.get_list_size(event.message.body)
-                else:
-                    size, num_elts = self.get_map_size(event.message.body)
-                if len(self.received_value_list) == 0: # list is empty
-                    self.received_value_list.append((size, [num_elts]))
-                else:
-                    found = False
-                    for last_size, last_num_elts_list in self.received_value_list:
-                        if size == last_size:
-                            last_num_elts_list.append(num_elts)
-                            found = True
-                            break
-                    if not found:
-                        self.received_value_list.append((size, [num_elts]))
+                found = False
+                for last_size, last_num_elts_list in self.received_value_list:
+                    if size_mb == last_size:
+                        last_num_elts_list.append(num_elts)
+                        found = True
+                        break
+                if not found:
+                    self.received_value_list.append((size_mb, [num_elts]))
             self.received += 1
         if self.received >= self.expected:
+            self.settler.flush()
             event.receiver.close()
             event.connection.close()
 
-    @staticmethod
-    def get_str_message_size(message):
-        """Find the size of a bytes, unicode or symbol message in MB"""
-        if isinstance(message, bytes) or isinstance(message, unicode) or isinstance(message, symbol):
-            return len(str(message)) / 1024 / 1024 # in MB
-        return None
-
-    @staticmethod
-    def get_list_size(message):
+    def verify_message_body(self, body):
         """
-        Get total size and number of elements of a uniform (all elts same size) list. Return a tuple
-        (tot_size, num_elts) where tot_size = num_elts * elt_size
+        Check that body is of the expected AMQP type and that its content (every element of a list or map) is the
+        large content test pattern. Return a tuple (tot_size, num_elts, digest), see large_content.verify_body().
         """
-        if isinstance(message, list):
-            num_elts = len(message)
-            elt_size = len(message[0])
-            return (elt_size * num_elts / 1024 / 1024, num_elts)
-        return None
-
-    @staticmethod
-    def get_map_size(message):
-        """
-        Get total size and number of elements of a uniform (all elts same size) map. Return a tuple
-        (tot_size, num_elts) where tot_size = num_elts * elt_size. Note that key size is excluded from size.
-        """
-        if isinstance(message, dict):
-            keys = message.keys()
-            num_elts = len(keys)
-            elt_size = len(message[keys[0]])
-            return (elt_size * num_elts / 1024 / 1024, num_elts)
-        return None
+        if self.amqp_type == 'binary':
+            expected_type = bytes
+        elif self.amqp_type == 'string':
+            expected_type = unicode
+        elif self.amqp_type == 'symbol':
+            expected_type = symbol
+        elif self.amqp_type == 'list':
+            expected_type = list
+        elif self.amqp_type == 'map':
+            expected_type = dict
+        else:
+            raise InteropTestError('receive: Unsupported AMQP type "%s"' % self.amqp_type)
+        if not isinstance(body, expected_type):
+            raise InteropTestError('receive: Expected body of AMQP type "%s", found %s' % (self.amqp_type, type(body)))
+        return verify_body(body)
 
 # --- main ---
 # Args: 1: Broker address (ip-addr:port)
 #       2: Queue name
 #       3: AMQP type
 #       4: Expected number of test values to receive
-try:
-    RECEIVER = AmqpLargeContentTestReceiver(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
-    Container(RECEIVER).run()
-    print sys.argv[3]
-    print dumps(RECEIVER.get_received_value_list())
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print os.path.basename(sys.argv[0]), 'EXCEPTION', exc
-    print format_exc()
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        receiver = AmqpLargeContentTestReceiver(args[0], args[1], args[2], args[3])
+        Container(receiver).run()
+        write_results(args[2], receiver.get_received_value_list())
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION', exc
+        print format_exc()
+
+run_shim(main)
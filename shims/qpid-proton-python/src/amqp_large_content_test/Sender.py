@@ -28,11 +28,12 @@ import os.path
 import sys
 from traceback import format_exc
 
-from proton import Message, symbol
-from proton.handlers import MessagingHandler
+from proton import Message
 from proton.reactor import Container
+from qpid_interop_test.large_content import PatternFactory
+from qpid_interop_test.shim_utils import run_shim, SendingEngine, TimedMessagingHandler
 
-class AmqpLargeContentTestSender(MessagingHandler):
+class AmqpLargeContentTestSender(TimedMessagingHandler):
     """
     Sender shim for AMQP dtx test
     ...
@@ -42,10 +43,21 @@ class AmqpLargeContentTestSender(MessagingHandler):
         self.broker_url = broker_url
         self.queue_name = queue_name
         self.amqp_type = amqp_type
-        self.test_value_list = test_value_list
-        self.sent = 0
-        self.confirmed = 0
-        self.total = len(self.test_value_list)
+        # List of (total size in bytes, number of elements) for each message to be sent. A test value is either a
+        # total size in MB (one message) or a list [total size in MB, [num elements, ...]] (one message per number of
+        # elements).
+        self.message_list = []
+        for test_value in test_value_list:
+            if isinstance(test_value, list):
+                tot_size_str, num_elts_str_list = test_value
+            else:
+                tot_size_str = test_value
+                num_elts_str_list = ['1']
+            for num_elts_str in num_elts_str_list:
+                self.message_list.append((1024 * 1024 * int(tot_size_str), int(num_elts_str)))
+        self.payload_factory = PatternFactory()
+        self.send_engine = SendingEngine(len(self.message_list),
+                                         lambda index: self.create_message(*self.message_list[index]))
 
     def on_start(self, event):
         """Event callback for when the client starts"""
@@ -54,22 +66,8 @@ class AmqpLargeContentTestSender(MessagingHandler):
 
     def on_sendable(self, event):
         """Event callback for when send credit is received, allowing the sending of messages"""
-        if self.sent == 0:
-            for test_value in self.test_value_list:
-                if event.sender.credit:
-                    if isinstance(test_value, list):
-                        tot_size_str, num_elts_str_list = test_value
-                    else:
-                        tot_size_str = test_value
-                        num_elts_str_list = ['1']
-                    for num_elts_str in num_elts_str_list:
-                        message = self.create_message(1024 * 1024 * int(tot_size_str), int(num_elts_str))
-                        if message is not None:
-                            event.sender.send(message)
-                            self.sent += 1
-                        else:
-                            event.connection.close()
-                            return
+        if not self.send_engine.send(event.sender):
+            event.connection.close()
 
     def create_message(self, tot_size_bytes, num_elts):
         """
@@ -77,53 +75,40 @@ class AmqpLargeContentTestSender(MessagingHandler):
         AMQP value.
         """
         if self.amqp_type == 'binary':
-            return Message(body=bytes(AmqpLargeContentTestSender.create_test_string(tot_size_bytes)))
+            return Message(body=self.payload_factory.get_bytes(tot_size_bytes))
         if self.amqp_type == 'string':
-            return Message(body=unicode(AmqpLargeContentTestSender.create_test_string(tot_size_bytes)))
+            return Message(body=self.payload_factory.get_unicode(tot_size_bytes))
         if self.amqp_type == 'symbol':
-            return Message(body=symbol(AmqpLargeContentTestSender.create_test_string(tot_size_bytes)))
+            return Message(body=self.payload_factory.get_symbol(tot_size_bytes))
         if self.amqp_type == 'list':
-            return Message(body=AmqpLargeContentTestSender.create_test_list(tot_size_bytes, num_elts))
+            return Message(body=self.create_test_list(tot_size_bytes, num_elts))
         if self.amqp_type == 'map':
-            return Message(body=AmqpLargeContentTestSender.create_test_map(tot_size_bytes, num_elts))
+            return Message(body=self.create_test_map(tot_size_bytes, num_elts))
         return None
 
-    @staticmethod
-    def create_test_string(size_bytes):
-        """Create a string "abcdef..." (repeating lowercase only) of size bytes"""
-        test_str = ''
-        for num in range(size_bytes):
-            test_str += chr(ord('a') + (num%26))
-        return test_str
-
-    @staticmethod
-    def create_test_list(tot_size_bytes, num_elts):
-        """Create a list containing num_elts with a sum of all elements being tot_size_bytes"""
-        size_per_elt_bytes = tot_size_bytes / num_elts
-        test_list = []
-        for _ in range(num_elts):
-            test_list.append(unicode(AmqpLargeContentTestSender.create_test_string(size_per_elt_bytes)))
-        return test_list
+    def create_test_list(self, tot_size_bytes, num_elts):
+        """
+        Create a list containing num_elts with a sum of all elements being tot_size_bytes. All the elements are the
+        same (shared) string object.
+        """
+        return [self.payload_factory.get_unicode(tot_size_bytes / num_elts)] * num_elts
 
-    @staticmethod
-    def create_test_map(tot_size_bytes, num_elts):
-        """Create a map containing num_elts with a sum of all elements being tot_size_bytes (excluding keys)"""
-        size_per_elt_bytes = tot_size_bytes / num_elts
-        test_map = {}
-        for elt_no in range(num_elts):
-            test_map[unicode('elt_%06d' % elt_no)] = \
-                unicode(AmqpLargeContentTestSender.create_test_string(size_per_elt_bytes))
-        return test_map
+    def create_test_map(self, tot_size_bytes, num_elts):
+        """
+        Create a map containing num_elts with a sum of all elements being tot_size_bytes (excluding keys). All the
+        values are the same (shared) string object.
+        """
+        elt = self.payload_factory.get_unicode(tot_size_bytes / num_elts)
+        return dict((unicode('elt_%06d' % elt_no), elt) for elt_no in range(num_elts))
 
     def on_accepted(self, event):
         """Event callback for when a sent message is accepted by the broker"""
-        self.confirmed += 1
-        if self.confirmed == self.total:
+        if not self.send_engine.on_accepted(event.sender) or self.send_engine.is_complete():
             event.connection.close()
 
     def on_disconnected(self, event):
         """Event callback for when the broker disconnects with the client"""
-        self.sent = self.confirmed
+        self.send_engine.rewind()
 
 
 # --- main ---
@@ -131,12 +116,17 @@ class AmqpLargeContentTestSender(MessagingHandler):
 #       2: Queue name
 #       3: AMQP type
 #       4: Test value(s) as JSON string
-try:
-    SENDER = AmqpLargeContentTestSender(sys.argv[1], sys.argv[2], sys.argv[3], loads(sys.argv[4]))
-    Container(SENDER).run()
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print os.path.basename(sys.argv[0]), 'EXCEPTION:', exc
-    print format_exc()
-        
\ No newline at end of file
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        sender = AmqpLargeContentTestSender(args[0], args[1], args[2], loads(args[3]))
+        Container(sender).run()
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION:', exc
+        print format_exc()
+
+run_shim(main)
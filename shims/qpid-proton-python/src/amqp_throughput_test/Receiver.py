@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+AMQP throughput test receiver shim for qpid-interop-test
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import loads
+import os.path
+import sys
+from traceback import format_exc
+
+from proton import symbol
+from proton.reactor import Container
+from qpid_interop_test.latency_histogram import LatencyHistogram
+from qpid_interop_test.shim_utils import DeliverySettler, get_prefetch, get_time_us, LAST_MESSAGE_ANNOTATION, \
+                                         run_shim, SEND_TIME_ANNOTATION, TimedMessagingHandler, write_results
+
+class AmqpThroughputTestReceiver(TimedMessagingHandler):
+    """
+    Receiver shim for AMQP throughput test
+    This shim receives messages until the message marked with annotation LAST_MESSAGE_ANNOTATION. For each message,
+    the latency from the time in annotation SEND_TIME_ANNOTATION is recorded. A JSON map of the results is returned:
+    "sent" (id of the last message, which is the number of messages sent), "received" (number of messages
+    received), "bytes" (total size of the message bodies received), "size_errors" (number of message bodies not of
+    the expected size), "first_send_time" and "last_receive_time" (microseconds since the epoch) and "latency"
+    (LatencyHistogram of the latencies in microseconds, see LatencyHistogram.to_list()).
+    """
+    def __init__(self, broker_url, queue_name, amqp_type, test_params):
+        super(AmqpThroughputTestReceiver, self).__init__(prefetch=get_prefetch(), auto_accept=False)
+        self.broker_url = broker_url
+        self.settler = DeliverySettler()
+        self.queue_name = queue_name
+        self.amqp_type = amqp_type
+        self.size = test_params['size']
+        self.last_id = 0
+        self.received = 0
+        self.received_bytes = 0
+        self.size_errors = 0
+        self.first_send_time_us = None
+        self.last_receive_time_us = None
+        self.latency_histogram = LatencyHistogram()
+
+    def get_results(self):
+        """Return the JSON-compatible map of test results"""
+        return {'sent': self.last_id,
+                'received': self.received,
+                'bytes': self.received_bytes,
+                'size_errors': self.size_errors,
+                'first_send_time': self.first_send_time_us,
+                'last_receive_time': self.last_receive_time_us,
+                'latency': self.latency_histogram.to_list()}
+
+    def on_start(self, event):
+        """Event callback for when the client starts"""
+        connection = event.container.connect(url=self.broker_url, sasl_enabled=False)
+        event.container.create_receiver(connection, source=self.queue_name)
+
+    def on_message(self, event):
+        """Event callback when a message is received by the client"""
+        receive_time_us = get_time_us()
+        self.settler.accept(event)
+        message = event.message
+        if message.id <= self.last_id:
+            return # ignore duplicate message
+        self.last_id = message.id
+        annotations = message.annotations if message.annotations is not None else {}
+        send_time_us = annotations.get(symbol(SEND_TIME_ANNOTATION))
+        if send_time_us is not None:
+            if self.first_send_time_us is None:
+                self.first_send_time_us = send_time_us
+            self.latency_histogram.record(receive_time_us - send_time_us)
+        self.last_receive_time_us = receive_time_us
+        self.received += 1
+        body_size = len(message.body) if message.body is not None else 0
+        self.received_bytes += body_size
+        if body_size != self.size:
+            self.size_errors += 1
+        if annotations.get(symbol(LAST_MESSAGE_ANNOTATION), False):
+            self.settler.flush()
+            event.receiver.close()
+            event.connection.close()
+
+# --- main ---
+# Args: 1: Broker address (ip-addr:port)
+#       2: Queue name
+#       3: AMQP type of message bodies
+#       4: Test parameters as JSON string (see Sender.py)
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        receiver = AmqpThroughputTestReceiver(args[0], args[1], args[2], loads(args[3]))
+        Container(receiver).run()
+        write_results(args[2], receiver.get_results())
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION', exc
+        print format_exc()
+
+run_shim(main)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+AMQP throughput test sender shim for qpid-interop-test
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import loads
+import os.path
+import sys
+from traceback import format_exc
+
+from proton import Message, symbol
+from proton.reactor import Container
+from qpid_interop_test.interop_test_errors import InteropTestError
+from qpid_interop_test.large_content import create_pattern
+from qpid_interop_test.shim_utils import get_time_us, LAST_MESSAGE_ANNOTATION, run_shim, SEND_TIME_ANNOTATION, \
+                                         SendingEngine, TimedMessagingHandler
+
+class AmqpThroughputTestSender(TimedMessagingHandler):
+    """
+    Sender shim for AMQP throughput test
+    This shim receives the AMQP type of the message bodies and a JSON map of test parameters: "size" (body size in
+    bytes), "count" (number of messages, 0 for no limit) and "duration" (seconds to send for, 0 for no limit). It
+    sends messages as fast as link credit allows until either limit is reached. Each message carries its sequence
+    number as its id and the time at which it was sent in annotation SEND_TIME_ANNOTATION. The last message is
+    marked with annotation LAST_MESSAGE_ANNOTATION. There is no returned value.
+    """
+    def __init__(self, broker_url, queue_name, amqp_type, test_params):
+        super(AmqpThroughputTestSender, self).__init__()
+        self.broker_url = broker_url
+        self.queue_name = queue_name
+        self.count = test_params['count']
+        self.duration = test_params['duration']
+        if self.count <= 0 and self.duration <= 0:
+            raise InteropTestError('send: Either a message count or a duration is required')
+        # All messages share the same body object
+        if amqp_type == 'binary':
+            self.body = create_pattern(test_params['size'])
+        elif amqp_type == 'string':
+            self.body = create_pattern(test_params['size']).decode('ascii')
+        else:
+            raise InteropTestError('send: Unsupported AMQP type "%s"' % amqp_type)
+        self.end_time_us = None
+        self.send_engine = SendingEngine(self.count if self.count > 0 else sys.maxint, self.create_message)
+
+    def on_start(self, event):
+        """Event callback for when the client starts"""
+        connection = event.container.connect(url=self.broker_url, sasl_enabled=False)
+        event.container.create_sender(connection, target=self.queue_name)
+
+    def on_sendable(self, event):
+        """Event callback for when send credit is received, allowing the sending of messages"""
+        if not self.send_engine.send(event.sender):
+            event.connection.close()
+
+    def create_message(self, index):
+        """
+        Create message index of the test. It is the last message if it is message count of the test, or if the
+        test duration has elapsed.
+        """
+        now_us = get_time_us()
+        if self.end_time_us is None and self.duration > 0:
+            self.end_time_us = now_us + long(self.duration * 1000000)
+        annotations = {symbol(SEND_TIME_ANNOTATION): now_us}
+        if index + 1 == self.count or (self.end_time_us is not None and now_us >= self.end_time_us):
+            annotations[symbol(LAST_MESSAGE_ANNOTATION)] = True
+            self.send_engine.truncate(index + 1)
+        return Message(id=(index+1), body=self.body, annotations=annotations)
+
+    def on_accepted(self, event):
+        """Event callback for when a sent message is accepted by the broker"""
+        if not self.send_engine.on_accepted(event.sender) or self.send_engine.is_complete():
+            event.connection.close()
+
+    def on_disconnected(self, event):
+        """Event callback for when the broker disconnects with the client"""
+        self.send_engine.rewind()
+
+
+# --- main ---
+# Args: 1: Broker address (ip-addr:port)
+#       2: Queue name
+#       3: AMQP type of message bodies
+#       4: Test parameters as JSON string: {"size": <bytes>, "count": <num messages>, "duration": <seconds>}
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        sender = AmqpThroughputTestSender(args[0], args[1], args[2], loads(args[3]))
+        Container(sender).run()
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION:', exc
+        print format_exc()
+
+run_shim(main)
@@ -26,106 +26,155 @@ AMQP type test receiver shim for qpid-interop-test
 # Issues:
 # * Capturing errors from client or broker
 
-from json import dumps
+from json import loads
 import os.path
 from string import digits, letters, punctuation
 from struct import pack, unpack
 import sys
 from traceback import format_exc
 
-from proton.handlers import MessagingHandler
 from proton.reactor import Container
+from qpid_interop_test.shim_protocol import AGGREGATE_TEST_KEY
+from qpid_interop_test.shim_utils import DeliverySettler, get_prefetch, LatencyRecorder, run_shim, \
+                                         TimedMessagingHandler, write_results, write_value
 
-class AmqpTypesTestReceiver(MessagingHandler):
+class AmqpTypesTestReceiver(TimedMessagingHandler):
     """
     Reciver shim for AMQP types test
     This shim receives the number of messages supplied on the command-line and checks that they contain message
     bodies of the exptected AMQP type. The values are then aggregated and returned.
+
+    In aggregate mode (AMQP type AGGREGATE_TEST_KEY), the number of messages is instead a JSON map of AMQP type to
+    number of expected messages. The messages of each type are received from their own queue named
+    <queue name>.<AMQP type>, all over a single connection, and a map of AMQP type to received value list is returned.
+
+    Except in aggregate mode, each value is also streamed to the test program as soon as it is received (see
+    write_value()). In latency mode, a histogram of message latencies is also returned (see LatencyRecorder).
     """
     def __init__(self, broker_url, queue_name, amqp_type, num_expected_messages_str):
-        super(AmqpTypesTestReceiver, self).__init__()
+        super(AmqpTypesTestReceiver, self).__init__(prefetch=get_prefetch(), auto_accept=False)
         self.broker_url = broker_url
-        self.queue_name = queue_name
-        self.received_value_list = []
-        self.amqp_type = amqp_type
-        self.expected = int(num_expected_messages_str)
-        self.received = 0
+        self.settler = DeliverySettler()
+        self.latency_recorder = LatencyRecorder()
+        self.aggregate = amqp_type == AGGREGATE_TEST_KEY
+        # Map of source queue name to AMQP type of the messages received from that queue
+        if self.aggregate:
+            self.expected_map = loads(num_expected_messages_str)
+            self.source_map = dict(('%s.%s' % (queue_name, key), key) for key in self.expected_map)
+        else:
+            self.expected_map = {amqp_type: int(num_expected_messages_str)}
+            self.source_map = {queue_name: amqp_type}
+        self.received_value_map = dict((key, []) for key in self.expected_map)
+        self.received_map = dict((key, 0) for key in self.expected_map)
+        self.completed = 0
 
-    def get_received_value_list(self):
-        """Return the received list of AMQP values"""
-        return self.received_value_list
+    def get_received_values(self):
+        """
+        Return the received list of AMQP values, or in aggregate mode, the map of AMQP type to received value list
+        """
+        if self.aggregate:
+            return self.received_value_map
+        return self.received_value_map.values()[0]
 
     def on_start(self, event):
         """Event callback for when the client starts"""
         connection = event.container.connect(url=self.broker_url, sasl_enabled=False)
-        event.container.create_receiver(connection, source=self.queue_name)
+        for source in sorted(self.source_map):
+            event.container.create_receiver(connection, source=source)
 
     def on_message(self, event):
         """Event callback when a message is received by the client"""
-        if event.message.id and event.message.id < self.received:
+        self.settler.accept(event)
+        amqp_type = self.source_map[event.receiver.source.address]
+        expected = self.expected_map[amqp_type]
+        if event.message.id and event.message.id < self.received_map[amqp_type]:
             return # ignore duplicate message
-        if self.received < self.expected:
-            if self.amqp_type == 'null' or \
-               self.amqp_type == 'boolean' or \
-               self.amqp_type == 'uuid':
-                self.received_value_list.append(str(event.message.body))
-            elif self.amqp_type == 'ubyte' or \
-               self.amqp_type == 'ushort' or \
-               self.amqp_type == 'byte' or \
-               self.amqp_type == 'short' or \
-               self.amqp_type == 'int':
-                self.received_value_list.append(hex(event.message.body))
-            elif self.amqp_type == 'uint' or \
-               self.amqp_type == 'ulong' or \
-               self.amqp_type == 'long' or \
-               self.amqp_type == 'timestamp':
-                hex_str = hex(int(event.message.body))
-                if len(hex_str) == 19 and hex_str[-1] == 'L':
-                    self.received_value_list.append(hex_str[:-1]) # strip trailing 'L' if present on some ulongs
-                else:
-                    self.received_value_list.append(hex_str)
-            elif self.amqp_type == 'float':
-                self.received_value_list.append('0x%08x' % unpack('!L', pack('!f', event.message.body))[0])
-            elif self.amqp_type == 'double':
-                self.received_value_list.append('0x%016x' % unpack('!Q', pack('!d', event.message.body))[0])
-            elif self.amqp_type == 'decimal32':
-                self.received_value_list.append('0x%08x' % event.message.body)
-            elif self.amqp_type == 'decimal64':
-                self.received_value_list.append('0x%016x' % event.message.body)
-            elif self.amqp_type == 'decimal128':
-                self.received_value_list.append('0x' + ''.join(['%02x' % ord(c) for c in event.message.body]).strip())
-            elif self.amqp_type == 'char':
-                if ord(event.message.body) < 0x80 and event.message.body in digits + letters + punctuation + " ":
-                    self.received_value_list.append(event.message.body)
-                else:
-                    self.received_value_list.append(hex(ord(event.message.body)))
-            elif self.amqp_type == 'binary' or \
-                 self.amqp_type == 'string' or \
-                 self.amqp_type == 'symbol':
-                self.received_value_list.append(event.message.body)
-            elif self.amqp_type == 'list' or \
-                 self.amqp_type == 'map':
-                self.received_value_list.append(event.message.body)
-            else:
-                print 'receive: Unsupported AMQP type "%s"' % self.amqp_type
+        if self.received_map[amqp_type] < expected:
+            self.latency_recorder.record(event.message)
+            received_value = self.decode_value(amqp_type, event.message.body)
+            if received_value is None:
+                print 'receive: Unsupported AMQP type "%s"' % amqp_type
                 return
-            self.received += 1
-        if self.received >= self.expected:
+            self.received_value_map[amqp_type].append(received_value)
+            if not self.aggregate:
+                write_value(received_value)
+            self.received_map[amqp_type] += 1
+            if self.received_map[amqp_type] == expected:
+                self.completed += 1
+        if self.received_map[amqp_type] >= expected:
+            self.settler.flush()
             event.receiver.close()
-            event.connection.close()
+            if self.completed == len(self.expected_map):
+                event.connection.close()
+
+    @staticmethod
+    def decode_value(amqp_type, body):
+        """
+        Return the value of message body of type amqp_type in the format used to compare it with the sent value, or
+        None if amqp_type is not supported
+        """
+        if amqp_type == 'null' or \
+           amqp_type == 'boolean' or \
+           amqp_type == 'uuid':
+            return str(body)
+        elif amqp_type == 'ubyte' or \
+           amqp_type == 'ushort' or \
+           amqp_type == 'byte' or \
+           amqp_type == 'short' or \
+           amqp_type == 'int':
+            return hex(body)
+        elif amqp_type == 'uint' or \
+           amqp_type == 'ulong' or \
+           amqp_type == 'long' or \
+           amqp_type == 'timestamp':
+            hex_str = hex(int(body))
+            if len(hex_str) == 19 and hex_str[-1] == 'L':
+                return hex_str[:-1] # strip trailing 'L' if present on some ulongs
+            else:
+                return hex_str
+        elif amqp_type == 'float':
+            return '0x%08x' % unpack('!L', pack('!f', body))[0]
+        elif amqp_type == 'double':
+            return '0x%016x' % unpack('!Q', pack('!d', body))[0]
+        elif amqp_type == 'decimal32':
+            return '0x%08x' % body
+        elif amqp_type == 'decimal64':
+            return '0x%016x' % body
+        elif amqp_type == 'decimal128':
+            return '0x' + ''.join(['%02x' % ord(c) for c in body]).strip()
+        elif amqp_type == 'char':
+            if ord(body) < 0x80 and body in digits + letters + punctuation + " ":
+                return body
+            else:
+                return hex(ord(body))
+        elif amqp_type == 'binary' or \
+             amqp_type == 'string' or \
+             amqp_type == 'symbol':
+            return body
+        elif amqp_type == 'list' or \
+             amqp_type == 'map':
+            return body
+        return None
 
 # --- main ---
 # Args: 1: Broker address (ip-addr:port)
 #       2: Queue name
 #       3: AMQP type
 #       4: Expected number of test values to receive
-try:
-    RECEIVER = AmqpTypesTestReceiver(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
-    Container(RECEIVER).run()
-    print sys.argv[3]
-    print dumps(RECEIVER.get_received_value_list())
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print os.path.basename(sys.argv[0]), 'EXCEPTION', exc
-    print format_exc()
+#       (or if 3 is "aggregate", 4 is a JSON map of AMQP type to expected number of test values, see
+#        AmqpTypesTestReceiver)
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        receiver = AmqpTypesTestReceiver(args[0], args[1], args[2], args[3])
+        Container(receiver).run()
+        write_results(args[2], receiver.get_received_values(), *receiver.latency_recorder.get_result_list())
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION', exc
+        print format_exc()
+
+run_shim(main)
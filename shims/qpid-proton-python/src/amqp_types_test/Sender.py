@@ -35,112 +35,122 @@ from uuid import UUID
 
 from proton import byte, char, decimal32, decimal64, decimal128, float32, int32, Message, short, symbol, timestamp, \
                    ubyte, uint, ulong, ushort
-from proton.handlers import MessagingHandler
 from proton.reactor import Container
+from qpid_interop_test.shim_protocol import AGGREGATE_TEST_KEY
+from qpid_interop_test.shim_utils import run_shim, SendingEngine, TimedMessagingHandler
 
-class AmqpTypesTestSender(MessagingHandler):
+class AmqpTypesTestSender(TimedMessagingHandler):
     """
     Sender shim for AMQP types test
     This shim receives the AMQP type and a list of test values. Each value is sent in a message body of the appropriate
     AMQP type. There is no returned value.
+
+    In aggregate mode (AMQP type AGGREGATE_TEST_KEY), the test values are instead a map of AMQP type to list of test
+    values. The values of each type are sent to their own queue named <queue name>.<AMQP type>, all over a single
+    connection.
+
+    Messages are sent as link credit allows (see qpid_interop_test.shim_utils.SendingEngine), so that sending resumes
+    when more credit is granted rather than stopping once the initial credit is used.
     """
-    def __init__(self, broker_url, queue_name, amqp_type, test_value_list):
+    def __init__(self, broker_url, queue_name, amqp_type, test_values):
         super(AmqpTypesTestSender, self).__init__()
         self.broker_url = broker_url
-        self.queue_name = queue_name
-        self.amqp_type = amqp_type
-        self.test_value_list = test_value_list
-        self.sent = 0
-        self.confirmed = 0
-        self.total = len(test_value_list)
+        # Map of target queue name to (AMQP type, list of test values) to be sent to that queue
+        if amqp_type == AGGREGATE_TEST_KEY:
+            self.target_map = dict(('%s.%s' % (queue_name, key), (key, val)) for key, val in test_values.iteritems())
+        else:
+            self.target_map = {queue_name: (amqp_type, test_values)}
+        # Map of target queue name to the SendingEngine which sends the test values to that queue
+        self.send_engine_map = dict((target, self.create_send_engine(amqp_type, test_value_list))
+                                    for target, (amqp_type, test_value_list) in self.target_map.iteritems())
+
+    def create_send_engine(self, amqp_type, test_value_list):
+        """Create the SendingEngine which sends a message for each value in test_value_list"""
+        return SendingEngine(len(test_value_list),
+                             lambda index: self.create_message(amqp_type, test_value_list[index], index+1))
 
     def on_start(self, event):
         """Event callback for when the client starts"""
         connection = event.container.connect(url=self.broker_url, sasl_enabled=False)
-        event.container.create_sender(connection, target=self.queue_name)
+        for target in sorted(self.target_map):
+            event.container.create_sender(connection, target=target)
 
     def on_sendable(self, event):
         """Event callback for when send credit is received, allowing the sending of messages"""
-        if self.sent == 0:
-            for test_value in self.test_value_list:
-                if event.sender.credit:
-                    message = self.create_message(test_value)
-                    if message is not None:
-                        event.sender.send(message)
-                        self.sent += 1
-                    else:
-                        event.connection.close()
-                        return
-
-    def create_message(self, test_value):
+        if not self.send_engine_map[event.sender.target.address].send(event.sender):
+            event.connection.close()
+
+    def create_message(self, amqp_type, test_value, msg_id):
         """
         Creates a single message with the test value translated from its string representation to the appropriate
-        AMQP value (set in self.amqp_type).
+        AMQP type amqp_type. The message id is set to msg_id.
         """
-        if self.amqp_type == 'null':
-            return Message(id=(self.sent+1), body=None)
-        elif self.amqp_type == 'boolean':
-            return Message(id=(self.sent+1), body=True if test_value == 'True' else False)
-        elif self.amqp_type == 'ubyte':
-            return Message(id=(self.sent+1), body=ubyte(int(test_value, 16)))
-        elif self.amqp_type == 'ushort':
-            return Message(id=(self.sent+1), body=ushort(int(test_value, 16)))
-        elif self.amqp_type == 'uint':
-            return Message(id=(self.sent+1), body=uint(int(test_value, 16)))
-        elif self.amqp_type == 'ulong':
-            return Message(id=(self.sent+1), body=ulong(int(test_value, 16)))
-        elif self.amqp_type == 'byte':
-            return Message(id=(self.sent+1), body=byte(int(test_value, 16)))
-        elif self.amqp_type == 'short':
-            return Message(id=(self.sent+1), body=short(int(test_value, 16)))
-        elif self.amqp_type == 'int':
-            return Message(id=(self.sent+1), body=int32(int(test_value, 16)))
-        elif self.amqp_type == 'long':
-            return Message(id=(self.sent+1), body=long(int(test_value, 16)))
-        elif self.amqp_type == 'float':
-            return Message(id=(self.sent+1), body=float32(unpack('!f', test_value[2:].decode('hex'))[0]))
-        elif self.amqp_type == 'double':
-            return Message(id=(self.sent+1), body=unpack('!d', test_value[2:].decode('hex'))[0])
-        elif self.amqp_type == 'decimal32':
-            return Message(id=(self.sent+1), body=decimal32(int(test_value[2:], 16)))
-        elif self.amqp_type == 'decimal64':
+        if amqp_type == 'null':
+            return Message(id=msg_id, body=None)
+        elif amqp_type == 'boolean':
+            return Message(id=msg_id, body=True if test_value == 'True' else False)
+        elif amqp_type == 'ubyte':
+            return Message(id=msg_id, body=ubyte(int(test_value, 16)))
+        elif amqp_type == 'ushort':
+            return Message(id=msg_id, body=ushort(int(test_value, 16)))
+        elif amqp_type == 'uint':
+            return Message(id=msg_id, body=uint(int(test_value, 16)))
+        elif amqp_type == 'ulong':
+            return Message(id=msg_id, body=ulong(int(test_value, 16)))
+        elif amqp_type == 'byte':
+            return Message(id=msg_id, body=byte(int(test_value, 16)))
+        elif amqp_type == 'short':
+            return Message(id=msg_id, body=short(int(test_value, 16)))
+        elif amqp_type == 'int':
+            return Message(id=msg_id, body=int32(int(test_value, 16)))
+        elif amqp_type == 'long':
+            return Message(id=msg_id, body=long(int(test_value, 16)))
+        elif amqp_type == 'float':
+            return Message(id=msg_id, body=float32(unpack('!f', test_value[2:].decode('hex'))[0]))
+        elif amqp_type == 'double':
+            return Message(id=msg_id, body=unpack('!d', test_value[2:].decode('hex'))[0])
+        elif amqp_type == 'decimal32':
+            return Message(id=msg_id, body=decimal32(int(test_value[2:], 16)))
+        elif amqp_type == 'decimal64':
             l64 = long(test_value[2:], 16)
-            return Message(id=(self.sent+1), body=decimal64(l64))
-        elif self.amqp_type == 'decimal128':
-            return Message(id=(self.sent+1), body=decimal128(test_value[2:].decode('hex')))
-        elif self.amqp_type == 'char':
+            return Message(id=msg_id, body=decimal64(l64))
+        elif amqp_type == 'decimal128':
+            return Message(id=msg_id, body=decimal128(test_value[2:].decode('hex')))
+        elif amqp_type == 'char':
             if len(test_value) == 1: # Format 'a'
-                return Message(id=(self.sent+1), body=char(test_value))
+                return Message(id=msg_id, body=char(test_value))
             else:
                 val = int(test_value, 16)
-                return Message(id=(self.sent+1), body=char(unichr(val)))
-        elif self.amqp_type == 'timestamp':
-            return Message(id=(self.sent+1), body=timestamp(int(test_value, 16)))
-        elif self.amqp_type == 'uuid':
-            return Message(id=(self.sent+1), body=UUID(test_value))
-        elif self.amqp_type == 'binary':
-            return Message(id=(self.sent+1), body=bytes(test_value))
-        elif self.amqp_type == 'string':
-            return Message(id=(self.sent+1), body=unicode(test_value))
-        elif self.amqp_type == 'symbol':
-            return Message(id=(self.sent+1), body=symbol(test_value))
-        elif self.amqp_type == 'list':
-            return Message(id=(self.sent+1), body=test_value)
-        elif self.amqp_type == 'map':
-            return Message(id=(self.sent+1), body=test_value)
+                return Message(id=msg_id, body=char(unichr(val)))
+        elif amqp_type == 'timestamp':
+            return Message(id=msg_id, body=timestamp(int(test_value, 16)))
+        elif amqp_type == 'uuid':
+            return Message(id=msg_id, body=UUID(test_value))
+        elif amqp_type == 'binary':
+            return Message(id=msg_id, body=bytes(test_value))
+        elif amqp_type == 'string':
+            return Message(id=msg_id, body=unicode(test_value))
+        elif amqp_type == 'symbol':
+            return Message(id=msg_id, body=symbol(test_value))
+        elif amqp_type == 'list':
+            return Message(id=msg_id, body=test_value)
+        elif amqp_type == 'map':
+            return Message(id=msg_id, body=test_value)
         else:
-            print 'send: Unsupported AMQP type "%s"' % self.amqp_type
+            print 'send: Unsupported AMQP type "%s"' % amqp_type
             return None
 
     def on_accepted(self, event):
         """Event callback for when a sent message is accepted by the broker"""
-        self.confirmed += 1
-        if self.confirmed == self.total:
+        if not self.send_engine_map[event.sender.target.address].on_accepted(event.sender):
+            event.connection.close()
+        elif all(send_engine.is_complete() for send_engine in self.send_engine_map.itervalues()):
             event.connection.close()
 
     def on_disconnected(self, event):
         """Event callback for when the broker disconnects with the client"""
-        self.sent = self.confirmed
+        for send_engine in self.send_engine_map.itervalues():
+            send_engine.rewind()
 
 
 # --- main ---
@@ -148,12 +158,18 @@ class AmqpTypesTestSender(MessagingHandler):
 #       2: Queue name
 #       3: AMQP type
 #       4...n: Test value(s) as strings
-try:
-    SENDER = AmqpTypesTestSender(sys.argv[1], sys.argv[2], sys.argv[3], loads(sys.argv[4]))
-    Container(SENDER).run()
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print os.path.basename(sys.argv[0]), 'EXCEPTION:', exc
-    print format_exc()
-        
\ No newline at end of file
+#       (or if 3 is "aggregate", 4 is a JSON map of AMQP type to test value list, see AmqpTypesTestSender)
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        sender = AmqpTypesTestSender(args[0], args[1], args[2], loads(args[3]))
+        Container(sender).run()
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print os.path.basename(sys.argv[0]), 'EXCEPTION:', exc
+        print format_exc()
+
+run_shim(main)
@@ -23,28 +23,30 @@ JMS receiver shim for qpid-interop-test
 # under the License.
 #
 
-from json import dumps, loads
+from json import loads
 from struct import pack, unpack
-from subprocess import check_output
-import sys
 from traceback import format_exc
 
 from qpid_interop_test.jms_types import QPID_JMS_TYPE_ANNOTATION_NAME
 from proton import byte, symbol
-from proton.handlers import MessagingHandler
 from proton.reactor import Container
 from qpid_interop_test.interop_test_errors import InteropTestError
+from qpid_interop_test.shim_utils import DeliverySettler, get_java_obj_codec, get_prefetch, LatencyRecorder, run_shim, \
+                                         TimedMessagingHandler, write_results
 
-class JmsMessagesTestReceiver(MessagingHandler):
+class JmsMessagesTestReceiver(TimedMessagingHandler):
     """
     Receiver shim: This shim receives JMS messages sent by the Sender shim and prints the contents of the received
     messages onto the terminal in JSON format for retrieval by the test harness. The JMS messages type and, where
     applicable, body values, as well as the combinations of JMS headers and properties which may be attached to
     the message are received on the command-line in JSON format when this program is launched.
+    In latency mode, a histogram of message latencies is also printed (see LatencyRecorder).
     """
     def __init__(self, broker_url, queue_name, jms_msg_type, test_parameters_list):
-        super(JmsMessagesTestReceiver, self).__init__()
+        super(JmsMessagesTestReceiver, self).__init__(prefetch=get_prefetch(), auto_accept=False)
         self.broker_url = broker_url
+        self.settler = DeliverySettler()
+        self.latency_recorder = LatencyRecorder()
         self.queue_name = queue_name
         self.jms_msg_type = jms_msg_type
         self.expteced_msg_map = test_parameters_list
@@ -66,9 +68,11 @@ class JmsMessagesTestReceiver(MessagingHandler):
 
     def on_message(self, event):
         """Event callback when a message is received by the client"""
+        self.settler.accept(event)
         if event.message.id and event.message.id < self.received:
             return # ignore duplicate message
         if self.received < self.expected:
+            self.latency_recorder.record(event.message)
             if self.current_subtype is None:
                 self.current_subtype = self.subtype_itr.next()
                 self.current_subtype_msg_list = []
@@ -79,6 +83,7 @@ class JmsMessagesTestReceiver(MessagingHandler):
                 self.current_subtype_msg_list = []
             self.received += 1
         if self.received >= self.expected:
+            self.settler.flush()
             event.receiver.close()
             event.connection.close()
 
@@ -206,25 +211,17 @@ class JmsMessagesTestReceiver(MessagingHandler):
     def _get_java_obj(self, java_obj_bytes):
         """
         Take bytes from serialized Java object and construct a Java object, then return its toString() value. The
-        work of 'translating' the bytes to a Java object and obtaining its class and value is done in a Java
-        utility org.apache.qpid.interop_test.obj_util.BytesToJavaObj located in jar JavaObjUtils.jar.
-        java_obj_bytes: hex string representation of bytes from Java object (eg 'aced00057372...')
+        work of 'translating' the bytes to a Java object and obtaining its class and value is done in Python or using
+        the Java utility in jar JavaObjUtils.jar (see qpid_interop_test.shim_utils.get_java_obj_codec()).
+        java_obj_bytes: bytes from serialized Java object
         returns: string containing Java class value as returned by the toString() method
         """
-        java_obj_bytes_str = ''.join(["%02x" % ord(x) for x in java_obj_bytes]).strip()
-        out_str = check_output(['java',
-                                '-cp',
-                                'target/JavaObjUtils.jar',
-                                'org.apache.qpid.interop_test.obj_util.BytesToJavaObj',
-                                java_obj_bytes_str])
-        out_str_list = out_str.split('\n')[:-1] # remove trailing \n
-        if len(out_str_list) > 1:
-            raise InteropTestError('Unexpected return from JavaObjUtils: %s' % out_str)
-        colon_index = out_str_list[0].index(':')
+        out_str = get_java_obj_codec().get_java_obj_str(java_obj_bytes)
+        colon_index = out_str.find(':')
         if colon_index < 0:
             raise InteropTestError('Unexpected format from JavaObjUtils: %s' % out_str)
-        java_class_name = out_str_list[0][:colon_index]
-        java_class_value_str = out_str_list[0][colon_index+1:]
+        java_class_name = out_str[:colon_index]
+        java_class_value_str = out_str[colon_index+1:]
         if java_class_name != self.current_subtype:
             raise InteropTestError('Unexpected class name from JavaObjUtils: expected %s, recieved %s' %
                                    (self.current_subtype, java_class_name))
@@ -274,14 +271,19 @@ class JmsMessagesTestReceiver(MessagingHandler):
 #       2: Queue name
 #       3: JMS message type
 #       4: JSON Test parameters containing 2 maps: [testValuesMap, flagMap]
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
 #print '#### sys.argv=%s' % sys.argv
-try:
-    RECEIVER = JmsMessagesTestReceiver(sys.argv[1], sys.argv[2], sys.argv[3], loads(sys.argv[4]))
-    Container(RECEIVER).run()
-    print sys.argv[3]
-    print dumps(RECEIVER.get_received_value_map())
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print 'jms-receiver-shim EXCEPTION:', exc
-    print format_exc()
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        receiver = JmsMessagesTestReceiver(args[0], args[1], args[2], loads(args[3]))
+        Container(receiver).run()
+        write_results(args[2], receiver.get_received_value_map(), *receiver.latency_recorder.get_result_list())
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print 'jms-receiver-shim EXCEPTION:', exc
+        print format_exc()
+
+run_shim(main)
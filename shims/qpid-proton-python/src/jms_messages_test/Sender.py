@@ -24,18 +24,16 @@ JMS sender shim for qpid-interop-test
 #
 
 from json import loads
-from subprocess import check_output
 from struct import pack, unpack
-import sys
 from traceback import format_exc
 
 from qpid_interop_test.jms_types import create_annotation
 from proton import byte, char, float32, int32, Message, short, symbol
-from proton.handlers import MessagingHandler
 from proton.reactor import Container
 from qpid_interop_test.interop_test_errors import InteropTestError
+from qpid_interop_test.shim_utils import get_java_obj_codec, run_shim, SendingEngine, TimedMessagingHandler
 
-class JmsMessagesTestSender(MessagingHandler):
+class JmsMessagesTestSender(TimedMessagingHandler):
     """
     This shim sends JMS messages of a particular JMS message type according to the test parameters list. This list
     contains three maps:
@@ -52,9 +50,13 @@ class JmsMessagesTestSender(MessagingHandler):
         self.queue_name = queue_name
         self.jms_msg_type = jms_msg_type
         self.test_value_map = test_parameters_list
-        self.sent = 0
-        self.confirmed = 0
-        self.total = self._get_total_num_msgs()
+        # These types expect a test_values Python string representation of a map: '{type:[val, val, val], ...}'
+        # List of (test value type, test value, value number within its type) for each message to be sent
+        self.test_value_list = []
+        for sub_type in sorted(self.test_value_map.keys()):
+            for value_num, test_value in enumerate(self.test_value_map[sub_type]):
+                self.test_value_list.append((sub_type, test_value, value_num))
+        self.send_engine = SendingEngine(len(self.test_value_list), self._create_indexed_message)
 
     def on_start(self, event):
         """Event callback for when the client starts"""
@@ -63,11 +65,8 @@ class JmsMessagesTestSender(MessagingHandler):
 
     def on_sendable(self, event):
         """Event callback for when send credit is received, allowing the sending of messages"""
-        if self.sent == 0:
-            # These types expect a test_values Python string representation of a map: '{type:[val, val, val], ...}'
-            for sub_type in sorted(self.test_value_map.keys()):
-                if self._send_test_values(event, sub_type, self.test_value_map[sub_type]):
-                    return
+        if not self.send_engine.send(event.sender):
+            event.connection.close()
 
     def on_connection_error(self, event):
         print 'JmsMessagesTestSender.on_connection_error'
@@ -80,38 +79,18 @@ class JmsMessagesTestSender(MessagingHandler):
 
     def on_accepted(self, event):
         """Event callback for when a sent message is accepted by the broker"""
-        self.confirmed += 1
-        if self.confirmed == self.total:
+        if not self.send_engine.on_accepted(event.sender) or self.send_engine.is_complete():
             event.connection.close()
 
     def on_disconnected(self, event):
         """Event callback for when the broker disconnects with the client"""
-        self.sent = self.confirmed
-
-    def _get_total_num_msgs(self):
-        """
-        Calculates the total number of messages to be sent based on the message parameters received on the command-line
-        """
-        total = 0
-        for key in self.test_value_map.keys():
-            total += len(self.test_value_map[key])
-        return total
+        self.send_engine.rewind()
 
-    def _send_test_values(self, event, test_value_type, test_values):
-        """Method which loops through recieved parameters and sends the corresponding messages"""
-        value_num = 0
-        for test_value in test_values:
-            if event.sender.credit:
-                message = self._create_message(test_value_type, test_value, value_num)
-                # TODO: set message to address
-                if message is not None:
-                    event.sender.send(message)
-                    self.sent += 1
-                    value_num += 1
-                else:
-                    event.connection.close()
-                    return True
-        return False
+    def _create_indexed_message(self, index):
+        """Create the message for entry index of the test value list, or None if it cannot be created"""
+        test_value_type, test_value, value_num = self.test_value_list[index]
+        # TODO: set message to address
+        return self._create_message(test_value_type, test_value, value_num)
 
     # TODO: Change this to return a list of messages. That way each test can return more than one message
     def _create_message(self, test_value_type, test_value, value_num):
@@ -140,7 +119,7 @@ class JmsMessagesTestSender(MessagingHandler):
         if test_value is not None:
             raise InteropTestError('JmsMessagesTestSender._create_jms_message: Invalid value "%s" for subtype "%s"' %
                                    (test_value, test_value_type))
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        content_type='application/octet-stream',
                        annotations=create_annotation('JMS_MESSAGE_TYPE'))
 
@@ -172,7 +151,7 @@ class JmsMessagesTestSender(MessagingHandler):
         else:
             raise InteropTestError('JmsMessagesTestSender._create_jms_bytesmessage: Unknown or unsupported subtype "%s"' %
                                    test_value_type)
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        body=body_bytes,
                        inferred=True,
                        content_type='application/octet-stream',
@@ -203,7 +182,7 @@ class JmsMessagesTestSender(MessagingHandler):
         else:
             raise InteropTestError('JmsMessagesTestSender._create_jms_mapmessage: Unknown or unsupported subtype "%s"' %
                                    test_value_type)
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        body={name: value},
                        inferred=False,
                        annotations=create_annotation('JMS_MAPMESSAGE_TYPE'))
@@ -211,7 +190,7 @@ class JmsMessagesTestSender(MessagingHandler):
     def _create_jms_objectmessage(self, test_value):
         """Create a JMS object message"""
         java_binary = self._s_get_java_obj_binary(test_value)
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        body=java_binary,
                        inferred=True,
                        content_type='application/x-java-serialized-object',
@@ -219,17 +198,11 @@ class JmsMessagesTestSender(MessagingHandler):
 
     @staticmethod
     def _s_get_java_obj_binary(java_class_str):
-        """Call external utility to create Java object and stringify it, returning the string representation"""
-        out_str = check_output(['java',
-                                '-cp',
-                                'target/JavaObjUtils.jar',
-                                'org.apache.qpid.interop_test.obj_util.JavaObjToBytes',
-                                java_class_str])
-        out_str_list = out_str.split('\n')[:-1] # remove trailing \n
-        if out_str_list[0] != java_class_str:
-            raise InteropTestError('JmsMessagesTestSender._s_get_java_obj_binary(): Call to JavaObjToBytes failed\n%s' %
-                                   out_str)
-        return out_str_list[1].decode('hex')
+        """
+        Create Java object java_class_str (eg 'java.lang.Integer:123') and return its serialized bytes, in Python or
+        using the Java utility in jar JavaObjUtils.jar (see qpid_interop_test.shim_utils.get_java_obj_codec()).
+        """
+        return get_java_obj_codec().get_java_obj_bytes(java_class_str)
 
     def _create_jms_streammessage(self, test_value_type, test_value):
         """Create a JMS stream message"""
@@ -256,14 +229,14 @@ class JmsMessagesTestSender(MessagingHandler):
         else:
             raise InteropTestError('JmsMessagesTestSender._create_jms_streammessage: Unknown or unsupported subtype "%s"' %
                                    test_value_type)
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        body=body_list,
                        inferred=True,
                        annotations=create_annotation('JMS_STREAMMESSAGE_TYPE'))
 
     def _create_jms_textmessage(self, test_value_text):
         """Create a JMS text message"""
-        return Message(id=(self.sent+1),
+        return Message(id=(self.send_engine.next_index+1),
                        body=unicode(test_value_text),
                        annotations=create_annotation('JMS_TEXTMESSAGE_TYPE'))
 
@@ -275,13 +248,19 @@ class JmsMessagesTestSender(MessagingHandler):
 #       2: Queue name
 #       3: JMS message type
 #       4: JSON Test parameters containing 3 maps: [testValueMap, testHeadersMap, testPropertiesMap]
+#   or: 1: --server (run one test for each JSON argument list read from stdin, see
+#                    qpid_interop_test.shim_utils)
 #print '#### sys.argv=%s' % sys.argv
 #print '>>> test_values=%s' % loads(sys.argv[4])
-try:
-    SENDER = JmsMessagesTestSender(sys.argv[1], sys.argv[2], sys.argv[3], loads(sys.argv[4]))
-    Container(SENDER).run()
-except KeyboardInterrupt:
-    pass
-except Exception as exc:
-    print 'jms-sender-shim EXCEPTION:', exc
-    print format_exc()
+def main(args):
+    """Run a single test using the shim command-line arguments in args"""
+    try:
+        sender = JmsMessagesTestSender(args[0], args[1], args[2], loads(args[3]))
+        Container(sender).run()
+    except KeyboardInterrupt:
+        pass
+    except Exception as exc:
+        print 'jms-sender-shim EXCEPTION:', exc
+        print format_exc()
+
+run_shim(main)
@@ -19,5 +19,17 @@
 
 import broker_properties
 import interop_test_errors
+import java_obj_codec
+import java_obj_serialization
+import latency_histogram
+import phase_report
+import result_reporter
+import result_store
+import runner
+import scheduler
+import shim_protocol
 import shims
 import test_type_map
+import timing_store
+import value_compare
+import value_generator
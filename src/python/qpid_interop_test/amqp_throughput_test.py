@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+"""
+Module to measure the message throughput and latency of different clients sending to and receiving from each other
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import argparse
+import sys
+import unittest
+
+from itertools import product
+from json import dumps
+from os import getenv, path
+
+import qpid_interop_test.runner
+import qpid_interop_test.shims
+from qpid_interop_test.latency_histogram import LatencyHistogram, REPORT_PERCENTILES
+from qpid_interop_test.result_store import get_test_input_map
+from qpid_interop_test.test_type_map import TestTypeMap
+
+# TODO: propose a sensible default when installation details are worked out
+QIT_INSTALL_PREFIX = getenv('QIT_INSTALL_PREFIX')
+if QIT_INSTALL_PREFIX is None:
+    print 'ERROR: Environment variable QIT_INSTALL_PREFIX is not set'
+    sys.exit(1)
+QIT_TEST_SHIM_HOME = path.join(QIT_INSTALL_PREFIX, 'libexec', 'qpid_interop_test', 'shims')
+
+# The measurements are only meaningful if no other tests run at the same time (see qpid_interop_test.runner)
+RUN_SERIALLY = True
+
+class AmqpThroughputTypes(TestTypeMap):
+    """
+    Class which contains the AMQP message body types used for throughput testing and the message sizes to be used.
+    """
+
+    TYPE_MAP = {
+        # List of message body sizes in bytes. A separate measurement is made for each size.
+        'binary': [16, 1024, 65536],
+        'string': [16, 1024, 65536],
+        }
+
+    # This section contains tests that should be skipped because of know issues that would cause the test to fail.
+    # As the issues are resolved, these should be removed.
+    BROKER_SKIP = {}
+
+
+class ThroughputResult(object):
+    """
+    Throughput and latency of a single measurement (one message size between one pair of shims), calculated from
+    the results map returned by the receive shim
+    """
+    def __init__(self, amqp_type, size, send_shim_name, receive_shim_name, receive_results):
+        self.amqp_type = amqp_type
+        self.size = size
+        self.send_shim_name = send_shim_name
+        self.receive_shim_name = receive_shim_name
+        self.num_msgs = receive_results['received']
+        self.num_bytes = receive_results['bytes']
+        # Measured from the sending of the first message to the receipt of the last
+        elapsed_us = receive_results['last_receive_time'] - receive_results['first_send_time']
+        self.elapsed = max(elapsed_us, 1) / 1000000.0
+        self.msgs_per_sec = self.num_msgs / self.elapsed
+        self.mb_per_sec = self.num_bytes / self.elapsed / 1024 / 1024
+        self.latency = LatencyHistogram.from_list(receive_results['latency'])
+
+    @staticmethod
+    def get_report_header():
+        """Return the header line of the throughput report"""
+        return '%-8s %8s  %-30s %10s %12s %10s' % ('Type', 'Size', 'Sender->Receiver', 'Messages', 'Msgs/s', 'MB/s') + \
+               ''.join([' %10s' % ('p%s (us)' % percentile) for percentile in REPORT_PERCENTILES])
+
+    def get_report_line(self):
+        """Return the line of the throughput report for this result"""
+        return '%-8s %8d  %-30s %10d %12.1f %10.2f' % (self.amqp_type, self.size,
+                                                       '%s->%s' % (self.send_shim_name, self.receive_shim_name),
+                                                       self.num_msgs, self.msgs_per_sec, self.mb_per_sec) + \
+               ''.join([' %10s' % self.latency.get_percentile(percentile) for percentile in REPORT_PERCENTILES])
+
+
+def print_report(result_list):
+    """Print a table of all the throughput results in result_list"""
+    print
+    if ARGS.duration > 0:
+        print 'Throughput and latency (%s seconds per measurement):' % ARGS.duration
+    else:
+        print 'Throughput and latency (%d messages per measurement):' % ARGS.count
+    print ThroughputResult.get_report_header()
+    for result in sorted(result_list, key=lambda result: (result.amqp_type, result.size, result.send_shim_name,
+                                                          result.receive_shim_name)):
+        print result.get_report_line()
+    sys.stdout.flush()
+
+
+class AmqpThroughputTestCase(unittest.TestCase):
+    """
+    Abstract base class for AMQP throughput test cases
+    """
+
+    def run_test(self, sender_addr, receiver_addr, amqp_type, size_list, send_shim, receive_shim):
+        """
+        Run this test by invoking the shim receive method to receive messages, followed by the shim send method to
+        send messages of each size in size_list as fast as possible. The test fails if any message is lost or
+        received with the wrong size. The throughput and latency of each size is added to RESULT_LIST.
+        """
+        for size in size_list:
+            # TODO: When Artemis can support it (in the next release), revert the queue name back to 'qpid-interop...'
+            # Currently, Artemis only supports auto-create queues for JMS, and the queue name must be prefixed by
+            # 'jms.queue.'
+            queue_name = 'jms.queue.qpid-interop.amqp_throughput_test.%s.%d.%s.%s' % \
+                         (amqp_type, size, send_shim.NAME, receive_shim.NAME)
+            test_params = {'size': size,
+                           'count': ARGS.count if ARGS.duration <= 0 else 0,
+                           'duration': max(ARGS.duration, 0)}
+
+            # Start the receive shim first (for queueless brokers/dispatch)
+            receiver = receive_shim.create_receiver(receiver_addr, queue_name, amqp_type, dumps(test_params))
+            receiver.start()
+
+            # Start the send shim
+            sender = send_shim.create_sender(sender_addr, queue_name, amqp_type, dumps(test_params))
+            sender.start()
+
+            # Wait for both shims to finish, with a timeout based on previous runs of this test with the same number of
+            # messages or duration
+            test_key = (amqp_type, str(size), 'count=%d' % test_params['count'],
+                        'duration=%g' % test_params['duration'], send_shim.NAME, receive_shim.NAME)
+            TIMING_STORE.join_or_kill(test_key, [sender, receiver])
+            qpid_interop_test.runner.finish_exchange(PHASE_REPORT, test_key, [sender, receiver])
+
+            # Process return string from sender
+            send_obj = sender.get_return_object()
+            if send_obj is not None:
+                if isinstance(send_obj, str):
+                    if len(send_obj) > 0:
+                        self.fail('Send shim \'%s\':\n%s' % (send_shim.NAME, send_obj))
+                else:
+                    self.fail('Sender error: %s' % str(send_obj))
+
+            # Process return string from receiver
+            receive_obj = receiver.get_return_object()
+            if isinstance(receive_obj, tuple):
+                if len(receive_obj) == 2:
+                    return_amqp_type, receive_results = receive_obj
+                    self.assertEqual(return_amqp_type, amqp_type,
+                                     msg='AMQP type error:\n\n    sent:%s\n\n    received:%s' % \
+                                     (amqp_type, return_amqp_type))
+                    self.check_receive_results(size, test_params['count'], receive_results)
+                    TIMING_STORE.record_duration(test_key, [sender, receiver])
+                    RESULT_LIST.append(ThroughputResult(amqp_type, size, send_shim.NAME, receive_shim.NAME,
+                                                        receive_results))
+                else:
+                    self.fail('Received incorrect tuple format: %s' % str(receive_obj))
+            else:
+                self.fail('Received non-tuple: %s' % str(receive_obj))
+
+    def check_receive_results(self, size, count, receive_results):
+        """Check that all the messages sent (count of them, unless 0) were received, and were of the right size"""
+        if count > 0:
+            self.assertEqual(receive_results['sent'], count,
+                             msg='Message count error: %d messages expected, last message id %d' % \
+                             (count, receive_results['sent']))
+        self.assertEqual(receive_results['received'], receive_results['sent'],
+                         msg='Lost messages: %d messages sent, %d received' % \
+                         (receive_results['sent'], receive_results['received']))
+        self.assertEqual(receive_results['size_errors'], 0,
+                         msg='Message size error: %d messages not of expected size %d bytes' % \
+                         (receive_results['size_errors'], size))
+
+def create_testcase_class(amqp_type, shim_product):
+    """
+    Class factory function which creates new subclasses to AmqpThroughputTestCase.
+    """
+
+    def __repr__(self):
+        """Print the class name"""
+        return self.__class__.__name__
+
+    def add_test_method(cls, send_shim, receive_shim):
+        """Function which creates a new test method in class cls"""
+
+        @unittest.skipIf(TYPES.skip_test(amqp_type, BROKER),
+                         TYPES.skip_test_message(amqp_type, BROKER))
+        def inner_test_method(self):
+            self.run_test(self.sender_addr,
+                          self.receiver_addr,
+                          self.amqp_type,
+                          self.test_value_list,
+                          send_shim,
+                          receive_shim)
+
+        inner_test_method.__name__ = 'test_%s_%s->%s' % (amqp_type, send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          TYPES.get_json_test_values(amqp_type)))
+        setattr(cls, inner_test_method.__name__, inner_test_method)
+
+    class_name = amqp_type.title() + 'TestCase'
+    class_dict = {'__name__': class_name,
+                  '__repr__': __repr__,
+                  '__doc__': 'Throughput test case for AMQP 1.0 message body type \'%s\'' % amqp_type,
+                  'amqp_type': amqp_type,
+                  'sender_addr': ARGS.sender,
+                  'receiver_addr': ARGS.receiver,
+                  'test_value_list': TYPES.get_test_values(amqp_type)}
+    new_class = type(class_name, (AmqpThroughputTestCase,), class_dict)
+    for send_shim, receive_shim in shim_product:
+        add_test_method(new_class, send_shim, receive_shim)
+    return new_class
+
+
+
+class TestOptions(object):
+    """
+    Class controlling command-line arguments used to control the test.
+    """
+    def __init__(self, shim_map, argv=None):
+        parser = argparse.ArgumentParser(description='Qpid-interop AMQP client throughput and latency test suite')
+        qpid_interop_test.runner.add_common_options(parser, jobs=False)
+        parser.add_argument('--count', action='store', type=int, default=10000, metavar='N',
+                            help='Number of messages sent for each measurement. Default: 10000')
+        parser.add_argument('--duration', action='store', type=float, default=0, metavar='SECS',
+                            help='Send messages for this many seconds for each measurement instead of sending a ' +
+                            'fixed number of messages (see --count)')
+        type_group = parser.add_mutually_exclusive_group()
+        type_group.add_argument('--include-type', action='append', metavar='AMQP-TYPE',
+                                help='Name of AMQP type to include. Supported types:\n%s' %
+                                sorted(AmqpThroughputTypes.TYPE_MAP.keys()))
+        type_group.add_argument('--exclude-type', action='append', metavar='AMQP-TYPE',
+                                help='Name of AMQP type to exclude. Supported types: see "include-type" above')
+        shim_group = parser.add_mutually_exclusive_group()
+        shim_group.add_argument('--include-shim', action='append', metavar='SHIM-NAME',
+                                help='Name of shim to include. Supported shims:\n%s' % sorted(shim_map.keys()))
+        shim_group.add_argument('--exclude-shim', action='append', metavar='SHIM-NAME',
+                            help='Name of shim to exclude. Supported shims: see "include-shim" above')
+        self.args = parser.parse_args(argv)
+        if self.args.count <= 0 and self.args.duration <= 0:
+            print 'Either --count or --duration must be greater than 0'
+            sys.exit(1) # Errors or failures present
+
+
+def create_shim_map():
+    """
+    Return a map of the name of each client language shim that is to be tested as a part of this test to an
+    instance of the shim. For every shim in this map, a test is dynamically constructed which tests it against itself
+    as well as every other shim in the map.
+
+    As new shims are added, add them into this map to have them included in the test cases.
+    """
+    PROTON_CPP_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'amqp_throughput_test', 'Receiver')
+    PROTON_CPP_SENDER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'amqp_throughput_test', 'Sender')
+    PROTON_PYTHON_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-python', 'amqp_throughput_test',
+                                            'Receiver.py')
+    PROTON_PYTHON_SENDER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-python', 'amqp_throughput_test',
+                                          'Sender.py')
+
+    shim_map = {qpid_interop_test.shims.ProtonCppShim.NAME: \
+                    qpid_interop_test.shims.ProtonCppShim(PROTON_CPP_SENDER_SHIM, PROTON_CPP_RECEIVER_SHIM),
+                qpid_interop_test.shims.ProtonPythonShim.NAME: \
+                    qpid_interop_test.shims.ProtonPythonShim(PROTON_PYTHON_SENDER_SHIM, PROTON_PYTHON_RECEIVER_SHIM),
+               }
+    return shim_map
+
+
+def create_test_suite(args, shim_map, broker, timing_store, result_store, phase_report):
+    """
+    Create the tests of this test suite for the options args, the shims in shim_map, the broker, the stores of
+    previous runs and the phase report (see qpid_interop_test.runner) and return them in a unittest.TestSuite
+    """
+    global ARGS, BROKER, TIMING_STORE, RESULT_STORE, PHASE_REPORT, TYPES, RESULT_LIST
+    ARGS = args
+    BROKER = broker
+    TIMING_STORE = timing_store
+    RESULT_STORE = result_store
+    PHASE_REPORT = phase_report
+    TYPES = AmqpThroughputTypes().get_types(ARGS)
+
+    # RESULT_LIST collects the ThroughputResult of every measurement for the final report
+    RESULT_LIST = []
+
+    # The test suite contains all the dynamically created type classes, each of which contains a test for the
+    # combinations of client shims. The tests are always run serially (see RUN_SERIALLY) so that they do not affect
+    # each other's measurements.
+    test_suite = unittest.TestSuite()
+    for at in sorted(TYPES.get_type_list()):
+        test_case_class = create_testcase_class(at, product(shim_map.values(), repeat=2))
+        test_suite.addTest(unittest.makeSuite(test_case_class))
+    return test_suite
+
+
+def report_test_suite():
+    """Print the report of the throughput and latency measurements once all the tests have run"""
+    print_report(RESULT_LIST)
+
+
+#--- Main program start ---
+
+if __name__ == '__main__':
+    qpid_interop_test.runner.run_suite_main(sys.modules[__name__])
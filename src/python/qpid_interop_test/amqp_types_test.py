@@ -30,13 +30,21 @@ import unittest
 from itertools import product
 from json import dumps
 from os import getenv, path
+from threading import Lock
 from time import mktime, time
-from uuid import UUID, uuid4
+from uuid import UUID
 
-from proton import symbol
-import qpid_interop_test.broker_properties
+import qpid_interop_test.runner
 import qpid_interop_test.shims
+from qpid_interop_test.latency_histogram import print_latency
+from qpid_interop_test.result_store import get_test_input_map
+from qpid_interop_test.shim_protocol import AGGREGATE_TEST_KEY
 from qpid_interop_test.test_type_map import TestTypeMap
+from qpid_interop_test.value_compare import abbreviate, describe_value_list_mismatch, find_value_list_mismatch
+from qpid_interop_test.value_generator import DEFAULT_SEED, DEFAULT_SHRINK_LIMIT, fuzz_char, fuzz_float_bits, \
+                                              fuzz_int, fuzz_list, fuzz_map, fuzz_text, random_bits, random_char, \
+                                              random_float_bits, random_signed_int, random_text, random_timestamp, \
+                                              random_unsigned_int, random_uuid, shrink_value, SYMBOL_CHARS
 
 # TODO: propose a sensible default when installation details are worked out
 QIT_INSTALL_PREFIX = getenv('QIT_INSTALL_PREFIX')
@@ -45,6 +53,9 @@ if QIT_INSTALL_PREFIX is None:
     sys.exit(1)
 QIT_TEST_SHIM_HOME = path.join(QIT_INSTALL_PREFIX, 'libexec', 'qpid_interop_test', 'shims')
 
+SHRINK_STEP_TIMEOUT = 60.0 # Longest time (seconds) allowed for the exchange of a single value when shrinking
+SHRINK_TIME_BUDGET = 600.0 # Time (seconds) after which no further values are tried when shrinking a failing value
+
 
 class AmqpPrimitiveTypes(TestTypeMap):
     """
@@ -158,14 +169,14 @@ class AmqpPrimitiveTypes(TestTypeMap):
                  u'0x10ffff',
                  #u'0x12345678' # 32-bit number, not real char # Disabled until Python can handle it
                 ],
-        # timestamp: Must be in milliseconds since the Unix epoch
+        # timestamp: Must be in milliseconds since the Unix epoch. A random timestamp is added from the test value
+        # seed, see create_generated_values()
         'timestamp': ['0x0',
                       '0x%x' % int(mktime((2000, 1, 1, 0, 0, 0, 5, 1, 0))*1000),
-                      '0x%x' % int(time()*1000)
                      ],
+        # uuid: A random UUID is added from the test value seed, see create_generated_values()
         'uuid': [str(UUID(int=0x0)),
-                 str(UUID('00010203-0405-0607-0809-0a0b0c0d0e0f')),
-                 str(uuid4())],
+                 str(UUID('00010203-0405-0607-0809-0a0b0c0d0e0f'))],
         'binary': [bytes(),
                    bytes(12345),
                    b'Hello, world',
@@ -186,14 +197,8 @@ class AmqpPrimitiveTypes(TestTypeMap):
         'list': [[],
                  ['ubyte:1', 'int:-2', 'float:3.14'],
                  ['string:a', 'string:b', 'string:c'],
-                 ['ulong:12345',
-                  'timestamp:%d' % (time()*1000),
-                  'short:-2500',
-                  'uuid:%s' % uuid4(),
-                  'symbol:a.b.c',
-                  'none:',
-                  'decimal64:0x400921fb54442eea'
-                 ],
+                 # A list of mixed types including a random timestamp and UUID is added from the test value seed,
+                 # see create_generated_values()
                  [[],
                   'none',
                   ['ubyte:1', 'ubyte:2', 'ubyte:3'],
@@ -279,8 +284,100 @@ class AmqpPrimitiveTypes(TestTypeMap):
         'double': {'apache-activemq-artemis': '-NaN is stripped of its sign: ENTMQ-1686',},
         }
 
-    def __init__(self):
-        super(AmqpPrimitiveTypes, self).__init__()
+    # Random values of these types are added to the TYPE_MAP values when requested (see --random-values). Infinities
+    # and NaNs are not generated for float and double, and -NaN for double is known to fail on Artemis (see above).
+    RANDOM_VALUE_FUNCTIONS = {
+        'ubyte': lambda rand: random_unsigned_int(rand, 8),
+        'ushort': lambda rand: random_unsigned_int(rand, 16),
+        'uint': lambda rand: random_unsigned_int(rand, 32),
+        'ulong': lambda rand: random_unsigned_int(rand, 64),
+        'byte': lambda rand: random_signed_int(rand, 8),
+        'short': lambda rand: random_signed_int(rand, 16),
+        'int': lambda rand: random_signed_int(rand, 32),
+        'long': lambda rand: random_signed_int(rand, 64),
+        'float': lambda rand: random_float_bits(rand, 8, 23),
+        'double': lambda rand: random_float_bits(rand, 11, 52),
+        'decimal32': lambda rand: random_bits(rand, 32),
+        'decimal64': lambda rand: random_bits(rand, 64),
+        'decimal128': lambda rand: random_bits(rand, 128),
+        'char': random_char,
+        'timestamp': lambda rand: '0x%x' % random_timestamp(rand),
+        'uuid': random_uuid,
+        'binary': lambda rand: bytes(random_text(rand)),
+        'string': lambda rand: unicode(random_text(rand)),
+        'symbol': lambda rand: random_text(rand, SYMBOL_CHARS),
+        }
+
+    # Fuzz values of these types are added to the TYPE_MAP values when requested (see --fuzz-values). Unlike random
+    # values, they include NaNs with random payloads, surrogate chars and nested lists and maps. Float infinities are
+    # not generated (PROTON-1149, see above).
+    FUZZ_VALUE_FUNCTIONS = {
+        'ubyte': lambda rand: fuzz_int(rand, 8, False),
+        'ushort': lambda rand: fuzz_int(rand, 16, False),
+        'uint': lambda rand: fuzz_int(rand, 32, False),
+        'ulong': lambda rand: fuzz_int(rand, 64, False),
+        'byte': lambda rand: fuzz_int(rand, 8, True),
+        'short': lambda rand: fuzz_int(rand, 16, True),
+        'int': lambda rand: fuzz_int(rand, 32, True),
+        'long': lambda rand: fuzz_int(rand, 64, True),
+        'float': lambda rand: fuzz_float_bits(rand, 8, 23, infinity=False),
+        'double': lambda rand: fuzz_float_bits(rand, 11, 52),
+        'decimal32': lambda rand: random_bits(rand, 32),
+        'decimal64': lambda rand: random_bits(rand, 64),
+        'decimal128': lambda rand: random_bits(rand, 128),
+        'char': fuzz_char,
+        'timestamp': lambda rand: '0x%x' % random_timestamp(rand),
+        'uuid': random_uuid,
+        'binary': lambda rand: bytes(random_text(rand)),
+        'string': fuzz_text,
+        'symbol': lambda rand: random_text(rand, SYMBOL_CHARS),
+        'list': fuzz_list,
+        'map': fuzz_map,
+        }
+
+    # A failing value of these types is shrunk (see --fuzz-values) to the smallest value which still fails, by
+    # shortening it (binary, string, symbol, list and map) or by moving its hex value towards 0 (zero-padded to the
+    # number of hex digits in this map). The values of other types cannot be shrunk while remaining valid.
+    SHRINK_HEX_DIGITS = {
+        'ubyte': 0,
+        'ushort': 0,
+        'uint': 0,
+        'ulong': 0,
+        'byte': 0,
+        'short': 0,
+        'int': 0,
+        'long': 0,
+        'float': 8,
+        'double': 16,
+        'decimal32': 8,
+        'decimal64': 16,
+        'decimal128': 32,
+        'timestamp': 0,
+        'binary': 0,
+        'string': 0,
+        'symbol': 0,
+        'list': 0,
+        'map': 0,
+        }
+
+    def __init__(self, seed=DEFAULT_SEED, num_random_values=0, num_fuzz_values=0):
+        super(AmqpPrimitiveTypes, self).__init__(seed, num_random_values, num_fuzz_values)
+        self.test_arrays = None # Created on first use, see get_test_values()
+
+    def create_generated_values(self):
+        """ Overload the parent method to add a timestamp and UUID (also within a list) derived from the seed """
+        rand = self.value_generator.get_random('generated')
+        return {'timestamp': ['0x%x' % random_timestamp(rand)],
+                'uuid': [random_uuid(rand)],
+                'list': [['ulong:12345',
+                          'timestamp:%d' % random_timestamp(rand),
+                          'short:-2500',
+                          'uuid:%s' % random_uuid(rand),
+                          'symbol:a.b.c',
+                          'none:',
+                          'decimal64:0x400921fb54442eea'
+                         ]],
+               }
 
     def create_array(self, amqp_type, repeat):
         """
@@ -302,12 +399,87 @@ class AmqpPrimitiveTypes(TestTypeMap):
         return test_arrays
 
     def get_test_values(self, amqp_type):
-        """ Overload the parent method so that arrays can be synthesized rather than read directly """
+        """ Overload the parent method so that arrays can be synthesized (once) rather than read directly """
         if amqp_type == 'array':
-            return self.create_test_arrays()
+            if self.test_arrays is None:
+                self.test_arrays = self.create_test_arrays()
+            return self.test_arrays
         return super(AmqpPrimitiveTypes, self).get_test_values(amqp_type)
 
 
+class AggregateTypeExchange(object):
+    """
+    Exchange of the test values of all the AMQP types under test between a pair of shims using a single sender shim
+    invocation and a single receiver shim invocation (and thus a single connection each) rather than one per type.
+    Each type is sent on its own queue. The exchange for each shim pair is run once, by whichever test of that pair
+    runs first, and the result is kept so that the test for each type can then check its own values.
+    """
+    def __init__(self, sender_addr, receiver_addr, type_value_map, timing_store, phase_report):
+        self.sender_addr = sender_addr
+        self.receiver_addr = receiver_addr
+        self.type_value_map = type_value_map
+        self.timing_store = timing_store
+        self.phase_report = phase_report
+        self.result_map = {}
+        self.lock = Lock()
+        self.pair_lock_map = {}
+
+    def includes_type(self, amqp_type):
+        """Return True if amqp_type is exchanged as part of the aggregate exchange"""
+        return amqp_type in self.type_value_map
+
+    def get_result(self, send_shim, receive_shim):
+        """
+        Return the tuple (send_obj, receive_obj, latency_histogram) containing the sender and receiver return objects
+        of the exchange between send_shim and receive_shim, running the exchange first if this has not already been
+        done. In latency mode, latency_histogram is the LatencyHistogram of the messages of all the types exchanged,
+        returned only to the caller which ran the exchange so that it is reported once; it is None otherwise.
+        """
+        key = (send_shim.NAME, receive_shim.NAME)
+        with self.lock:
+            pair_lock = self.pair_lock_map.setdefault(key, Lock())
+        with pair_lock:
+            if key in self.result_map:
+                return self.result_map[key] + (None,)
+            send_obj, receive_obj, latency_histogram = self._run(send_shim, receive_shim)
+            self.result_map[key] = (send_obj, receive_obj)
+            return send_obj, receive_obj, latency_histogram
+
+    def _run(self, send_shim, receive_shim):
+        """
+        Run the exchange between send_shim and receive_shim, returning the tuple (send_obj, receive_obj,
+        latency_histogram)
+        """
+        queue_name = 'jms.queue.qpid-interop.amqp_types_test.%s.%s.%s' % \
+                     (AGGREGATE_TEST_KEY, send_shim.NAME, receive_shim.NAME)
+        num_expected_map = dict((amqp_type, len(test_value_list))
+                                for amqp_type, test_value_list in self.type_value_map.iteritems())
+
+        # Start the receive shim first (for queueless brokers/dispatch)
+        receiver = receive_shim.create_receiver(self.receiver_addr, queue_name, AGGREGATE_TEST_KEY,
+                                                dumps(num_expected_map))
+        receiver.start()
+
+        # Start the send shim
+        sender = send_shim.create_sender(self.sender_addr, queue_name, AGGREGATE_TEST_KEY,
+                                         dumps(self.type_value_map))
+        sender.start()
+
+        # Wait for both shims to finish, with a timeout based on previous runs of this exchange
+        test_key = (AGGREGATE_TEST_KEY, send_shim.NAME, receive_shim.NAME)
+        self.timing_store.join_or_kill(test_key, [sender, receiver])
+        qpid_interop_test.runner.finish_exchange(self.phase_report, test_key, [sender, receiver])
+
+        # The values of each type are checked by the test of that type: only record the duration of an exchange in
+        # which both shims completed and the receiver returned values for the types
+        send_obj = sender.get_return_object()
+        receive_obj = receiver.get_return_object()
+        if not send_obj and isinstance(receive_obj, tuple) and len(receive_obj) == 2 and \
+           isinstance(receive_obj[1], dict) and set(receive_obj[1]) == set(self.type_value_map):
+            self.timing_store.record_duration(test_key, [sender, receiver])
+        return send_obj, receive_obj, receiver.get_latency_histogram()
+
+
 class AmqpTypeTestCase(unittest.TestCase):
     """
     Abstract base class for AMQP Type test cases
@@ -319,6 +491,11 @@ class AmqpTypeTestCase(unittest.TestCase):
         to receive the values. Finally, compare the sent values with the received values.
         """
         if len(test_value_list) > 0:
+            if self.aggregate_exchange is not None and self.aggregate_exchange.includes_type(amqp_type) and \
+               send_shim.AGGREGATE_TYPES and receive_shim.AGGREGATE_TYPES:
+                self.run_aggregate_test(amqp_type, test_value_list, send_shim, receive_shim)
+                return
+
             # TODO: When Artemis can support it (in the next release), revert the queue name back to 'qpid-interop...'
             # Currently, Artemis only supports auto-create queues for JMS, and the queue name must be prefixed by
             # 'jms.queue.'
@@ -326,43 +503,142 @@ class AmqpTypeTestCase(unittest.TestCase):
             queue_name = 'jms.queue.qpid-interop.amqp_types_test.%s.%s.%s' % \
                          (amqp_type, send_shim.NAME, receive_shim.NAME)
 
-            # Start the receive shim first (for queueless brokers/dispatch)
-            receiver = receive_shim.create_receiver(receiver_addr, queue_name, amqp_type,
-                                                    str(len(test_value_list)))
-            receiver.start()
-
-            # Start the send shim
-            sender = send_shim.create_sender(sender_addr, queue_name, amqp_type,
-                                             dumps(test_value_list))
-            sender.start()
-
-            # Wait for both shims to finish
-            sender.join_or_kill(qpid_interop_test.shims.THREAD_TIMEOUT)
-            receiver.join_or_kill(qpid_interop_test.shims.THREAD_TIMEOUT)
-
-            # Process return string from sender
-            send_obj = sender.get_return_object()
-            if send_obj is not None:
-                if isinstance(send_obj, str):
-                    if len(send_obj) > 0:
-                        self.fail('Send shim \'%s\':\n%s' % (send_shim.NAME, send_obj))
-                else:
-                    self.fail('Sender error: %s' % str(send_obj))
-
-            # Process return string from receiver
+            timing_key = (amqp_type, send_shim.NAME, receive_shim.NAME)
+            sender, receiver = self.exchange_values(sender_addr, receiver_addr, queue_name, amqp_type, test_value_list,
+                                                    TYPES.get_json_test_values(amqp_type), send_shim, receive_shim,
+                                                    timing_key)
+            try:
+                self.check_exchange(sender, receiver, amqp_type, test_value_list, send_shim)
+            except self.failureException as exc:
+                if TYPES.num_fuzz_values > 0 and amqp_type in TYPES.SHRINK_HEX_DIGITS:
+                    failed_value = self.get_failed_value(receiver, test_value_list)
+                    if failed_value is not None:
+                        self.fail('%s\n%s' % (exc, self.shrink_failed_value(sender_addr, receiver_addr, queue_name,
+                                                                            amqp_type, failed_value, send_shim,
+                                                                            receive_shim)))
+                raise
+            TIMING_STORE.record_duration(timing_key, [sender, receiver])
+            print_latency(receiver.get_latency_histogram())
+
+    @staticmethod
+    def exchange_values(sender_addr, receiver_addr, queue_name, amqp_type, test_value_list, json_test_values,
+                        send_shim, receive_shim, timing_key, timeout=None):
+        """
+        Send test_value_list (serialized as json_test_values) from send_shim to receive_shim through queue_name, and
+        wait for both shims to finish, within timeout seconds if given (otherwise within the timeout derived for
+        timing_key). Return a tuple (sender, receiver) of the finished shim workers.
+        """
+        # Start the receive shim first (for queueless brokers/dispatch)
+        receiver = receive_shim.create_receiver(receiver_addr, queue_name, amqp_type, str(len(test_value_list)))
+        receiver.compare_values(test_value_list) # Fail at the first wrong value if the receiver streams them
+        receiver.start()
+
+        # Start the send shim
+        sender = send_shim.create_sender(sender_addr, queue_name, amqp_type, json_test_values)
+        sender.start()
+
+        # Wait for both shims to finish, with a timeout based on previous runs of this test
+        TIMING_STORE.join_or_kill(timing_key, [sender, receiver], timeout)
+        qpid_interop_test.runner.finish_exchange(PHASE_REPORT, timing_key, [sender, receiver])
+        return sender, receiver
+
+    def check_exchange(self, sender, receiver, amqp_type, test_value_list, send_shim):
+        """Check the results of an exchange of test_value_list between sender and receiver (see exchange_values())"""
+        value_mismatch = receiver.get_value_mismatch()
+        if value_mismatch is not None:
+            self.fail(value_mismatch)
+        self.check_send_obj(sender.get_return_object(), send_shim)
+        self.check_receive_obj(receiver.get_return_object(), amqp_type, amqp_type, test_value_list)
+
+    @staticmethod
+    def get_failed_value(receiver, test_value_list):
+        """
+        Return the first value of test_value_list which receiver did not receive as sent, or None if it is not known
+        (for example if the sender failed)
+        """
+        index = receiver.get_value_mismatch_index()
+        if index is None:
             receive_obj = receiver.get_return_object()
-            if isinstance(receive_obj, tuple):
-                if len(receive_obj) == 2:
-                    return_amqp_type, return_test_value_list = receive_obj
-                    self.assertEqual(return_amqp_type, amqp_type,
-                                     msg='AMQP type error:\n\n    sent:%s\n\n    received:%s' % \
-                                     (amqp_type, return_amqp_type))
-                    self.assertEqual(return_test_value_list, test_value_list, msg='\n    sent:%s\nreceived:%s' % \
-                                     (test_value_list, return_test_value_list))
-                else:
-                    self.fail('Received incorrect tuple format: %s' % str(receive_obj))
+            if isinstance(receive_obj, tuple) and len(receive_obj) == 2:
+                index = find_value_list_mismatch(test_value_list, receive_obj[1])
+        if index is None or index >= len(test_value_list):
+            return None
+        return test_value_list[index]
+
+    def shrink_failed_value(self, sender_addr, receiver_addr, queue_name, amqp_type, failed_value, send_shim,
+                            receive_shim):
+        """
+        Shrink failed_value (see value_generator.shrink_value()) by exchanging smaller values on their own between the
+        same shims, and return a description of the smallest value which still fails. Each exchange of a single value
+        has the timeout of the failed test, limited to SHRINK_STEP_TIMEOUT, and no further values are tried once
+        SHRINK_TIME_BUDGET has passed.
+        """
+        shrink_queue_name = '%s.shrink' % queue_name # Keep clear of any messages left in the queue by the failed test
+        timing_key = ('%s.shrink' % amqp_type, send_shim.NAME, receive_shim.NAME)
+        step_timeout = min(TIMING_STORE.get_timeout((amqp_type, send_shim.NAME, receive_shim.NAME)),
+                           SHRINK_STEP_TIMEOUT)
+        deadline = time() + SHRINK_TIME_BUDGET
+
+        def fails(value):
+            """Return True if exchanging value on its own fails"""
+            sender, receiver = self.exchange_values(sender_addr, receiver_addr, shrink_queue_name, amqp_type, [value],
+                                                    dumps([value]), send_shim, receive_shim, timing_key,
+                                                    step_timeout)
+            try:
+                self.check_exchange(sender, receiver, amqp_type, [value], send_shim)
+            except self.failureException:
+                return True
+            return False
+
+        if not fails(failed_value):
+            return 'Failing value %s does not fail when sent on its own' % abbreviate(failed_value)
+        smallest_value, num_tried = shrink_value(failed_value, fails, TYPES.SHRINK_HEX_DIGITS[amqp_type],
+                                                 ARGS.shrink_limit, deadline)
+        return 'Smallest failing value (after trying %d smaller values%s): %s' % \
+               (num_tried, ' until the time limit' if time() >= deadline else '', abbreviate(smallest_value))
+
+    def run_aggregate_test(self, amqp_type, test_value_list, send_shim, receive_shim):
+        """
+        Check the values of amqp_type received by the aggregate exchange between send_shim and receive_shim (which is
+        run by the first test of this shim pair to get here). In latency mode, the latency of the whole exchange is
+        printed by the test which ran it.
+        """
+        send_obj, receive_obj, latency_histogram = self.aggregate_exchange.get_result(send_shim, receive_shim)
+        self.check_send_obj(send_obj, send_shim)
+        if isinstance(receive_obj, tuple) and len(receive_obj) == 2 and isinstance(receive_obj[1], dict):
+            return_key, return_value_map = receive_obj
+            if amqp_type not in return_value_map:
+                self.fail('Received no values for AMQP type \'%s\' in aggregate result: %s' %
+                          (amqp_type, str(receive_obj)))
+            receive_obj = (return_key, return_value_map[amqp_type])
+        self.check_receive_obj(receive_obj, AGGREGATE_TEST_KEY, amqp_type, test_value_list)
+        print_latency(latency_histogram)
+
+    def check_send_obj(self, send_obj, send_shim):
+        """Process return object from sender"""
+        if send_obj is not None:
+            if isinstance(send_obj, str):
+                if len(send_obj) > 0:
+                    self.fail('Send shim \'%s\':\n%s' % (send_shim.NAME, send_obj))
             else:
-                self.fail('Received non-tuple: %s' % str(receive_obj))
+                self.fail('Sender error: %s' % str(send_obj))
+
+    def check_receive_obj(self, receive_obj, test_key, amqp_type, test_value_list):
+        """Process return object from receiver, which should contain test_key and the values in test_value_list"""
+        if isinstance(receive_obj, tuple):
+            if len(receive_obj) == 2:
+                return_test_key, return_test_value_list = receive_obj
+                self.assertEqual(return_test_key, test_key,
+                                 msg='AMQP type error:\n\n    sent:%s\n\n    received:%s' % \
+                                 (test_key, return_test_key))
+                value_mismatch = describe_value_list_mismatch(test_value_list, return_test_value_list)
+                if value_mismatch is not None:
+                    self.fail(value_mismatch)
+            else:
+                self.fail('Received incorrect tuple format: %s' % str(receive_obj))
+        else:
+            self.fail('Received non-tuple: %s' % str(receive_obj))
+
 
 def create_testcase_class(amqp_type, shim_product):
     """
@@ -387,6 +663,9 @@ def create_testcase_class(amqp_type, shim_product):
                           receive_shim)
 
         inner_test_method.__name__ = 'test_%s_%s->%s' % (amqp_type, send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          TYPES.get_json_test_values(amqp_type)))
         setattr(cls, inner_test_method.__name__, inner_test_method)
 
     class_name = amqp_type.title() + 'TestCase'
@@ -396,7 +675,8 @@ def create_testcase_class(amqp_type, shim_product):
                   'amqp_type': amqp_type,
                   'sender_addr': ARGS.sender,
                   'receiver_addr': ARGS.receiver,
-                  'test_value_list': TYPES.get_test_values(amqp_type)}
+                  'test_value_list': TYPES.get_test_values(amqp_type),
+                  'aggregate_exchange': AGGREGATE_EXCHANGE}
     new_class = type(class_name, (AmqpTypeTestCase,), class_dict)
     for send_shim, receive_shim in shim_product:
         add_test_method(new_class, send_shim, receive_shim)
@@ -407,18 +687,32 @@ class TestOptions(object):
     """
     Class controlling command-line arguments used to control the test.
     """
-    def __init__(self, shim_map):
+    def __init__(self, shim_map, argv=None):
         parser = argparse.ArgumentParser(description='Qpid-interop AMQP client interoparability test suite '
                                          'for AMQP simple types')
-        parser.add_argument('--sender', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
-                            help='Node to which test suite will send messages.')
-        parser.add_argument('--receiver', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
-                            help='Node from which test suite will receive messages.')
-        parser.add_argument('--no-skip', action='store_true',
-                            help='Do not skip tests that are excluded by default for reasons of a known bug')
-        parser.add_argument('--broker-type', action='store', metavar='BROKER_NAME',
-                            help='Disable test of broker type (using connection properties) by specifying the broker' +
-                            ' name, or "None".')
+        qpid_interop_test.runner.add_common_options(parser)
+        parser.add_argument('--latency', action='store_true',
+                            help='Measure the latency of each message, and print latency percentiles for each ' +
+                            'test (for shims which support latency mode)')
+        parser.add_argument('--seed', action='store', type=int, default=DEFAULT_SEED, metavar='N',
+                            help='Seed from which the test values which are not fixed (timestamps, UUIDs and ' +
+                            'random values) are generated. Runs with the same seed use the same test values. ' +
+                            'Default: %d' % DEFAULT_SEED)
+        parser.add_argument('--random-values', action='store', type=int, default=0, metavar='N',
+                            help='Number of random values of each type to test in addition to the fixed test ' +
+                            'values, generated from --seed. Default: 0')
+        parser.add_argument('--fuzz-values', action='store', type=int, default=0, metavar='N',
+                            help='Number of fuzz values of each type to test in addition to the fixed test values, ' +
+                            'generated from --seed. Fuzz values favour edge cases, and failing values are shrunk to ' +
+                            'the smallest value which still fails. Use a --payload-mode other than argv for large ' +
+                            'numbers of values. Default: 0')
+        parser.add_argument('--shrink-limit', action='store', type=int, default=DEFAULT_SHRINK_LIMIT, metavar='N',
+                            help='Largest number of smaller values tried when shrinking a failing fuzz value. ' +
+                            'Default: %(default)s')
+        parser.add_argument('--aggregate', action='store_true',
+                            help='Exchange the values of all AMQP types under test over a single connection for ' +
+                            'each shim pair rather than one connection per type (shim pairs which do not support ' +
+                            'this use one connection per type)')
         type_group = parser.add_mutually_exclusive_group()
         type_group.add_argument('--include-type', action='append', metavar='AMQP-TYPE',
                                 help='Name of AMQP type to include. Supported types:\n%s' %
@@ -430,18 +724,17 @@ class TestOptions(object):
                                 help='Name of shim to include. Supported shims:\n%s' % sorted(shim_map.keys()))
         shim_group.add_argument('--exclude-shim', action='append', metavar='SHIM-NAME',
                             help='Name of shim to exclude. Supported shims: see "include-shim" above')
-        self.args = parser.parse_args()
+        self.args = parser.parse_args(argv)
 
 
-#--- Main program start ---
-
-if __name__ == '__main__':
+def create_shim_map():
+    """
+    Return a map of the name of each client language shim that is to be tested as a part of this test to an
+    instance of the shim. For every shim in this map, a test is dynamically constructed which tests it against itself
+    as well as every other shim in the map.
 
-    # SHIM_MAP contains an instance of each client language shim that is to be tested as a part of this test. For
-    # every shim in this list, a test is dynamically constructed which tests it against itself as well as every
-    # other shim in the list.
-    #
-    # As new shims are added, add them into this map to have them included in the test cases.
+    As new shims are added, add them into this map to have them included in the test cases.
+    """
     PROTON_CPP_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'amqp_types_test', 'Receiver')
     PROTON_CPP_SENDER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'amqp_types_test', 'Sender')
     PROTON_PYTHON_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-python', 'amqp_types_test', 'Receiver.py')
@@ -453,7 +746,7 @@ if __name__ == '__main__':
     PROTON_GO_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-go', 'amqp_types_test', 'Receiver')
     PROTON_GO_SENDER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-go', 'amqp_types_test', 'Sender')
 
-    SHIM_MAP = {qpid_interop_test.shims.ProtonCppShim.NAME: \
+    shim_map = {qpid_interop_test.shims.ProtonCppShim.NAME: \
                     qpid_interop_test.shims.ProtonCppShim(PROTON_CPP_SENDER_SHIM, PROTON_CPP_RECEIVER_SHIM),
                 qpid_interop_test.shims.ProtonPythonShim.NAME: \
                     qpid_interop_test.shims.ProtonPythonShim(PROTON_PYTHON_SENDER_SHIM, PROTON_PYTHON_RECEIVER_SHIM),
@@ -461,81 +754,59 @@ if __name__ == '__main__':
     # Add shims that need detection during installation only if the necessary bits are present
     # Rhea Javascript client
     if path.isfile(PROTON_RHEAJS_RECEIVER_SHIM) and path.isfile(PROTON_RHEAJS_SENDER_SHIM):
-        SHIM_MAP[qpid_interop_test.shims.RheaJsShim.NAME] = \
+        shim_map[qpid_interop_test.shims.RheaJsShim.NAME] = \
             qpid_interop_test.shims.RheaJsShim(PROTON_RHEAJS_SENDER_SHIM, PROTON_RHEAJS_RECEIVER_SHIM)
     else:
         print 'WARNING: Rhea Javascript shims not installed'
     # AMQP DotNetLite client
     if path.isfile(AMQPNETLITE_RECEIVER_SHIM) and path.isfile(AMQPNETLITE_SENDER_SHIM):
-        SHIM_MAP[qpid_interop_test.shims.AmqpNetLiteShim.NAME] = \
+        shim_map[qpid_interop_test.shims.AmqpNetLiteShim.NAME] = \
             qpid_interop_test.shims.AmqpNetLiteShim(AMQPNETLITE_SENDER_SHIM, AMQPNETLITE_RECEIVER_SHIM)
     else:
         print 'WARNING: AMQP DotNetLite shims not installed'
     # Proton Go client
     if path.isfile(PROTON_GO_RECEIVER_SHIM) and path.isfile(PROTON_GO_SENDER_SHIM):
-        SHIM_MAP[qpid_interop_test.shims.ProtonGoShim.NAME] = \
+        shim_map[qpid_interop_test.shims.ProtonGoShim.NAME] = \
             qpid_interop_test.shims.ProtonGoShim(PROTON_GO_SENDER_SHIM, PROTON_GO_RECEIVER_SHIM)
     else:
         print 'WARNING: Proton Go shims not installed'
-    ARGS = TestOptions(SHIM_MAP).args
-    #print 'ARGS:', ARGS # debug
+    return shim_map
 
-    # Add shims included from the command-line
-    if ARGS.include_shim is not None:
-        new_shim_map = {}
-        for shim in ARGS.include_shim:
-            try:
-                new_shim_map[shim] = SHIM_MAP[shim]
-            except KeyError:
-                print 'No such shim: "%s". Use --help for valid shims' % shim
-                sys.exit(1) # Errors or failures present
-        SHIM_MAP = new_shim_map
-    # Remove shims excluded from the command-line
-    elif ARGS.exclude_shim is not None:
-        for shim in ARGS.exclude_shim:
-            try:
-                SHIM_MAP.pop(shim)
-            except KeyError:
-                print 'No such shim: "%s". Use --help for valid shims' % shim
-                sys.exit(1) # Errors or failures present
-
-    # Connect to broker to find broker type, or use --broker-type param if present
-    if ARGS.broker_type is not None:
-        if ARGS.broker_type == 'None':
-            BROKER = None
-        else:
-            BROKER = ARGS.broker_type
-    else:
-        CONNECTION_PROPS = qpid_interop_test.broker_properties.get_broker_properties(ARGS.sender)
-        if CONNECTION_PROPS is None:
-            print 'WARNING: Unable to get connection properties - unknown broker'
-            BROKER = 'unknown'
-        else:
-            BROKER = CONNECTION_PROPS[symbol(u'product')] if symbol(u'product') in CONNECTION_PROPS \
-                     else '<product not found>'
-            BROKER_VERSION = CONNECTION_PROPS[symbol(u'version')] if symbol(u'version') in CONNECTION_PROPS \
-                             else '<version not found>'
-            BROKER_PLATFORM = CONNECTION_PROPS[symbol(u'platform')] if symbol(u'platform') in CONNECTION_PROPS \
-                              else '<platform not found>'
-            print 'Test Broker: %s v.%s on %s' % (BROKER, BROKER_VERSION, BROKER_PLATFORM)
-            print
-            sys.stdout.flush()
-            if ARGS.no_skip:
-                BROKER = None # Will cause all tests to run
-
-    TYPES = AmqpPrimitiveTypes().get_types(ARGS)
-
-    # TEST_SUITE is the final suite of tests that will be run and which contains all the dynamically created
-    # type classes, each of which contains a test for the combinations of client shims
-    TEST_SUITE = unittest.TestSuite()
-
-    # Create test classes dynamically
-    for at in sorted(TYPES.get_type_list()):
-        if ARGS.exclude_type is None or at not in ARGS.exclude_type:
-            test_case_class = create_testcase_class(at, product(SHIM_MAP.values(), repeat=2))
-            TEST_SUITE.addTest(unittest.makeSuite(test_case_class))
-
-    # Finally, run all the dynamically created tests
-    RES = unittest.TextTestRunner(verbosity=2).run(TEST_SUITE)
-    if not RES.wasSuccessful():
-        sys.exit(1) # Errors or failures present
+
+def create_test_suite(args, shim_map, broker, timing_store, result_store, phase_report):
+    """
+    Create the tests of this test suite for the options args, the shims in shim_map, the broker, the stores of
+    previous runs and the phase report (see qpid_interop_test.runner) and return them in a unittest.TestSuite
+    """
+    global ARGS, BROKER, TIMING_STORE, RESULT_STORE, PHASE_REPORT, TYPES, AGGREGATE_EXCHANGE
+    ARGS = args
+    BROKER = broker
+    TIMING_STORE = timing_store
+    RESULT_STORE = result_store
+    PHASE_REPORT = phase_report
+    TYPES = AmqpPrimitiveTypes(ARGS.seed, ARGS.random_values, ARGS.fuzz_values).get_types(ARGS)
+    test_type_list = [at for at in sorted(TYPES.get_type_list())
+                      if ARGS.exclude_type is None or at not in ARGS.exclude_type]
+
+    # In aggregate mode, the values of all types which are not skipped are exchanged in a single exchange per shim pair
+    AGGREGATE_EXCHANGE = None
+    if ARGS.aggregate:
+        AGGREGATE_EXCHANGE = AggregateTypeExchange(ARGS.sender, ARGS.receiver,
+                                                   dict((at, TYPES.get_test_values(at)) for at in test_type_list
+                                                        if len(TYPES.get_test_values(at)) > 0 and
+                                                        not TYPES.skip_test(at, BROKER)),
+                                                   TIMING_STORE, PHASE_REPORT)
+
+    # The test suite contains all the dynamically created type classes, each of which contains a test for the
+    # combinations of client shims
+    test_suite = unittest.TestSuite()
+    for at in test_type_list:
+        test_case_class = create_testcase_class(at, product(shim_map.values(), repeat=2))
+        test_suite.addTest(unittest.makeSuite(test_case_class))
+    return test_suite
+
+
+#--- Main program start ---
+
+if __name__ == '__main__':
+    qpid_interop_test.runner.run_suite_main(sys.modules[__name__])
@@ -1,6 +1,8 @@
 """
 Module containing a small client which connects to the broker and
 gets the broker connection properties so as to identify the broker.
+The properties are cached on disk for a short time, so that test suites
+run one after the other against the same broker do not each connect to it.
 """
 
 #
@@ -22,34 +24,271 @@ gets the broker connection properties so as to identify the broker.
 # under the License.
 #
 
+from json import dumps, load
+from os import getenv, makedirs, path, rename
+from socket import create_connection, error as socket_error
+from tempfile import NamedTemporaryFile
+from threading import Thread
+from time import sleep, time
+
+from proton import symbol, Url
 from proton.handlers import MessagingHandler
 from proton.reactor import Container
 
+DEFAULT_CACHE_FILE = path.join(getenv('HOME', '/tmp'), '.qpid-interop-test', 'broker_properties.json')
+DEFAULT_CACHE_TTL = 300.0 # seconds for which cached broker properties are used
+DEFAULT_CONNECT_TIMEOUT = 5.0 # seconds to establish the TCP connection to a broker
+DEFAULT_OPEN_TIMEOUT = 10.0 # seconds for the broker to open the AMQP connection once connected
+DEFAULT_RETRIES = 0 # further attempts after a failed probe
+DEFAULT_RETRY_DELAY = 1.0 # seconds before the first retry, doubled before each further retry
+
+
+class ProbePolicy(object):
+    """
+    Timeouts and reconnect policy for probing a broker. Each attempt must establish the TCP connection within
+    connect_timeout seconds, and the broker must then open the AMQP connection within open_timeout seconds. A failed
+    attempt is retried up to retries times, after retry_delay seconds, doubling the delay before each further retry.
+    """
+    def __init__(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, open_timeout=DEFAULT_OPEN_TIMEOUT,
+                 retries=DEFAULT_RETRIES, retry_delay=DEFAULT_RETRY_DELAY):
+        self.connect_timeout = connect_timeout
+        self.open_timeout = open_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+
+    def get_max_time(self):
+        """Return the longest time (seconds) a probe can take under this policy"""
+        attempt_time = self.connect_timeout + self.open_timeout
+        return attempt_time * (self.retries + 1) + self.retry_delay * (2 ** self.retries - 1)
+
+
+class BrokerIdentity(object):
+    """
+    Result of probing a broker at url: its connection properties (None if it sent none) and the product, version
+    and platform among them, or if it could not be reached, the reason in error. probe_time is the time the probe
+    took in seconds, and cached is True if the properties were taken from the cache instead.
+    """
+    def __init__(self, url, properties=None, error=None, probe_time=0.0, cached=False):
+        self.url = url
+        self.properties = properties
+        self.error = error
+        self.probe_time = probe_time
+        self.cached = cached
+        self.product = self._get_property('product')
+        self.version = self._get_property('version')
+        self.platform = self._get_property('platform')
+
+    def is_reachable(self):
+        """Return True if the broker opened a connection"""
+        return self.error is None
+
+    def _get_property(self, name):
+        """Return connection property name, or a placeholder if it is not present"""
+        if self.properties is None or symbol(name) not in self.properties:
+            return '<%s not found>' % name
+        return self.properties[symbol(name)]
+
+    def __str__(self):
+        if not self.is_reachable():
+            return '%s: unreachable (%s)' % (self.url, self.error)
+        return '%s v.%s on %s' % (self.product, self.version, self.platform)
+
+
 class Client(MessagingHandler):
     """
-    Client to connect to broker and collect connection properties, used to identify the test broker
+    Client to connect to broker and collect connection properties, used to identify the test broker. If the broker
+    has not opened the connection within open_timeout seconds, the client gives up. The connection is not retried
+    (see probe_broker()). If the connection fails, the reason is kept in error.
     """
-    def __init__(self, url):
+    def __init__(self, url, open_timeout=DEFAULT_OPEN_TIMEOUT):
         super(Client, self).__init__()
         self.url = url
+        self.open_timeout = open_timeout
         self.remote_properties = None
+        self.error = None
+        self.connection = None
+        self.timer_task = None
 
     def on_start(self, event):
         """Event loop start"""
-        event.container.connect(url=self.url, sasl_enabled=False)
+        self.connection = event.container.connect(url=self.url, sasl_enabled=False, reconnect=False)
+        self.timer_task = event.container.schedule(self.open_timeout, self)
 
     def on_connection_remote_open(self, event):
         """Callback for remote connection open"""
         self.remote_properties = event.connection.remote_properties
+        self._cancel_timer()
         event.connection.close()
 
+    def on_transport_error(self, event):
+        """Callback for a failed connection: give up"""
+        condition = event.transport.condition
+        self.error = 'Connection failed: %s' % (condition.description if condition is not None else 'unknown error')
+        self._cancel_timer()
+
+    def on_timer_task(self, event):
+        """Callback for when the broker has not opened the connection within the timeout"""
+        self.timer_task = None
+        self.error = 'Broker did not open the connection within %s seconds' % self.open_timeout
+        self.connection.close()
+        event.container.stop()
+
+    def _cancel_timer(self):
+        """Cancel the timeout, which would otherwise keep the event loop running until it expires"""
+        if self.timer_task is not None:
+            self.timer_task.cancel()
+            self.timer_task = None
+
     def get_connection_properties(self):
         """Return the connection properties"""
         return self.remote_properties
 
 
-def get_broker_properties(broker_url):
-    """Start client, then return its connection properties"""
-    msg_handler = Client(broker_url)
-    Container(msg_handler).run()
-    return msg_handler.get_connection_properties()
+def check_connect(broker_url, timeout):
+    """
+    Return None if a TCP connection can be made to the broker at broker_url within timeout seconds, or the reason
+    if not. This fails much faster than an AMQP connection attempt when the broker is down or the address wrong.
+    """
+    url = Url(broker_url).defaults()
+    try:
+        create_connection((url.host, int(url.port)), timeout).close()
+    except socket_error as exc: # includes socket.timeout
+        return 'Unable to connect to %s:%s within %s seconds: %s' % (url.host, url.port, timeout, exc)
+    return None
+
+
+def probe_broker(broker_url, policy):
+    """Probe the broker at broker_url under ProbePolicy policy, and return its BrokerIdentity"""
+    start_time = time()
+    retry_delay = policy.retry_delay
+    error = None
+    for attempt in range(policy.retries + 1):
+        if attempt > 0:
+            sleep(retry_delay)
+            retry_delay *= 2
+        error = check_connect(broker_url, policy.connect_timeout)
+        if error is None:
+            client = Client(broker_url, policy.open_timeout)
+            Container(client).run()
+            error = client.error
+            if error is None:
+                return BrokerIdentity(broker_url, client.get_connection_properties(), probe_time=time() - start_time)
+    return BrokerIdentity(broker_url, error=error, probe_time=time() - start_time)
+
+
+def get_broker_properties(broker_url, cache_ttl=DEFAULT_CACHE_TTL, policy=None):
+    """
+    Return the connection properties of the broker at broker_url, or None if it could not be reached (or sent none).
+    See probe_brokers().
+    """
+    return probe_brokers([broker_url], cache_ttl, policy)[broker_url].properties
+
+
+def probe_brokers(broker_url_list, cache_ttl=DEFAULT_CACHE_TTL, policy=None):
+    """
+    Return a map of broker URL to BrokerIdentity for each URL in broker_url_list, for example the sender and receiver
+    addresses of a test suite. Identities cached within the last cache_ttl seconds are used; the other brokers are
+    probed concurrently under ProbePolicy policy (the default policy if None), and those reached are added to the
+    cache. A cache_ttl of 0 disables the cache.
+    """
+    if policy is None:
+        policy = ProbePolicy()
+    cache = BrokerPropertiesCache(DEFAULT_CACHE_FILE, cache_ttl)
+    identity_map = {}
+    probe_url_list = []
+    for broker_url in set(broker_url_list):
+        identity = cache.get(broker_url)
+        if identity is None:
+            probe_url_list.append(broker_url)
+        else:
+            identity_map[broker_url] = identity
+    thread_list = []
+    for broker_url in probe_url_list:
+        thread = Thread(name='probe_%s' % broker_url,
+                        target=lambda url=broker_url: identity_map.__setitem__(url, probe_broker(url, policy)))
+        thread.daemon = True
+        thread.start()
+        thread_list.append(thread)
+    deadline = time() + policy.get_max_time() + 1.0
+    for thread in thread_list:
+        thread.join(max(0.0, deadline - time()))
+    for broker_url in probe_url_list:
+        if broker_url not in identity_map:
+            identity_map[broker_url] = BrokerIdentity(broker_url, error='Probe did not finish in time',
+                                                      probe_time=policy.get_max_time())
+        elif identity_map[broker_url].is_reachable():
+            cache.put(identity_map[broker_url])
+    cache.save()
+    return identity_map
+
+
+class BrokerPropertiesCache(object):
+    """
+    Cache of broker connection properties keyed by broker URL, kept in a small JSON file shared by all test suites.
+    Only brokers which could be reached are cached.
+    Each entry holds the properties and the time at which they were obtained, and is used for ttl seconds. If ttl
+    is 0, nothing is read from or saved to the file.
+    """
+    def __init__(self, file_name, ttl):
+        self.file_name = file_name
+        self.ttl = ttl
+        self.updated_map = {} # broker URL -> cache entry added since the cache was loaded
+        self.entry_map = self._load() if ttl > 0 else {}
+
+    def get(self, broker_url):
+        """
+        Return the cached BrokerIdentity of the broker at broker_url, or None if there is none within the TTL. A
+        malformed entry (such as one edited by hand) is treated as absent, so that the broker is probed again.
+        """
+        entry = self.entry_map.get(broker_url)
+        try:
+            if entry is None or time() - entry['time'] > self.ttl:
+                return None
+            properties = entry['properties']
+            if properties is not None:
+                properties = dict((symbol(key), value) for key, value in properties.iteritems())
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+        return BrokerIdentity(broker_url, properties, cached=True)
+
+    def put(self, identity):
+        """Add the properties of the broker identified by BrokerIdentity identity to the cache"""
+        properties = identity.properties
+        if properties is not None:
+            properties = dict((unicode(key), value) for key, value in properties.iteritems())
+        entry = {'time': time(), 'properties': properties}
+        self.entry_map[identity.url] = entry
+        self.updated_map[identity.url] = entry
+
+    def save(self):
+        """
+        Save the entries added since the cache was loaded. The file is re-read first so that entries saved by other
+        test suites in the meantime are kept, and is then replaced atomically.
+        """
+        if self.ttl <= 0 or len(self.updated_map) == 0:
+            return
+        entry_map = self._load()
+        entry_map.update(self.updated_map)
+        try:
+            cache_str = dumps(entry_map, indent=2, sort_keys=True)
+            dir_name = path.dirname(path.abspath(self.file_name))
+            if not path.isdir(dir_name):
+                makedirs(dir_name)
+            with NamedTemporaryFile('w', dir=dir_name, delete=False) as tmp_file:
+                tmp_file.write(cache_str)
+            rename(tmp_file.name, self.file_name)
+        except (IOError, OSError, TypeError) as exc: # TypeError: property values which cannot be saved as JSON
+            print 'WARNING: Unable to save broker properties cache "%s": %s' % (self.file_name, exc)
+
+    def _load(self):
+        """Read the entries from the cache file, ignoring a missing or damaged file"""
+        if not path.isfile(self.file_name):
+            return {}
+        try:
+            with open(self.file_name, 'r') as cache_file:
+                entry_map = load(cache_file)
+            if isinstance(entry_map, dict):
+                return entry_map
+        except (IOError, ValueError) as exc:
+            print 'WARNING: Unable to read broker properties cache "%s": %s' % (self.file_name, exc)
+        return {}
@@ -0,0 +1,101 @@
+"""
+Module containing the client of the Java utility which serializes and deserializes the Java objects of JMS
+ObjectMessages (ObjCodecServer, in JavaObjUtils.jar), used by the Python shims instead of the pure-Python codec
+(qpid_interop_test.java_obj_serialization) if shim option "java_obj_codec" selects it (see
+qpid_interop_test.shim_utils.get_java_obj_codec()).
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from collections import OrderedDict
+from subprocess import PIPE, Popen
+
+from qpid_interop_test.interop_test_errors import InteropTestError
+
+# Main class of the Java utility, and the number of the most recent conversions which are cached
+JAVA_OBJ_CODEC_SERVER_CLASS = 'org.apache.qpid.interop_test.obj_util.ObjCodecServer'
+JAVA_OBJ_CODEC_CACHE_SIZE = 1024
+
+
+class JavaObjCodec(object):
+    """
+    Client of the Java utility ObjCodecServer, which serializes Java objects for JMS ObjectMessages and deserializes
+    them again. The JVM is started on first use and kept running for the rest of the shim process (all the tests of a
+    shim in server mode), so that its start-up time is paid once rather than once per value. Conversions go over a
+    pipe, one line per request and response, and the most recent cache_size of them are kept in an LRU cache, so that
+    repeated values do not reach the JVM at all.
+    """
+    def __init__(self, class_path, cache_size=JAVA_OBJ_CODEC_CACHE_SIZE):
+        self.class_path = class_path
+        self.cache_size = cache_size
+        self.cache = OrderedDict() # (command, argument) -> result, least recently used first
+        self.proc = None
+
+    def get_java_obj_bytes(self, java_class_str):
+        """
+        Return the bytes of the serialized Java object described by java_class_str, in the format
+        "<java_class_name>:<ctor_arg_str>" (eg 'java.lang.Integer:123')
+        """
+        if isinstance(java_class_str, unicode):
+            java_class_str = java_class_str.encode('utf-8')
+        return self._convert('E', java_class_str)
+
+    def get_java_obj_str(self, java_obj_bytes):
+        """
+        Return the string "<java_class_name>:<value>" of the Java object serialized in java_obj_bytes, its value
+        being that returned by its toString() method
+        """
+        return self._convert('D', java_obj_bytes).decode('utf-8')
+
+    def close(self):
+        """Stop the JVM, if running. It is started again if another conversion is requested."""
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+    def _convert(self, command, arg):
+        """Return the result of command on arg, from the cache or else from ObjCodecServer"""
+        key = (command, arg)
+        result = self.cache.pop(key, None)
+        if result is None:
+            result = self._request(command, arg)
+            if len(self.cache) >= self.cache_size:
+                self.cache.popitem(last=False)
+        self.cache[key] = result
+        return result
+
+    def _request(self, command, arg):
+        """Send request command with arg (as hex) to ObjCodecServer, starting it if needed, and return its result"""
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = Popen(['java', '-cp', self.class_path, JAVA_OBJ_CODEC_SERVER_CLASS], stdin=PIPE, stdout=PIPE)
+        try:
+            self.proc.stdin.write('%s %s\n' % (command, arg.encode('hex')))
+            self.proc.stdin.flush()
+            response = self.proc.stdout.readline().rstrip('\n')
+        except IOError:
+            response = ''
+        if response.startswith('OK '):
+            return response[3:].decode('hex')
+        if response.startswith('ERR '):
+            raise InteropTestError('JavaObjCodec: %s' % response[4:])
+        self.close()
+        raise InteropTestError('JavaObjCodec: No response from %s (class path "%s") to request %s %r' %
+                               (JAVA_OBJ_CODEC_SERVER_CLASS, self.class_path, command, arg))
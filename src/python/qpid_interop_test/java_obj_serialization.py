@@ -0,0 +1,431 @@
+"""
+Module containing a pure-Python encoder and decoder of the Java object serialization stream for the boxed primitive
+classes and String used in JMS ObjectMessages, producing the same bytes and strings as the Java utilities
+JavaObjToBytes and BytesToJavaObj (in JavaObjUtils.jar) without the need for a JVM. It is checked against the Java
+utility by src/python/tests/test_java_obj_serialization.py. Float and Double values are printed as by Java 19 and
+later (see _get_shortest_digits()): earlier versions of Java do not always print the shortest decimal, in which case
+shim option "java_obj_codec" selects the Java utility instead (see shim_utils.get_java_obj_codec()).
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+import math
+import re
+from struct import calcsize, error as struct_error, pack, unpack, unpack_from
+
+from qpid_interop_test.interop_test_errors import InteropTestError
+
+# Serialization stream constants, see the Java Object Serialization Specification, chapter 6
+STREAM_MAGIC = 0xaced
+STREAM_VERSION = 5
+TC_NULL = 0x70
+TC_REFERENCE = 0x71
+TC_CLASSDESC = 0x72
+TC_OBJECT = 0x73
+TC_STRING = 0x74
+TC_ENDBLOCKDATA = 0x78
+TC_LONGSTRING = 0x7c
+SC_WRITE_METHOD = 0x01
+SC_SERIALIZABLE = 0x02
+BASE_WIRE_HANDLE = 0x7e0000
+
+JAVA_STRING_CLASS = 'java.lang.String'
+JAVA_NUMBER_CLASS = 'java.lang.Number'
+
+# Serializable classes which can be encoded and decoded: class name -> (serialVersionUID, superclass name or None,
+# value field type code). Each has a single field, "value".
+JAVA_CLASS_MAP = {
+    'java.lang.Boolean': (-3665804199014368530, None, 'Z'),
+    'java.lang.Byte': (-7183698231559129828, JAVA_NUMBER_CLASS, 'B'),
+    'java.lang.Character': (3786198910865385080, None, 'C'),
+    'java.lang.Double': (-9172774392245257468, JAVA_NUMBER_CLASS, 'D'),
+    'java.lang.Float': (-2671257302660747028, JAVA_NUMBER_CLASS, 'F'),
+    'java.lang.Integer': (1360826667806852920, JAVA_NUMBER_CLASS, 'I'),
+    'java.lang.Long': (4290774380558885855, JAVA_NUMBER_CLASS, 'J'),
+    'java.lang.Short': (7515723908773894738, JAVA_NUMBER_CLASS, 'S'),
+    }
+JAVA_NUMBER_SERIAL_VERSION_UID = -8742448824652078965
+
+# Struct format of each primitive field type code
+FIELD_FORMAT_MAP = {'B': '>b', 'C': '>H', 'D': '>d', 'F': '>f', 'I': '>i', 'J': '>q', 'S': '>h', 'Z': '>?'}
+
+# Range of each integral field type code
+INTEGER_RANGE_MAP = {'B': (-2**7, 2**7 - 1), 'S': (-2**15, 2**15 - 1), 'I': (-2**31, 2**31 - 1),
+                     'J': (-2**63, 2**63 - 1)}
+
+INTEGER_RE = re.compile(r'^[+-]?[0-9]+$')
+HEX_RE = re.compile(r'^[0-9a-fA-F]+$')
+FLOATING_POINT_RE = re.compile(r'^[+-]?(NaN|Infinity|([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?[fFdD]?)$')
+
+# Java writes strings longer than this (in modified UTF-8 bytes) as TC_LONGSTRING
+MAX_SHORT_STRING_LENGTH = 0xffff
+
+# Values of each class which are checked against the Java utility (see src/python/tests)
+VERIFICATION_VALUE_MAP = {
+    'java.lang.Boolean': ['true', 'false', 'TRUE', 'no'],
+    'java.lang.Byte': ['-128', '0', '127'],
+    'java.lang.Character': [u'a', u'Z', u'\u00e9', u'\\x00', u'\\u20ac'],
+    'java.lang.Double': ['0.0', '-0.0', '3.141592654', '-2.71828182846', '1e7', '0.001', '1.0e-4', '4.9e-324',
+                         '1.7976931348623157e308', 'NaN', 'Infinity', '-Infinity'],
+    'java.lang.Float': ['0.0', '3.14159', '-2.71828', '1e7', '1.4e-45', '3.4028235e38', '0.1', 'NaN', '-Infinity'],
+    'java.lang.Integer': ['-2147483648', '-129', '-128', '-1', '0', '127', '128', '2147483647', '+5'],
+    'java.lang.Long': ['-9223372036854775808', '-1', '0', '9223372036854775807'],
+    'java.lang.Short': ['-32768', '-1', '0', '32767'],
+    JAVA_STRING_CLASS: [u'', u'Hello, world', u'"Hello, world"', u"Charlie's \"peach\"", u'\u0000\u00e9\u20ac',
+                        u'\U0001f600', u'x' * (MAX_SHORT_STRING_LENGTH + 1)],
+    }
+
+
+def serialize_java_obj(java_class_name, ctor_arg_str):
+    """
+    Return the serialized bytes of the Java object of class java_class_name constructed from the string
+    ctor_arg_str, as JavaObjToBytes would
+    """
+    if java_class_name == JAVA_STRING_CLASS:
+        return pack('>HH', STREAM_MAGIC, STREAM_VERSION) + _encode_string(ctor_arg_str)
+    if java_class_name not in JAVA_CLASS_MAP:
+        raise InteropTestError('Java class %s is not supported' % java_class_name)
+    field_type = JAVA_CLASS_MAP[java_class_name][2]
+    field_value = _parse_value(java_class_name, field_type, ctor_arg_str)
+    return pack('>HHB', STREAM_MAGIC, STREAM_VERSION, TC_OBJECT) + _encode_class_desc(java_class_name) + \
+           pack(FIELD_FORMAT_MAP[field_type], field_value)
+
+
+def deserialize_java_obj(obj_bytes):
+    """
+    Return (class name, value string) of the Java object serialized in obj_bytes, the value string being that
+    returned by its toString() method, as BytesToJavaObj would
+    """
+    reader = _StreamReader(obj_bytes)
+    if reader.read('>HH') != (STREAM_MAGIC, STREAM_VERSION):
+        raise InteropTestError('Not a Java serialization stream: %r' % obj_bytes[:4])
+    java_class_name, field_value = reader.read_object()
+    if reader.offset != len(obj_bytes):
+        raise InteropTestError('%d unexpected bytes after serialized Java object' % (len(obj_bytes) - reader.offset))
+    if java_class_name == JAVA_STRING_CLASS:
+        return java_class_name, field_value
+    return java_class_name, _format_value(JAVA_CLASS_MAP[java_class_name][2], field_value)
+
+
+class JavaObjSerializer(object):
+    """
+    Converts Java objects to and from their serialized bytes in Python, with the same interface as
+    qpid_interop_test.java_obj_codec.JavaObjCodec, which uses the Java utility instead
+    """
+    @staticmethod
+    def get_java_obj_bytes(java_class_str):
+        """
+        Return the bytes of the serialized Java object described by java_class_str, in the format
+        "<java_class_name>:<ctor_arg_str>" (eg 'java.lang.Integer:123')
+        """
+        colon_index = java_class_str.find(':')
+        if colon_index < 0:
+            raise InteropTestError('Incorrect argument format: %s' % java_class_str)
+        return serialize_java_obj(java_class_str[:colon_index], java_class_str[colon_index+1:])
+
+    @staticmethod
+    def get_java_obj_str(java_obj_bytes):
+        """Return the string "<java_class_name>:<value>" of the Java object serialized in java_obj_bytes"""
+        return u'%s:%s' % deserialize_java_obj(java_obj_bytes)
+
+
+def _parse_value(java_class_name, field_type, ctor_arg_str):
+    """Return the value of the field of type field_type of Java class java_class_name constructed from ctor_arg_str"""
+    if field_type == 'Z': # Boolean(String)
+        return ctor_arg_str.lower() == 'true'
+    if field_type == 'C': # As JavaObjToBytes: a single character, or '\xNN' or '\xNNNN'
+        code_units = _get_utf16_code_units(ctor_arg_str)
+        if len(code_units) == 1:
+            return code_units[0]
+        if len(code_units) in (4, 6) and HEX_RE.match(ctor_arg_str[2:]):
+            return int(ctor_arg_str[2:], 16)
+        raise InteropTestError('Malformed char string: "%s"' % ctor_arg_str)
+    if field_type in INTEGER_RANGE_MAP:
+        if INTEGER_RE.match(ctor_arg_str):
+            value = int(ctor_arg_str)
+            min_value, max_value = INTEGER_RANGE_MAP[field_type]
+            if min_value <= value <= max_value:
+                return value
+        raise InteropTestError('Invalid value for %s: "%s"' % (java_class_name, ctor_arg_str))
+    if not FLOATING_POINT_RE.match(ctor_arg_str.strip()):
+        raise InteropTestError('Invalid value for %s: "%s"' % (java_class_name, ctor_arg_str))
+    value_str = ctor_arg_str.strip().rstrip('fFdD').replace('Infinity', 'inf').replace('NaN', 'nan')
+    if field_type == 'D':
+        return float(value_str)
+    return _round_to_float32(value_str)
+
+
+def _round_to_float32(value_str):
+    """
+    Return the float (single precision) nearest to the decimal value_str, rounding it only once as Java
+    Float.parseFloat() does, rather than first to a double
+    """
+    value = float(value_str)
+    if math.isnan(value) or math.isinf(value) or value == 0.0:
+        return value
+    try:
+        exact_value = Fraction(Decimal(value_str))
+    except InvalidOperation:
+        return value
+    sign = -1.0 if exact_value < 0 else 1.0
+    exact_value = abs(exact_value)
+    exponent = max(int(math.floor(math.log(value * sign, 2))), -126)
+    # The float nearest to value may be on the other side of a power of two from it
+    while Fraction(2) ** exponent > exact_value and exponent > -126:
+        exponent -= 1
+    while Fraction(2) ** (exponent + 1) <= exact_value:
+        exponent += 1
+    quantum = Fraction(2) ** (exponent - 23)
+    scaled_value = exact_value / quantum
+    mantissa = int(scaled_value)
+    remainder = scaled_value - mantissa
+    if remainder > Fraction(1, 2) or (remainder == Fraction(1, 2) and mantissa % 2 == 1):
+        mantissa += 1
+    rounded_value = Fraction(mantissa) * quantum
+    if rounded_value >= Fraction(2) ** 128:
+        return sign * float('inf')
+    return sign * float(rounded_value)
+
+
+def _format_value(field_type, field_value):
+    """Return the string of field_value of type field_type as returned by toString() of its Java class"""
+    if field_type == 'Z':
+        return u'true' if field_value else u'false'
+    if field_type == 'C':
+        return _get_unicode([field_value])
+    if field_type in INTEGER_RANGE_MAP:
+        return unicode(field_value)
+    if math.isnan(field_value):
+        return u'NaN'
+    if math.isinf(field_value):
+        return u'Infinity' if field_value > 0 else u'-Infinity'
+    if field_value == 0.0:
+        return u'-0.0' if math.copysign(1.0, field_value) < 0 else u'0.0'
+    digits, exponent = _get_shortest_digits(field_value, field_type == 'F')
+    sign = u'-' if field_value < 0 else u''
+    if 1e-3 <= abs(field_value) < 1e7:
+        if exponent >= 0:
+            digits = digits.ljust(exponent + 1, '0')
+            return u'%s%s.%s' % (sign, digits[:exponent + 1], digits[exponent + 1:] or '0')
+        return u'%s0.%s%s' % (sign, '0' * (-exponent - 1), digits)
+    return u'%s%s.%sE%d' % (sign, digits[0], digits[1:] or '0', exponent)
+
+
+def _get_shortest_digits(value, is_float32):
+    """
+    Return (digits, decimal exponent of the first digit) of the (finite, non-zero) value as Java Float.toString() and
+    Double.toString() choose them: the decimals of at least two significant digits which round to the value are
+    considered, and of those with the fewest digits, the one closest to the value (or with an even last digit if two
+    are equally close). A value with a one-digit decimal is therefore printed with two digits, such as
+    Double.MIN_VALUE, 4.9E-324, rather than 5.0E-324.
+    """
+    exact_value = Decimal(abs(value)) # Exact binary value
+    first_exponent = exact_value.adjusted()
+    for num_digits in range(2, 18):
+        # The closest decimals of num_digits digits are those on either side of the value
+        unit_exponent = first_exponent - num_digits + 1
+        scaled_value = Fraction(exact_value) / Fraction(10) ** unit_exponent
+        lower_digits = int(scaled_value)
+        candidate_list = [lower_digits] if lower_digits == scaled_value else [lower_digits, lower_digits + 1]
+        candidate_list = [candidate for candidate in candidate_list
+                          if _rounds_to(value, '%de%d' % (candidate, unit_exponent), is_float32)]
+        if candidate_list:
+            digits = min(candidate_list, key=lambda candidate: (abs(candidate - scaled_value), candidate % 2))
+            digits_str = str(digits)
+            return digits_str.rstrip('0') or '0', unit_exponent + len(digits_str) - 1
+    raise InteropTestError('No decimal of at most 17 digits rounds to %r' % value)
+
+
+def _rounds_to(value, value_str, is_float32):
+    """Return True if the decimal value_str rounds to abs(value) in its type (float if is_float32, else double)"""
+    if is_float32:
+        return _round_to_float32(value_str) == abs(value)
+    return float(value_str) == abs(value)
+
+
+def _get_utf16_code_units(text):
+    """Return the list of UTF-16 code units of text, which is the representation of a Java String"""
+    if not isinstance(text, unicode):
+        text = text.decode('utf-8')
+    utf16_bytes = text.encode('utf-16-be')
+    return list(unpack('>%dH' % (len(utf16_bytes) // 2), utf16_bytes))
+
+
+def _get_unicode(code_units):
+    """Return the unicode string of the UTF-16 code_units of a Java String"""
+    try:
+        return pack('>%dH' % len(code_units), *code_units).decode('utf-16-be')
+    except UnicodeDecodeError: # Unpaired surrogates
+        return u''.join(unichr(code_unit) for code_unit in code_units)
+
+
+def _encode_modified_utf8(text):
+    """Return text in the modified UTF-8 encoding used by Java DataOutput.writeUTF()"""
+    encoded_chars = []
+    for code_unit in _get_utf16_code_units(text):
+        if 0 < code_unit < 0x80:
+            encoded_chars.append(chr(code_unit))
+        elif code_unit < 0x800:
+            encoded_chars.append(pack('BB', 0xc0 | (code_unit >> 6), 0x80 | (code_unit & 0x3f)))
+        else:
+            encoded_chars.append(pack('BBB', 0xe0 | (code_unit >> 12), 0x80 | ((code_unit >> 6) & 0x3f),
+                                      0x80 | (code_unit & 0x3f)))
+    return ''.join(encoded_chars)
+
+
+def _encode_utf(text):
+    """Return text encoded as by Java DataOutput.writeUTF(): its length in bytes, then its modified UTF-8 bytes"""
+    encoded_text = _encode_modified_utf8(text)
+    return pack('>H', len(encoded_text)) + encoded_text
+
+
+def _encode_string(text):
+    """Return the serialization of Java String text, long or not"""
+    encoded_text = _encode_modified_utf8(text)
+    if len(encoded_text) > MAX_SHORT_STRING_LENGTH:
+        return pack('>BQ', TC_LONGSTRING, len(encoded_text)) + encoded_text
+    return pack('>BH', TC_STRING, len(encoded_text)) + encoded_text
+
+
+def _encode_class_desc(java_class_name):
+    """Return the serialization of the class descriptor of java_class_name, including those of its superclasses"""
+    if java_class_name is None:
+        return pack('B', TC_NULL)
+    if java_class_name == JAVA_NUMBER_CLASS:
+        return pack('B', TC_CLASSDESC) + _encode_utf(java_class_name) + \
+               pack('>qBHB', JAVA_NUMBER_SERIAL_VERSION_UID, SC_SERIALIZABLE, 0, TC_ENDBLOCKDATA) + \
+               _encode_class_desc(None)
+    serial_version_uid, superclass_name, field_type = JAVA_CLASS_MAP[java_class_name]
+    return pack('B', TC_CLASSDESC) + _encode_utf(java_class_name) + \
+           pack('>qBHc', serial_version_uid, SC_SERIALIZABLE, 1, field_type) + _encode_utf('value') + \
+           pack('B', TC_ENDBLOCKDATA) + _encode_class_desc(superclass_name)
+
+
+class _StreamReader(object):
+    """Reads the serialization of a single Java object of a class in JAVA_CLASS_MAP or a String"""
+    def __init__(self, obj_bytes):
+        self.obj_bytes = obj_bytes
+        self.offset = 0
+        self.handles = [] # Objects and class descriptors in order of their handles
+
+    def read(self, struct_format):
+        """Read and return the values of struct_format"""
+        try:
+            values = unpack_from(struct_format, self.obj_bytes, self.offset)
+        except struct_error:
+            raise InteropTestError('Serialized Java object truncated at byte %d' % self.offset)
+        self.offset += calcsize(struct_format)
+        return values
+
+    def read_bytes(self, length):
+        """Read and return length bytes"""
+        if self.offset + length > len(self.obj_bytes):
+            raise InteropTestError('Serialized Java object truncated at byte %d' % self.offset)
+        self.offset += length
+        return self.obj_bytes[self.offset - length:self.offset]
+
+    def read_utf(self, length_format='>H'):
+        """Read and return a string written by Java DataOutput.writeUTF()"""
+        encoded_text = self.read_bytes(self.read(length_format)[0])
+        code_units = []
+        index = 0
+        while index < len(encoded_text):
+            byte = ord(encoded_text[index])
+            if byte >> 5 == 0x06 and index + 1 < len(encoded_text):
+                code_units.append(((byte & 0x1f) << 6) | (ord(encoded_text[index + 1]) & 0x3f))
+                index += 2
+            elif byte >> 4 == 0x0e and index + 2 < len(encoded_text):
+                code_units.append(((byte & 0x0f) << 12) | ((ord(encoded_text[index + 1]) & 0x3f) << 6) |
+                                  (ord(encoded_text[index + 2]) & 0x3f))
+                index += 3
+            elif byte < 0x80:
+                code_units.append(byte)
+                index += 1
+            else:
+                raise InteropTestError('Malformed modified UTF-8 string in serialized Java object')
+        return _get_unicode(code_units)
+
+    def read_object(self):
+        """Read an object and return (class name, value of its field "value", or the string for a String)"""
+        type_code = self.read('B')[0]
+        if type_code == TC_STRING or type_code == TC_LONGSTRING:
+            text = self.read_utf('>H' if type_code == TC_STRING else '>Q')
+            self.handles.append(text)
+            return JAVA_STRING_CLASS, text
+        if type_code == TC_REFERENCE:
+            return self._get_handle()
+        if type_code != TC_OBJECT:
+            raise InteropTestError('Unsupported serialized Java object type code 0x%02x' % type_code)
+        class_desc_list = self.read_class_desc()
+        if not class_desc_list or class_desc_list[0][0] not in JAVA_CLASS_MAP:
+            raise InteropTestError('Unsupported serialized Java class %s' %
+                                   (class_desc_list[0][0] if class_desc_list else None))
+        handle_index = len(self.handles)
+        self.handles.append(None)
+        field_map = {}
+        for _, flags, field_list in reversed(class_desc_list): # Field values of superclasses first
+            if flags & SC_WRITE_METHOD or not flags & SC_SERIALIZABLE:
+                raise InteropTestError('Unsupported serialized Java class flags 0x%02x' % flags)
+            for field_type, field_name in field_list:
+                if field_type in FIELD_FORMAT_MAP:
+                    field_map[field_name] = self.read(FIELD_FORMAT_MAP[field_type])[0]
+                else:
+                    field_map[field_name] = self.read_object()
+        java_class_name = class_desc_list[0][0]
+        if class_desc_list[0][2] != [(JAVA_CLASS_MAP[java_class_name][2], 'value')]:
+            raise InteropTestError('Unexpected fields of serialized Java class %s' % java_class_name)
+        self.handles[handle_index] = (java_class_name, field_map['value'])
+        return self.handles[handle_index]
+
+    def read_class_desc(self):
+        """Read a class descriptor, and return its list of (class name, flags, [(field type, field name)...]),
+        starting with the class itself and followed by its superclasses"""
+        type_code = self.read('B')[0]
+        if type_code == TC_NULL:
+            return []
+        if type_code == TC_REFERENCE:
+            return self._get_handle()
+        if type_code != TC_CLASSDESC:
+            raise InteropTestError('Unsupported serialized Java class descriptor type code 0x%02x' % type_code)
+        java_class_name = self.read_utf()
+        _, flags, num_fields = self.read('>qBH')
+        handle_index = len(self.handles)
+        self.handles.append(None)
+        field_list = []
+        for _ in range(num_fields):
+            field_type = self.read('c')[0]
+            field_name = self.read_utf()
+            if field_type not in FIELD_FORMAT_MAP:
+                self.read_object() # Class name of an object field
+            field_list.append((field_type, field_name))
+        if self.read('B')[0] != TC_ENDBLOCKDATA:
+            raise InteropTestError('Unsupported annotation of serialized Java class %s' % java_class_name)
+        class_desc_list = [(java_class_name, flags, field_list)] + self.read_class_desc()
+        self.handles[handle_index] = class_desc_list
+        return class_desc_list
+
+    def _get_handle(self):
+        """Read a back reference and return the object or class descriptor it refers to"""
+        handle = self.read('>I')[0] - BASE_WIRE_HANDLE
+        if not 0 <= handle < len(self.handles) or self.handles[handle] is None:
+            raise InteropTestError('Invalid back reference in serialized Java object: 0x%x' % handle)
+        return self.handles[handle]
@@ -31,9 +31,9 @@ from itertools import combinations, product
 from json import dumps
 from os import getenv, path
 
-from proton import symbol
-import qpid_interop_test.broker_properties
+import qpid_interop_test.runner
 import qpid_interop_test.shims
+from qpid_interop_test.result_store import get_test_input_map
 from qpid_interop_test.test_type_map import TestTypeMap
 
 
@@ -228,6 +228,14 @@ class JmsMessageTypes(TestTypeMap):
     BROKER_SKIP = {}
 
 
+def get_json_send_args(test_values, msg_hdrs, msg_props):
+    """
+    Return the test values, message headers and message properties sent by the send shim of a test, serialized as
+    JSON. These are the inputs of the test recorded in the result store (see get_test_input_map()).
+    """
+    return dumps([test_values, msg_hdrs, msg_props])
+
+
 class JmsMessageHdrsPropsTestCase(unittest.TestCase):
     """
     Abstract base class for JMS message headers and properties test cases
@@ -239,7 +247,9 @@ class JmsMessageHdrsPropsTestCase(unittest.TestCase):
         Run this test by invoking the shim send method to send the test values, followed by the shim receive method
         to receive the values. Finally, compare the sent values with the received values.
         """
-        queue_name = 'jms.queue.qpid-interop.jms_message_hdrs_props_tests.%s' % queue_name_fragment
+        # The queue name must be unique to this test so that tests may be run concurrently
+        queue_name = 'jms.queue.qpid-interop.jms_message_hdrs_props_tests.%s.%s.%s.%s' % \
+                     (jms_message_type, queue_name_fragment, send_shim.NAME, receive_shim.NAME)
 
         # First create a map containing the numbers of expected mesasges for each JMS message type
         num_test_values_map = {}
@@ -264,12 +274,13 @@ class JmsMessageHdrsPropsTestCase(unittest.TestCase):
 
         # Start the send shim
         sender = send_shim.create_sender(sender_addr, queue_name, jms_message_type,
-                                         dumps([test_values, msg_hdrs, msg_props]))
+                                         get_json_send_args(test_values, msg_hdrs, msg_props))
         sender.start()
 
-        # Wait for both shims to finish
-        sender.join_or_kill(qpid_interop_test.shims.THREAD_TIMEOUT)
-        receiver.join_or_kill(qpid_interop_test.shims.THREAD_TIMEOUT)
+        # Wait for both shims to finish, with a timeout based on previous runs of this test
+        test_key = (jms_message_type, queue_name_fragment, send_shim.NAME, receive_shim.NAME)
+        TIMING_STORE.join_or_kill(test_key, [sender, receiver])
+        qpid_interop_test.runner.finish_exchange(PHASE_REPORT, test_key, [sender, receiver])
 
         # Process return string from sender
         send_obj = sender.get_return_object()
@@ -304,6 +315,7 @@ class JmsMessageHdrsPropsTestCase(unittest.TestCase):
                         self.assertEqual(return_msg_props, msg_props,
                                          msg='JMS message properties error:\n\n    sent:%s\n\n    received:%s' % \
                                          (msg_props, return_msg_props))
+                        TIMING_STORE.record_duration(test_key, [sender, receiver])
                     else:
                         self.fail('Return value list needs 3 items, found %d items: %s' % (len(return_list),
                                                                                            str(return_list)))
@@ -365,6 +377,10 @@ def create_part_a_testcase_class():
 
         inner_test_method.__name__ = 'test.A.%s.%s%s.%s->%s' % (jms_message_type[4:-5], hdrs[0], props[0],
                                                                 send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          get_json_send_args(cls.test_values, hdrs[1],
+                                                                                             props[1])))
         setattr(cls, inner_test_method.__name__, inner_test_method)
 
     jms_message_type = 'JMS_MESSAGE_TYPE'
@@ -423,6 +439,10 @@ def create_part_b_testcase_class():
 
         inner_test_method.__name__ = 'test.B.%s.%s%s.%s->%s' % (jms_message_type[4:-5], hdrs[0], props[0],
                                                                 send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          get_json_send_args(cls.test_values, hdrs[1],
+                                                                                             props[1])))
         setattr(cls, inner_test_method.__name__, inner_test_method)
 
     jms_message_type = 'JMS_MESSAGE_TYPE'
@@ -494,6 +514,10 @@ def create_part_c_testcase_class():
 
         inner_test_method.__name__ = 'test.C.%s.%s%s.%s->%s' % (jms_message_type[4:-5], hdrs[0], props[0],
                                                                 send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          get_json_send_args(cls.test_values, hdrs[1],
+                                                                                             props[1])))
         setattr(cls, inner_test_method.__name__, inner_test_method)
 
     jms_message_type = 'JMS_MESSAGE_TYPE'
@@ -551,6 +575,10 @@ def create_part_d_testcase_class(jms_message_type):
 
         inner_test_method.__name__ = 'test.D.%s.%s%s.%s->%s' % (jms_message_type[4:-5], hdrs[0], props[0],
                                                                 send_shim.NAME, receive_shim.NAME)
+        inner_test_method = RESULT_STORE.track(inner_test_method,
+                                               lambda: get_test_input_map(send_shim, receive_shim,
+                                                                          get_json_send_args(cls.test_values, hdrs[1],
+                                                                                             props[1])))
         setattr(cls, inner_test_method.__name__, inner_test_method)
 
     jms_message_type = 'JMS_MESSAGE_TYPE'
@@ -593,18 +621,10 @@ class TestOptions(object):
     """
     Class controlling command-line arguments used to control the test.
     """
-    def __init__(self, shim_map):
+    def __init__(self, shim_map, argv=None):
         parser = argparse.ArgumentParser(description='Qpid-interop AMQP client interoparability test suite '
                                          'for JMS headers and properties')
-        parser.add_argument('--sender', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
-                            help='Node to which test suite will send messages.')
-        parser.add_argument('--receiver', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
-                            help='Node from which test suite will receive messages.')
-        parser.add_argument('--no-skip', action='store_true',
-                            help='Do not skip tests that are excluded by default for reasons of a known bug')
-        parser.add_argument('--broker-type', action='store', metavar='BROKER_NAME',
-                            help='Disable test of broker type (using connection properties) by specifying the broker' +
-                            ' name, or "None".')
+        qpid_interop_test.runner.add_common_options(parser)
         type_group = parser.add_mutually_exclusive_group()
         type_group.add_argument('--include-type', action='append', metavar='JMS_MESSAGE-TYPE',
                                 help='Name of AMQP type to include. Supported types:\n%s' %
@@ -616,13 +636,17 @@ class TestOptions(object):
                                 help='Name of shim to include. Supported shims:\n%s' % sorted(shim_map.keys()))
         shim_group.add_argument('--exclude-shim', action='append', metavar='SHIM-NAME',
                             help='Name of shim to exclude. Supported shims: see "include-shim" above')
-        self.args = parser.parse_args()
+        self.args = parser.parse_args(argv)
 
 
-#--- Main program start ---
-
-if __name__ == '__main__':
+def create_shim_map():
+    """
+    Return a map of the name of each client language shim that is to be tested as a part of this test to an
+    instance of the shim. For every shim in this map, a test is dynamically constructed which tests it against itself
+    as well as every other shim in the map.
 
+    As new shims are added, add them into this map to have them included in the test cases.
+    """
     PROTON_CPP_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'jms_hdrs_props_test', 'Receiver')
     PROTON_CPP_SENDER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-cpp', 'jms_hdrs_props_test', 'Sender')
     PROTON_PYTHON_RECEIVER_SHIM = path.join(QIT_TEST_SHIM_HOME, 'qpid-proton-python', 'jms_hdrs_props_test',
@@ -634,75 +658,38 @@ if __name__ == '__main__':
     QPID_JMS_RECEIVER_SHIM = 'org.apache.qpid.interop_test.jms_hdrs_props_test.Receiver'
     QPID_JMS_SENDER_SHIM = 'org.apache.qpid.interop_test.jms_hdrs_props_test.Sender'
 
-    # SHIM_MAP contains an instance of each client language shim that is to be tested as a part of this test. For
-    # every shim in this list, a test is dynamically constructed which tests it against itself as well as every
-    # other shim in the list.
-    #
-    # As new shims are added, add them into this map to have them included in the test cases.
-    SHIM_MAP = {qpid_interop_test.shims.ProtonCppShim.NAME: \
+    shim_map = {qpid_interop_test.shims.ProtonCppShim.NAME: \
                     qpid_interop_test.shims.ProtonCppShim(PROTON_CPP_SENDER_SHIM, PROTON_CPP_RECEIVER_SHIM),
                 qpid_interop_test.shims.ProtonPythonShim.NAME: \
                     qpid_interop_test.shims.ProtonPythonShim(PROTON_PYTHON_SENDER_SHIM, PROTON_PYTHON_RECEIVER_SHIM),
                 qpid_interop_test.shims.QpidJmsShim.NAME: \
                     qpid_interop_test.shims.QpidJmsShim(QIT_JMS_CLASSPATH, QPID_JMS_SENDER_SHIM, QPID_JMS_RECEIVER_SHIM),
                }
+    return shim_map
 
-    ARGS = TestOptions(SHIM_MAP).args
-    #print 'ARGS:', ARGS # debug
-
-    # Add shims included from the command-line
-    if ARGS.include_shim is not None:
-        new_shim_map = {}
-        for shim in ARGS.include_shim:
-            try:
-                new_shim_map[shim] = SHIM_MAP[shim]
-            except KeyError:
-                print 'No such shim: "%s". Use --help for valid shims' % shim
-                sys.exit(1) # Errors or failures present
-        SHIM_MAP = new_shim_map
-    # Remove shims excluded from the command-line
-    elif ARGS.exclude_shim is not None:
-        for shim in ARGS.exclude_shim:
-            try:
-                SHIM_MAP.pop(shim)
-            except KeyError:
-                print 'No such shim: "%s". Use --help for valid shims' % shim
-                sys.exit(1) # Errors or failures present
-
-    # Connect to broker to find broker type, or use --broker-type param if present
-    if ARGS.broker_type is not None:
-        if ARGS.broker_type == 'None':
-            BROKER = None
-        else:
-            BROKER = ARGS.broker_type
-    else:
-        CONNECTION_PROPS = qpid_interop_test.broker_properties.get_broker_properties(ARGS.sender)
-        if CONNECTION_PROPS is None:
-            print 'WARNING: Unable to get connection properties - unknown broker'
-            BROKER = 'unknown'
-        else:
-            BROKER = CONNECTION_PROPS[symbol(u'product')] if symbol(u'product') in CONNECTION_PROPS \
-                     else '<product not found>'
-            BROKER_VERSION = CONNECTION_PROPS[symbol(u'version')] if symbol(u'version') in CONNECTION_PROPS \
-                             else '<version not found>'
-            BROKER_PLATFORM = CONNECTION_PROPS[symbol(u'platform')] if symbol(u'platform') in CONNECTION_PROPS \
-                              else '<platform not found>'
-            print 'Test Broker: %s v.%s on %s' % (BROKER, BROKER_VERSION, BROKER_PLATFORM)
-            print
-            sys.stdout.flush()
-            if ARGS.no_skip:
-                BROKER = None # Will cause all tests to run
 
+def create_test_suite(args, shim_map, broker, timing_store, result_store, phase_report):
+    """
+    Create the tests of this test suite for the options args, the shims in shim_map, the broker, the stores of
+    previous runs and the phase report (see qpid_interop_test.runner) and return them in a unittest.TestSuite
+    """
+    global ARGS, BROKER, TIMING_STORE, RESULT_STORE, PHASE_REPORT, TYPES, SHIM_MAP, TEST_SUITE
+    ARGS = args
+    BROKER = broker
+    TIMING_STORE = timing_store
+    RESULT_STORE = result_store
+    PHASE_REPORT = phase_report
     TYPES = JmsMessageTypes().get_types(ARGS)
 
-    # TEST_SUITE is the final suite of tests that will be run and which contains all the dynamically created
-    # type classes, each of which contains a test for the combinations of client shims
+    # TEST_SUITE contains all the dynamically created type classes, each of which contains a test for the
+    # combinations of the client shims in SHIM_MAP
+    SHIM_MAP = shim_map
     TEST_SUITE = unittest.TestSuite()
-
-    # Create test classes dynamically
     create_testcases()
+    return TEST_SUITE
 
-    # Finally, run all the dynamically created tests
-    RES = unittest.TextTestRunner(verbosity=2).run(TEST_SUITE)
-    if not RES.wasSuccessful():
-        sys.exit(1)
+
+#--- Main program start ---
+
+if __name__ == '__main__':
+    qpid_interop_test.runner.run_suite_main(sys.modules[__name__])
@@ -0,0 +1,133 @@
+"""
+Module containing the test content shared by the Python large content test shims
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from collections import OrderedDict
+from hashlib import md5
+from string import ascii_lowercase
+
+from proton import symbol
+from qpid_interop_test.interop_test_errors import InteropTestError
+
+# Large content bodies and elements consist of this pattern repeated ("abcdef...xyzabcdef...") to the required size
+PATTERN = ascii_lowercase
+
+# Bodies are verified in chunks of this size. As it is a whole number of patterns, every chunk starts with 'a'.
+VERIFY_CHUNK_SIZE = len(PATTERN) * 40 * 1024 # approx 1 MB
+
+
+def create_pattern(size_bytes):
+    """
+    Create a string of size_bytes containing PATTERN repeated. The string is built by replicating whole copies of
+    PATTERN in a single operation rather than one character at a time.
+    """
+    num_blocks, remainder = divmod(size_bytes, len(PATTERN))
+    return PATTERN * num_blocks + PATTERN[:remainder]
+
+
+class PatternFactory(object):
+    """
+    Factory for pattern bodies of a given size as bytes, unicode or symbol. Recently created bodies are cached by type
+    and size so that bodies of the same size (in particular all the elements of one list or map) are the same object
+    rather than each being created separately. Only the CACHE_SIZE most recently used bodies are kept, so that the
+    memory held by the cache stays within a few bodies.
+    """
+
+    CACHE_SIZE = 4
+
+    def __init__(self):
+        self._cache = OrderedDict() # (type, size) -> body, least recently used first
+
+    def get_bytes(self, size_bytes):
+        """Return a pattern body of size_bytes as bytes (AMQP binary)"""
+        return self._get('binary', size_bytes, create_pattern)
+
+    def get_unicode(self, size_bytes):
+        """Return a pattern body of size_bytes as unicode (AMQP string)"""
+        return self._get('string', size_bytes, lambda size: create_pattern(size).decode('ascii'))
+
+    def get_symbol(self, size_bytes):
+        """Return a pattern body of size_bytes as a symbol (AMQP symbol)"""
+        return self._get('symbol', size_bytes, lambda size: symbol(create_pattern(size)))
+
+    def _get(self, body_type, size_bytes, create_func):
+        """Return the cached body of body_type and size_bytes, creating it using create_func(size_bytes) if needed"""
+        key = (body_type, size_bytes)
+        body = self._cache.pop(key, None)
+        if body is None:
+            while len(self._cache) >= self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+            body = create_func(size_bytes)
+        self._cache[key] = body
+        return body
+
+
+_VERIFY_CHUNK = create_pattern(VERIFY_CHUNK_SIZE)
+_VERIFY_CHUNK_UNICODE = _VERIFY_CHUNK.decode('ascii')
+
+
+def verify_pattern(value, digest):
+    """
+    Check that value (bytes, unicode or symbol) contains PATTERN repeated, one chunk at a time and without copying
+    value, and update digest (a hashlib object) with its content. Return the size of value. Raises InteropTestError
+    at the first chunk that does not match.
+    """
+    if isinstance(value, unicode): # includes symbol
+        expected_chunk = _VERIFY_CHUNK_UNICODE
+    elif isinstance(value, bytes):
+        expected_chunk = _VERIFY_CHUNK
+    else:
+        raise InteropTestError('Unexpected large content value type %s' % type(value))
+    size = len(value)
+    for offset in xrange(0, size, VERIFY_CHUNK_SIZE):
+        length = min(VERIFY_CHUNK_SIZE, size - offset)
+        expected = expected_chunk if length == VERIFY_CHUNK_SIZE else expected_chunk[:length]
+        if not value.startswith(expected, offset):
+            raise InteropTestError('Large content mismatch in bytes %d to %d of %d' % (offset, offset + length, size))
+        # A matching unicode chunk is all ASCII, so its bytes are those of the expected chunk; this avoids encoding it
+        digest.update(buffer(value, offset, length) if isinstance(value, bytes) else _VERIFY_CHUNK[:length])
+    return size
+
+
+def verify_body(body):
+    """
+    Verify a large content message body: a bytes, unicode or symbol pattern, or a list or map (values only) of
+    pattern elements which must all be the same size. Every element is checked. Return a tuple (tot_size, num_elts,
+    digest) where digest is the MD5 hex digest of the concatenated content. Raises InteropTestError on a mismatch.
+    """
+    digest = md5()
+    if isinstance(body, list):
+        elt_list = body
+    elif isinstance(body, dict):
+        elt_list = [body[key] for key in sorted(body.keys())]
+    else:
+        return (verify_pattern(body, digest), 1, digest.hexdigest())
+    tot_size = 0
+    elt_size = None
+    for elt in elt_list:
+        size = verify_pattern(elt, digest)
+        if elt_size is None:
+            elt_size = size
+        elif size != elt_size:
+            raise InteropTestError('Large content element size mismatch: expected %d, found %d' % (elt_size, size))
+        tot_size += size
+    return (tot_size, len(elt_list), digest.hexdigest())
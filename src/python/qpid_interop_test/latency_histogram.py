@@ -0,0 +1,132 @@
+"""
+Module containing a compact histogram of message latencies, shared by the test programs and the Python shims
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import sys
+
+from math import ceil
+
+# Each power of 2 range of values is divided into SUB_BUCKET_COUNT equal buckets, so that the width of a bucket is at
+# most 1/SUB_BUCKET_COUNT of the values in it (about 3%). Values below 2 * SUB_BUCKET_COUNT each have their own bucket.
+# The C++ shims use the same bucket layout (see shims/qpid-proton-cpp/src/qpidit/LatencyHistogram.hpp).
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+# Latency percentiles shown in test reports
+REPORT_PERCENTILES = [50, 99, 99.9]
+
+
+def get_bucket_index(value):
+    """Return the index of the bucket containing value (a non-negative integer)"""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKET_COUNT + (value >> shift) - SUB_BUCKET_COUNT
+
+
+def get_bucket_range(index):
+    """Return a tuple (lowest value, highest value) of the values in bucket index"""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return (index, index)
+    shift = index // SUB_BUCKET_COUNT - 1
+    low = (index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT) << shift
+    return (low, low + (1 << shift) - 1)
+
+
+class LatencyHistogram(object):
+    """
+    HDR-style histogram of integer latency values (normally in microseconds) with log-linear buckets, see
+    SUB_BUCKET_BITS. Only buckets containing values are kept. The histogram is exchanged between the shims and the
+    test programs as a JSON list of [lowest value in bucket, count] pairs in order of value (see to_list()), which
+    does not depend on the bucket layout of the shim that created it.
+    """
+    def __init__(self):
+        self.count_map = {} # bucket index -> number of values recorded in that bucket
+        self.total_count = 0
+        self.max_value = 0
+
+    def record(self, value, count=1):
+        """Record count occurrences of value. Negative values (from unsynchronized clocks) are recorded as 0."""
+        value = max(0, int(value))
+        index = get_bucket_index(value)
+        self.count_map[index] = self.count_map.get(index, 0) + count
+        self.total_count += count
+        self.max_value = max(self.max_value, value)
+
+    def merge(self, other):
+        """Add all the values recorded in histogram other to this histogram"""
+        for index, count in other.count_map.iteritems():
+            self.count_map[index] = self.count_map.get(index, 0) + count
+        self.total_count += other.total_count
+        self.max_value = max(self.max_value, other.max_value)
+
+    def get_count(self):
+        """Return the number of values recorded"""
+        return self.total_count
+
+    def get_percentile(self, percentile):
+        """
+        Return the value at percentile (0 to 100) using the nearest-rank method, as the highest value in its bucket
+        (but not more than the highest value recorded). Returns None if the histogram is empty.
+        """
+        if self.total_count == 0:
+            return None
+        rank = max(1, int(ceil(percentile / 100.0 * self.total_count)))
+        cumulative_count = 0
+        for index in sorted(self.count_map):
+            cumulative_count += self.count_map[index]
+            if cumulative_count >= rank:
+                return min(get_bucket_range(index)[1], self.max_value)
+        return self.max_value
+
+    def get_summary(self):
+        """Return a one-line summary of the REPORT_PERCENTILES of the histogram, for example 'p50=120us p99=...'"""
+        return ' '.join(['p%s=%sus' % (percentile, self.get_percentile(percentile))
+                         for percentile in REPORT_PERCENTILES])
+
+    def to_list(self):
+        """Return the histogram as a JSON-compatible list of [lowest value in bucket, count] pairs"""
+        return [[get_bucket_range(index)[0], self.count_map[index]] for index in sorted(self.count_map)]
+
+    @staticmethod
+    def from_list(bucket_list):
+        """
+        Return a new histogram created from a list of [value, count] pairs as returned by to_list(). As only the
+        lowest value of each bucket is known, the highest value recorded is taken as the highest value of the last
+        bucket.
+        """
+        histogram = LatencyHistogram()
+        for value, count in bucket_list:
+            histogram.record(value, count)
+        if len(histogram.count_map) > 0:
+            histogram.max_value = get_bucket_range(max(histogram.count_map))[1]
+        return histogram
+
+
+def print_latency(latency_histogram):
+    """
+    Print the summary of latency_histogram (as returned by a receiver shim worker in latency mode) on the current line
+    of the test report, if it is not None
+    """
+    if latency_histogram is not None:
+        print latency_histogram.get_summary(),
+        sys.stdout.flush()
@@ -0,0 +1,150 @@
+"""
+Module containing a report of the time spent in each phase of the tests of a test suite, which tells the start-up
+time of the shims apart from the latency of the broker and the time spent in the shims themselves
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import dump
+from math import ceil
+from os import makedirs, path
+from threading import Lock
+
+import qpid_interop_test.shim_protocol
+import qpid_interop_test.shims
+
+# Order of the phases in the summary, roughly that in which a test reaches them. Phases reported by a shim which
+# are not in this list follow in alphabetical order.
+PHASE_ORDER = [qpid_interop_test.shims.PHASE_SPAWN, qpid_interop_test.shim_protocol.PHASE_START,
+               qpid_interop_test.shims.PHASE_FIRST_OUTPUT, qpid_interop_test.shim_protocol.PHASE_CONNECT,
+               qpid_interop_test.shim_protocol.PHASE_LINK_ATTACH, qpid_interop_test.shim_protocol.PHASE_FIRST_MESSAGE,
+               qpid_interop_test.shim_protocol.PHASE_LAST_MESSAGE, qpid_interop_test.shim_protocol.PHASE_CLOSE,
+               qpid_interop_test.shims.PHASE_EXIT, qpid_interop_test.shims.PHASE_PARSE,
+               qpid_interop_test.shims.PHASE_KILL]
+
+
+class PhaseReport(object):
+    """
+    Report of the phases of each test of a test suite, as reached by each of its shims (see
+    shims.ShimWorker.get_phase_times()): the start, first output and exit of the shim process measured by the test
+    program, and the connection, link attach, first and last messages and close reported by the shim itself. All are
+    in seconds since the shim process was started, except for the durations shims.PHASE_PARSE and shims.PHASE_KILL.
+    The report is saved as JSON, holding the phases of every test and a summary of each phase over all the tests for
+    each kind of shim worker (sender or receiver), and the summary is printed as a table. If file_name is None,
+    nothing is recorded, saved or printed.
+    """
+
+    PERCENTILE = 95
+
+    def __init__(self, file_name, suite_name):
+        self.file_name = file_name
+        self.suite_name = suite_name
+        self.test_list = [] # {"suite": suite, "test": test key, "shims": {worker name: {phase: seconds}}} per test
+        self.lock = Lock()
+
+    def record(self, test_key, shim_worker_list, suite_name=None):
+        """
+        Record the phases reached by each of the (finished) shim workers in shim_worker_list in the test identified by
+        test_key (a tuple of strings) of test suite suite_name (default: the suite of the report)
+        """
+        if self.file_name is None:
+            return
+        shim_phase_map = dict((worker.name, worker.get_phase_times()) for worker in shim_worker_list
+                              if worker.start_time is not None)
+        with self.lock:
+            self.test_list.append({'suite': suite_name if suite_name is not None else self.suite_name,
+                                   'test': '/'.join(str(key) for key in test_key), 'shims': shim_phase_map})
+
+    def get_suite_report(self, suite_name):
+        """Return a SuitePhaseReport which records the phases of the tests of test suite suite_name in this report"""
+        return SuitePhaseReport(self, suite_name)
+
+    def get_summary(self):
+        """
+        Return a map of each kind of shim worker (the start of its name: sender or receiver) to a map of each phase
+        to its statistics over all the tests: {"count": n, "mean": s, "median": s, "p95": s, "max": s}
+        """
+        duration_map = {} # worker kind -> phase -> list of times
+        with self.lock:
+            for test in self.test_list:
+                for worker_name, phase_map in test['shims'].iteritems():
+                    kind_map = duration_map.setdefault(worker_name.split('_')[0], {})
+                    for phase, phase_time in phase_map.iteritems():
+                        kind_map.setdefault(phase, []).append(phase_time)
+        summary = {}
+        for kind, kind_map in duration_map.iteritems():
+            summary[kind] = {}
+            for phase, duration_list in kind_map.iteritems():
+                sorted_list = sorted(duration_list)
+                rank = int(ceil(self.PERCENTILE / 100.0 * len(sorted_list))) # nearest-rank percentile
+                summary[kind][phase] = {'count': len(sorted_list),
+                                        'mean': sum(sorted_list) / len(sorted_list),
+                                        'median': sorted_list[(len(sorted_list) - 1) // 2],
+                                        'p%d' % self.PERCENTILE: sorted_list[rank - 1],
+                                        'max': sorted_list[-1]}
+        return summary
+
+    def save(self):
+        """Write the report to the report file"""
+        if self.file_name is None:
+            return
+        dir_name = path.dirname(path.abspath(self.file_name))
+        if not path.isdir(dir_name):
+            makedirs(dir_name)
+        summary = self.get_summary()
+        with self.lock:
+            with open(self.file_name, 'w') as report_file:
+                dump({'suite': self.suite_name, 'tests': self.test_list, 'summary': summary}, report_file, indent=2,
+                     sort_keys=True)
+
+    def print_summary(self):
+        """Print the summary of the phases as a table, in milliseconds"""
+        if self.file_name is None:
+            return
+        summary = self.get_summary()
+        percentile_key = 'p%d' % self.PERCENTILE
+        print
+        print 'Test phases of %s (ms since shim start, except %s and %s: duration):' % \
+              (self.suite_name, qpid_interop_test.shims.PHASE_PARSE, qpid_interop_test.shims.PHASE_KILL)
+        print '  %-10s %-15s %7s %10s %10s %10s %10s' % ('Shim', 'Phase', 'Count', 'Mean', 'Median',
+                                                        percentile_key.upper(), 'Max')
+        for kind in sorted(summary):
+            phase_list = [phase for phase in PHASE_ORDER if phase in summary[kind]] + \
+                         sorted(phase for phase in summary[kind] if phase not in PHASE_ORDER)
+            for phase in phase_list:
+                stats = summary[kind][phase]
+                print '  %-10s %-15s %7d %10.1f %10.1f %10.1f %10.1f' % \
+                      (kind, phase, stats['count'], stats['mean'] * 1000.0, stats['median'] * 1000.0,
+                       stats[percentile_key] * 1000.0, stats['max'] * 1000.0)
+        print 'Test phase report: %s' % self.file_name
+
+
+class SuitePhaseReport(object):
+    """
+    The phases of the tests of a single test suite (suite_name) of a run, recorded in the PhaseReport of the run
+    (phase_report)
+    """
+    def __init__(self, phase_report, suite_name):
+        self.phase_report = phase_report
+        self.suite_name = suite_name
+
+    def record(self, test_key, shim_worker_list):
+        """Record the phases of the test identified by test_key (see PhaseReport.record())"""
+        self.phase_report.record(test_key, shim_worker_list, self.suite_name)
@@ -0,0 +1,342 @@
+"""
+Module containing machine-readable reporting of test results: a test runner which passes a record of each test to
+a list of reporters as soon as the test has completed, and reporters which stream the records as JSON lines and
+write them as JUnit XML
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import dumps
+from os import makedirs, path
+import re
+import sys
+from threading import local, Lock
+from time import time
+import unittest
+from xml.etree import ElementTree
+
+# Test status in each test record
+PASSED = 'pass'
+FAILED = 'fail'
+ERROR = 'error'
+SKIPPED = 'skip'
+EXPECTED_FAILURE = 'xfail'
+UNEXPECTED_SUCCESS = 'xpass'
+
+MAX_MESSAGE_LENGTH = 1000 # Longest failure message in a test record before it is truncated
+
+# Characters which may not appear in XML 1.0 (control characters other than tab, newline and carriage return,
+# U+FFFE, U+FFFF and, unless they encode characters beyond U+FFFF in a narrow Python build, surrogates), removed
+# from failure messages
+if sys.maxunicode > 0xffff:
+    _XML_INVALID_CHAR_RE = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+else:
+    _XML_INVALID_CHAR_RE = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Runs of the tests in progress, see start_test_run(). The exchanges of test values between shims of the test being
+# run on each thread are attributed to it, see record_exchange().
+_TEST_RUN_MAP = {} # test id -> _TestRun
+_TEST_RUN_LOCK = Lock()
+_CURRENT = local()
+
+
+class _TestRun(object):
+    """Timing and exchanges of a single run of a test"""
+    def __init__(self):
+        self.start_time = time()
+        self.finish_time = None
+        self.exchange_list = [] # (test key, total size of the test values sent) of each exchange of the test
+
+
+def start_test_run(test):
+    """
+    Record that test (a unittest.TestCase) has started on this thread, unless its start has already been recorded.
+    Called from startTest() of the test result with which the test is run.
+    """
+    _CURRENT.test_id = test.id()
+    with _TEST_RUN_LOCK:
+        if test.id() not in _TEST_RUN_MAP:
+            _TEST_RUN_MAP[test.id()] = _TestRun()
+
+
+def finish_test_run(test):
+    """
+    Record that test has finished, unless its finish has already been recorded. Called from stopTest() of the test
+    result with which the test is run.
+    """
+    with _TEST_RUN_LOCK:
+        test_run = _TEST_RUN_MAP.get(test.id())
+        if test_run is not None and test_run.finish_time is None:
+            test_run.finish_time = time()
+
+
+def record_exchange(test_key, shim_worker_list):
+    """
+    Record an exchange of test values between the (finished) shim workers in shim_worker_list, for the test identified
+    by test_key (the test type, any further key, then the names of the send and receive shims), as part of the test
+    being run on this thread
+    """
+    test_id = getattr(_CURRENT, 'test_id', None)
+    num_bytes = sum(worker.get_payload_size() for worker in shim_worker_list if worker.name.startswith('sender'))
+    with _TEST_RUN_LOCK:
+        test_run = _TEST_RUN_MAP.get(test_id)
+        if test_run is not None:
+            test_run.exchange_list.append((test_key, num_bytes))
+
+
+def _pop_test_run(test):
+    """Return the finished _TestRun of test, no longer recording it"""
+    with _TEST_RUN_LOCK:
+        test_run = _TEST_RUN_MAP.pop(test.id(), None)
+    if test_run is None:
+        test_run = _TestRun()
+    if test_run.finish_time is None:
+        test_run.finish_time = time()
+    return test_run
+
+
+def _clean_message(message):
+    """
+    Return failure message message as unicode which can be written as both JSON and XML: a message which is a byte
+    string (which may contain the raw bytes of a test value) is decoded as UTF-8, replacing invalid bytes, and the
+    characters which XML does not allow are removed. A message longer than MAX_MESSAGE_LENGTH is truncated, keeping its
+    last line (for a traceback, the exception).
+    """
+    if message is None:
+        return None
+    if not isinstance(message, unicode):
+        message = str(message).decode('utf-8', 'replace')
+    message = _XML_INVALID_CHAR_RE.sub(u'', message)
+    if len(message) > MAX_MESSAGE_LENGTH:
+        last_line = message.rstrip().rpartition(u'\n')[2][-MAX_MESSAGE_LENGTH:]
+        message = u'%s... (%d characters)\n%s' % (message[:MAX_MESSAGE_LENGTH], len(message), last_line)
+    return message
+
+
+class ResultReporter(object):
+    """
+    Parent class of the reporters of test records. report() is called with the record of each test as soon as it has
+    completed, a map containing:
+        suite: test suite name
+        test: test id (<module>.<test case class>.<test method>)
+        name: test method name
+        type: test type (such as the AMQP type or JMS message type), or None if the test exchanged no test values
+        shims: [send shim name, receive shim name], or None if the test exchanged no test values
+        broker: broker name
+        status: one of PASSED, FAILED, ERROR, SKIPPED, EXPECTED_FAILURE, UNEXPECTED_SUCCESS
+        message: the failure message, or the reason the test was skipped, or None
+        start_time: time at which the test started (seconds since the epoch)
+        duration: duration of the test (seconds)
+        bytes: total size of the test values sent by the send shims (in JSON), 0 if none were sent
+    close() is called once all the tests have completed.
+    """
+    def report(self, test_record):
+        """Report test_record of a completed test"""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish reporting once all the tests have completed"""
+        pass
+
+
+def _open_report_file(file_name):
+    """Open report file file_name for writing, creating its directory if needed. File name '-' is stdout."""
+    if file_name == '-':
+        return sys.stdout
+    dir_name = path.dirname(path.abspath(file_name))
+    if not path.isdir(dir_name):
+        makedirs(dir_name)
+    return open(file_name, 'w')
+
+
+class JsonLinesReporter(ResultReporter):
+    """
+    Writes each test record to file file_name ('-' for stdout) as a single line of JSON as soon as the test has
+    completed, so that the results of a long test run can be followed while it runs
+    """
+    def __init__(self, file_name):
+        self.report_file = _open_report_file(file_name)
+
+    def report(self, test_record):
+        self.report_file.write(dumps(test_record, sort_keys=True))
+        self.report_file.write('\n')
+        self.report_file.flush()
+
+    def close(self):
+        if self.report_file is not sys.stdout:
+            self.report_file.close()
+
+
+class JUnitXmlReporter(ResultReporter):
+    """Writes all the test records to file file_name as JUnit XML once all the tests have completed"""
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.test_record_list = []
+
+    def report(self, test_record):
+        self.test_record_list.append(test_record)
+
+    def close(self):
+        suite_map = {} # suite name -> test records of that suite
+        for test_record in self.test_record_list:
+            suite_map.setdefault(test_record['suite'], []).append(test_record)
+        testsuites = ElementTree.Element('testsuites')
+        for suite_name in sorted(suite_map):
+            test_record_list = suite_map[suite_name]
+            status_list = [test_record['status'] for test_record in test_record_list]
+            testsuite = ElementTree.SubElement(testsuites, 'testsuite', {
+                'name': suite_name,
+                'tests': str(len(test_record_list)),
+                'failures': str(status_list.count(FAILED) + status_list.count(UNEXPECTED_SUCCESS)),
+                'errors': str(status_list.count(ERROR)),
+                'skipped': str(status_list.count(SKIPPED)),
+                'time': '%.3f' % sum(test_record['duration'] for test_record in test_record_list),
+                })
+            for test_record in test_record_list:
+                testcase = ElementTree.SubElement(testsuite, 'testcase', {
+                    'classname': test_record['test'][:-len(test_record['name']) - 1],
+                    'name': test_record['name'],
+                    'time': '%.3f' % test_record['duration'],
+                    })
+                message = test_record['message'] or ''
+                summary = message.strip().split('\n')[-1] # Last line of a traceback is the exception
+                if test_record['status'] in [FAILED, UNEXPECTED_SUCCESS]:
+                    ElementTree.SubElement(testcase, 'failure', {'message': summary}).text = message
+                elif test_record['status'] == ERROR:
+                    ElementTree.SubElement(testcase, 'error', {'message': summary}).text = message
+                elif test_record['status'] == SKIPPED:
+                    ElementTree.SubElement(testcase, 'skipped', {'message': message})
+        report_file = _open_report_file(self.file_name)
+        try:
+            ElementTree.ElementTree(testsuites).write(report_file, encoding='utf-8')
+        finally:
+            if report_file is not sys.stdout:
+                report_file.close()
+
+
+def create_reporters(json_results_file_name, junit_xml_file_name):
+    """
+    Return the list of reporters for the (optional) command-line options giving a file for JSON lines (see
+    JsonLinesReporter) and for JUnit XML (see JUnitXmlReporter)
+    """
+    reporter_list = []
+    if json_results_file_name is not None:
+        reporter_list.append(JsonLinesReporter(json_results_file_name))
+    if junit_xml_file_name is not None:
+        reporter_list.append(JUnitXmlReporter(junit_xml_file_name))
+    return reporter_list
+
+
+class ReportingTestResult(unittest.TextTestResult):
+    """
+    Text test result which also passes the record of each test to the reporters of its ReportingTestRunner as soon as
+    the test has completed (see ResultReporter)
+    """
+    def __init__(self, stream, descriptions, verbosity, runner):
+        super(ReportingTestResult, self).__init__(stream, descriptions, verbosity)
+        self.runner = runner
+        self.status = None
+        self.message = None
+
+    def startTest(self, test):
+        start_test_run(test)
+        self.status = None
+        self.message = None
+        super(ReportingTestResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(ReportingTestResult, self).stopTest(test)
+        finish_test_run(test)
+        self.runner.report(test, _pop_test_run(test), self.status, self.message)
+
+    def addSuccess(self, test):
+        super(ReportingTestResult, self).addSuccess(test)
+        self.status = PASSED
+
+    def addFailure(self, test, err):
+        super(ReportingTestResult, self).addFailure(test, err)
+        self.status = FAILED
+        self.message = self.failures[-1][1]
+
+    def addError(self, test, err):
+        super(ReportingTestResult, self).addError(test, err)
+        self.status = ERROR
+        self.message = self.errors[-1][1]
+
+    def addSkip(self, test, reason):
+        super(ReportingTestResult, self).addSkip(test, reason)
+        self.status = SKIPPED
+        self.message = reason
+
+    def addExpectedFailure(self, test, err):
+        super(ReportingTestResult, self).addExpectedFailure(test, err)
+        self.status = EXPECTED_FAILURE
+        self.message = self.expectedFailures[-1][1]
+
+    def addUnexpectedSuccess(self, test):
+        super(ReportingTestResult, self).addUnexpectedSuccess(test)
+        self.status = UNEXPECTED_SUCCESS
+
+
+class ReportingTestRunner(unittest.TextTestRunner):
+    """
+    Text test runner (as unittest.TextTestRunner) which also passes the record of each test of test suite suite_name
+    run against broker broker_name to each of the reporters in reporter_list as soon as the test has completed, and
+    closes the reporters once all the tests have completed. If suite_name is None (tests of several suites), the
+    suite of each test is the name of the module of its test case.
+    """
+    def __init__(self, reporter_list, suite_name, broker_name, **kwargs):
+        super(ReportingTestRunner, self).__init__(**kwargs)
+        self.reporter_list = reporter_list
+        self.suite_name = suite_name
+        self.broker_name = str(broker_name)
+        self.report_lock = Lock()
+
+    def _makeResult(self):
+        return ReportingTestResult(self.stream, self.descriptions, self.verbosity, self)
+
+    def run(self, test):
+        try:
+            return super(ReportingTestRunner, self).run(test)
+        finally:
+            for reporter in self.reporter_list:
+                reporter.close()
+
+    def report(self, test, test_run, status, message):
+        """Pass the record of test, whose run was test_run, to each reporter"""
+        message = _clean_message(message)
+        test_key = test_run.exchange_list[0][0] if len(test_run.exchange_list) > 0 else None
+        suite_name = self.suite_name
+        if suite_name is None:
+            suite_name = test.__class__.__module__.split('.')[-1]
+        test_record = {'suite': suite_name,
+                       'test': test.id(),
+                       'name': getattr(test, '_testMethodName', str(test)),
+                       'type': None if test_key is None else str(test_key[0]),
+                       'shims': None if test_key is None else [str(key) for key in test_key[-2:]],
+                       'broker': self.broker_name,
+                       'status': status,
+                       'message': message,
+                       'start_time': test_run.start_time,
+                       'duration': round(test_run.finish_time - test_run.start_time, 6),
+                       'bytes': sum(num_bytes for _, num_bytes in test_run.exchange_list)}
+        with self.report_lock:
+            for reporter in self.reporter_list:
+                reporter.report(test_record)
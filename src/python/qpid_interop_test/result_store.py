@@ -0,0 +1,169 @@
+"""
+Module containing a local database of test results, used to re-run only the tests which failed or whose inputs have
+changed since they last passed
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from functools import wraps
+from hashlib import sha1
+from json import dumps, loads
+from os import getenv, makedirs, path
+import sqlite3
+from threading import Lock
+from time import ctime, time
+import unittest
+
+DEFAULT_RESULT_DB = path.join(getenv('HOME', '/tmp'), '.qpid-interop-test', 'results.db')
+
+# Re-run modes: which tests are skipped because of their previous result
+RERUN_ALL = 'all' # Run every test
+RERUN_FAILED = 'failed' # Skip tests which passed when they were last run
+RERUN_CHANGED = 'changed' # Skip tests which passed when they were last run with the same inputs
+
+PASSED = 'pass'
+FAILED = 'fail'
+ERROR = 'error'
+
+
+def get_test_input_map(send_shim, receive_shim, json_test_values):
+    """
+    Return the map of inputs of a test of send_shim and receive_shim (see shims.Shim) with the test values
+    json_test_values (serialized as JSON): the hashes of the send shim, receive shim and test values
+    """
+    return {'sender': send_shim.get_sender_hash(),
+            'receiver': receive_shim.get_receiver_hash(),
+            'values': sha1(json_test_values).hexdigest()}
+
+
+class ResultStore(object):
+    """
+    Store of the latest result of each test of a test suite, kept in an SQLite database. Each result is recorded with
+    the inputs of the test (normally the hashes of the send and receive shims and of the test values, see
+    get_test_input_map()) and the identity of the broker, so that a later run can skip the tests which have already
+    passed (rerun_mode RERUN_FAILED) or which have already passed with the same inputs (RERUN_CHANGED). After a shim
+    is rebuilt, only the tests which use that shim are then run again. If file_name is None, no results are loaded or
+    saved, and every test is run.
+    """
+
+    def __init__(self, file_name, suite_name, broker_name, rerun_mode=RERUN_ALL):
+        self.file_name = file_name
+        self.suite_name = suite_name
+        self.broker_name = str(broker_name)
+        self.rerun_mode = rerun_mode
+        self.result_map = {} # test name -> (outcome, input map, run time) of its latest result
+        self.updated_names = set()
+        self.lock = Lock()
+        if self.file_name is not None and path.isfile(self.file_name):
+            self.result_map = self._load()
+
+    def track(self, test_method, get_input_map):
+        """
+        Return test_method (a test method of a unittest.TestCase) wrapped so that its result is recorded together with
+        the map of test inputs returned by get_input_map() (called when the test is run), and so that the test is
+        skipped if the re-run mode allows it
+        """
+        if self.file_name is None:
+            return test_method
+
+        @wraps(test_method)
+        def tracked_test_method(test_case):
+            """Run test_method unless it can be skipped, and record its result"""
+            test_name = '%s.%s' % (test_case.__class__.__name__, test_case._testMethodName)
+            input_map = get_input_map()
+            input_map['broker'] = self.broker_name
+            skip_reason = self.get_skip_reason(test_name, input_map)
+            if skip_reason is not None:
+                test_case.skipTest(skip_reason)
+            try:
+                test_method(test_case)
+            except unittest.SkipTest:
+                raise
+            except test_case.failureException:
+                self.record(test_name, FAILED, input_map)
+                raise
+            except Exception:
+                self.record(test_name, ERROR, input_map)
+                raise
+            self.record(test_name, PASSED, input_map)
+        return tracked_test_method
+
+    def get_skip_reason(self, test_name, input_map):
+        """Return the reason for skipping test_name with the inputs in input_map, or None if it must be run"""
+        with self.lock:
+            if self.rerun_mode == RERUN_ALL or test_name not in self.result_map:
+                return None
+            outcome, last_input_map, run_time = self.result_map[test_name]
+        if outcome != PASSED:
+            return None
+        if self.rerun_mode == RERUN_FAILED:
+            return 'Passed on %s' % ctime(run_time)
+        if last_input_map == input_map:
+            return 'Passed on %s with the same inputs' % ctime(run_time)
+        return None
+
+    def record(self, test_name, outcome, input_map):
+        """Record outcome (PASSED, FAILED or ERROR) of a run of test_name with the inputs in input_map"""
+        with self.lock:
+            self.result_map[test_name] = (outcome, dict(input_map), time())
+            self.updated_names.add(test_name)
+
+    def save(self):
+        """Save the results recorded since the store was loaded, replacing the earlier results of the same tests"""
+        if self.file_name is None:
+            return
+        with self.lock:
+            dir_name = path.dirname(path.abspath(self.file_name))
+            if not path.isdir(dir_name):
+                makedirs(dir_name)
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                           [(self.suite_name, test_name, self.result_map[test_name][0],
+                                             dumps(self.result_map[test_name][1], sort_keys=True),
+                                             self.result_map[test_name][2])
+                                            for test_name in self.updated_names])
+            finally:
+                connection.close()
+            self.updated_names.clear()
+
+    def _connect(self):
+        """Open the database, creating the results table if it does not yet exist"""
+        connection = sqlite3.connect(self.file_name, timeout=30.0)
+        connection.execute('CREATE TABLE IF NOT EXISTS results (suite TEXT, test TEXT, outcome TEXT, inputs TEXT, '
+                           'run_time REAL, PRIMARY KEY (suite, test))')
+        return connection
+
+    def _load(self):
+        """Read the latest results of the tests of this suite from the database, ignoring a damaged database"""
+        result_map = {}
+        try:
+            connection = self._connect()
+            try:
+                for test_name, outcome, inputs, run_time in \
+                    connection.execute('SELECT test, outcome, inputs, run_time FROM results WHERE suite = ?',
+                                       (self.suite_name,)):
+                    result_map[test_name] = (outcome, loads(inputs), run_time)
+            finally:
+                connection.close()
+        except (sqlite3.Error, ValueError) as exc:
+            print 'WARNING: Unable to read test result database "%s": %s' % (self.file_name, exc)
+        return result_map
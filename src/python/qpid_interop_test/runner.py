@@ -0,0 +1,402 @@
+"""
+Module containing the setup shared by all the test suites (shim selection, the broker probe, the stores of
+previous results and the reports) and a runner which runs the tests of several test suites in a single process,
+probing the broker once and scheduling the tests of all the suites on a single pool of workers.
+
+Each test suite module is a plugin which provides:
+
+    TestOptions(shim_map, argv=None): the command-line options of the suite, parsed from argv (default: sys.argv)
+    create_shim_map(): return a map of the name of each client shim installed for the suite to its Shim instance
+    create_test_suite(args, shim_map, broker, timing_store, result_store, phase_report): return a unittest.TestSuite
+        containing the tests of the suite for the given options, shims, broker (for skipping tests, None to run all
+        tests), stores (see timing_store.TimingStore and result_store.ResultStore) and report of the phases of the
+        tests (see phase_report.SuitePhaseReport). Each test which exchanges test values between shims records the
+        exchange once both shims have finished (see finish_exchange()).
+
+and optionally:
+
+    report_test_suite(): print a report of the suite once all the tests have run
+    RUN_SERIALLY: if True, the tests of the suite are never run concurrently with other tests
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import argparse
+import shlex
+import sys
+import unittest
+
+from importlib import import_module
+from os import getenv, path
+
+import qpid_interop_test.broker_properties
+import qpid_interop_test.phase_report
+import qpid_interop_test.result_reporter
+import qpid_interop_test.result_store
+import qpid_interop_test.scheduler
+import qpid_interop_test.shims
+import qpid_interop_test.timing_store
+
+# Test suites which may be run by the runner, in the order in which they are run by default
+SUITE_NAMES = ['amqp_types_test', 'amqp_large_content_test', 'jms_messages_test', 'jms_hdrs_props_test',
+               'amqp_throughput_test']
+
+# Options which apply to the whole run rather than to a single test suite (see run_suites()), and so may not be given
+# in --suite-options
+RUN_WIDE_OPTIONS = ['--sender', '--receiver', '--no-skip', '--broker-type', '--broker-cache-ttl',
+                    '--broker-connect-timeout', '--broker-open-timeout', '--broker-retries', '--jobs', '--timing-file',
+                    '--phase-report', '--json-results', '--junit-xml', '--result-db', '--rerun-failed',
+                    '--changed-only', '--shim-options', '--latency']
+
+
+def get_suite_name(suite_module):
+    """Return the name of test suite module suite_module (also when it is run as __main__)"""
+    return path.splitext(path.basename(suite_module.__file__))[0]
+
+
+def load_suite(suite_name):
+    """Import and return the module of test suite suite_name"""
+    return import_module('qpid_interop_test.%s' % suite_name)
+
+
+def select_shims(shim_map, args, ignore_unknown=False):
+    """
+    Return the shims of shim_map selected by the --include-shim or --exclude-shim options in args. Unless
+    ignore_unknown is set, a shim which is not in shim_map is an error.
+    """
+    if args.include_shim is not None:
+        new_shim_map = {}
+        for shim in args.include_shim:
+            if shim in shim_map:
+                new_shim_map[shim] = shim_map[shim]
+            elif not ignore_unknown:
+                print 'No such shim: "%s". Use --help for valid shims' % shim
+                sys.exit(1) # Errors or failures present
+        return new_shim_map
+    new_shim_map = dict(shim_map)
+    if args.exclude_shim is not None:
+        for shim in args.exclude_shim:
+            if shim in new_shim_map:
+                new_shim_map.pop(shim)
+            elif not ignore_unknown:
+                print 'No such shim: "%s". Use --help for valid shims' % shim
+                sys.exit(1) # Errors or failures present
+    return new_shim_map
+
+
+def configure_shims(shim_map, args):
+    """Set the payload mode and server mode of the shims in shim_map according to args"""
+    # Pass the test parameters to the shims other than on the command line
+    if args.payload_mode != 'argv':
+        for shim in shim_map.values():
+            shim.set_payload_mode(args.payload_mode)
+    # Start shims once for the entire run rather than once per test
+    if args.persistent_shims:
+        for shim in shim_map.values():
+            shim.enable_server_mode()
+
+
+def set_shim_options(args):
+    """Pass the tuning options in args to the shims through the environment they inherit"""
+    if args.shim_options is not None:
+        try:
+            qpid_interop_test.shims.set_shim_options(args.shim_options)
+        except ValueError as exc:
+            print 'Invalid --shim-options: %s' % exc
+            sys.exit(1) # Errors or failures present
+
+
+def get_broker(args):
+    """
+    Connect to the broker to find the broker type, or use the --broker-type option if present. Return a tuple
+    (broker, broker_name): the broker product used to skip tests (None to run all tests) and the name of the broker
+    under which results are stored (the broker identity, see broker_properties.BrokerIdentity).
+    """
+    if args.broker_type is not None:
+        if args.broker_type == 'None':
+            return (None, args.broker_type)
+        return (args.broker_type, args.broker_type)
+    # Probe the receiver address too (concurrently), so that an unreachable receiver is reported before testing
+    probe_policy = qpid_interop_test.broker_properties.ProbePolicy(args.broker_connect_timeout,
+                                                                   args.broker_open_timeout, args.broker_retries)
+    broker_identity_map = qpid_interop_test.broker_properties.probe_brokers([args.sender, args.receiver],
+                                                                            args.broker_cache_ttl, probe_policy)
+    for broker_identity in broker_identity_map.itervalues():
+        if not broker_identity.is_reachable():
+            print 'ERROR: Unable to connect to broker %s: %s' % (broker_identity.url, broker_identity.error)
+            sys.exit(1) # Errors or failures present
+    broker_identity = broker_identity_map[args.sender]
+    if broker_identity.properties is None:
+        print 'WARNING: Unable to get connection properties - unknown broker'
+        return ('unknown', broker_identity)
+    print 'Test Broker: %s' % broker_identity
+    print
+    sys.stdout.flush()
+    if args.no_skip:
+        return (None, broker_identity) # Will cause all tests to run
+    return (broker_identity.product, broker_identity)
+
+
+def get_rerun_mode(args):
+    """
+    Return the rerun mode (see result_store.ResultStore) selected by the --changed-only or --rerun-failed options in
+    args, defaulting the result database when one is needed
+    """
+    if args.changed_only:
+        rerun_mode = qpid_interop_test.result_store.RERUN_CHANGED
+    elif args.rerun_failed:
+        rerun_mode = qpid_interop_test.result_store.RERUN_FAILED
+    else:
+        rerun_mode = qpid_interop_test.result_store.RERUN_ALL
+    if args.result_db is None and rerun_mode != qpid_interop_test.result_store.RERUN_ALL:
+        args.result_db = qpid_interop_test.result_store.DEFAULT_RESULT_DB
+    return rerun_mode
+
+
+def finish_exchange(phase_report, test_key, shim_worker_list):
+    """
+    Record a finished exchange of test values between the shim workers in shim_worker_list, for the test identified
+    by test_key: the phases of the shims in phase_report (a phase_report.SuitePhaseReport), and the exchange against
+    the test being run on this thread (see result_reporter.record_exchange())
+    """
+    phase_report.record(test_key, shim_worker_list)
+    qpid_interop_test.result_reporter.record_exchange(test_key, shim_worker_list)
+
+
+def run_suites(suite_list, num_jobs=1, latency=False):
+    """
+    Run the tests of the test suites in suite_list, a list of (suite module, shim map, args) tuples where args are
+    the parsed options of the suite (see the suite plugin interface above). The options which apply to the whole run
+    (the broker, the stores, reports and shim options, see RUN_WIDE_OPTIONS) are taken from the args of the first
+    suite. The broker is probed once, and if num_jobs is greater than 1, the tests of all the suites share a single
+    pool of num_jobs workers. If latency is set, the shims of all the suites run in latency mode. Return the unittest
+    result of the run.
+    """
+    run_args = suite_list[0][2]
+    set_shim_options(run_args)
+    if latency:
+        qpid_interop_test.shims.add_shim_option('latency', True)
+    broker, broker_name = get_broker(run_args)
+    rerun_mode = get_rerun_mode(run_args)
+    if len(suite_list) == 1:
+        run_name = get_suite_name(suite_list[0][0])
+    else:
+        run_name = 'qpid_interop_test'
+
+    # The phases of each test if requested, and the results of previous runs, used to skip the tests which need not
+    # be run again
+    phase_report = qpid_interop_test.phase_report.PhaseReport(run_args.phase_report, run_name)
+    store_list = []
+    parallel_suite = unittest.TestSuite()
+    serial_suite = unittest.TestSuite()
+    for suite_module, shim_map, args in suite_list:
+        suite_name = get_suite_name(suite_module)
+        configure_shims(shim_map, args)
+        # Per-test timeouts derived from the durations of previous runs
+        timing_store = qpid_interop_test.timing_store.TimingStore(run_args.timing_file, suite_name, broker)
+        result_store = qpid_interop_test.result_store.ResultStore(run_args.result_db, suite_name, broker_name,
+                                                                  rerun_mode)
+        store_list.extend([timing_store, result_store])
+        test_suite = suite_module.create_test_suite(args, shim_map, broker, timing_store, result_store,
+                                                    phase_report.get_suite_report(suite_name))
+        if getattr(suite_module, 'RUN_SERIALLY', False):
+            serial_suite.addTest(test_suite)
+        else:
+            parallel_suite.addTest(test_suite)
+
+    # Run independent tests concurrently if requested, then the tests which must run on their own
+    if num_jobs > 1:
+        parallel_suite = qpid_interop_test.scheduler.ParallelTestSuite(parallel_suite, num_jobs)
+    test_suite = unittest.TestSuite([parallel_suite, serial_suite])
+
+    runner = qpid_interop_test.result_reporter.ReportingTestRunner(
+        qpid_interop_test.result_reporter.create_reporters(run_args.json_results, run_args.junit_xml),
+        run_name if len(suite_list) == 1 else None, broker_name, verbosity=2)
+    res = runner.run(test_suite)
+    for store in store_list:
+        store.save()
+    phase_report.save()
+    phase_report.print_summary()
+    for suite_module, _, _ in suite_list:
+        if hasattr(suite_module, 'report_test_suite'):
+            suite_module.report_test_suite()
+    return res
+
+
+def run_suite_main(suite_module):
+    """
+    Main program of test suite module suite_module when it is run on its own: parse the command-line options of the
+    suite, run its tests and exit with status 1 if any failed
+    """
+    shim_map = suite_module.create_shim_map()
+    args = suite_module.TestOptions(shim_map).args
+    res = run_suites([(suite_module, select_shims(shim_map, args), args)], getattr(args, 'jobs', 1),
+                     getattr(args, 'latency', False))
+    if not res.wasSuccessful():
+        sys.exit(1) # Errors or failures present
+
+
+def add_common_options(parser, jobs=True):
+    """
+    Add the command-line options common to all the test suites to argparse parser: the broker, the shims, the stores
+    and reports (see run_suites()) and, if jobs is set (the tests of the suite may run concurrently), --jobs
+    """
+    parser.add_argument('--sender', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
+                        help='Node to which test suite will send messages.')
+    parser.add_argument('--receiver', action='store', default='localhost:5672', metavar='IP-ADDR:PORT',
+                        help='Node from which test suite will receive messages.')
+    parser.add_argument('--no-skip', action='store_true',
+                        help='Do not skip tests that are excluded by default for reasons of a known bug')
+    parser.add_argument('--broker-type', action='store', metavar='BROKER_NAME',
+                        help='Disable test of broker type (using connection properties) by specifying the broker' +
+                        ' name, or "None".')
+    parser.add_argument('--broker-cache-ttl', action='store', type=float,
+                        default=qpid_interop_test.broker_properties.DEFAULT_CACHE_TTL, metavar='SECONDS',
+                        help='Use broker connection properties obtained by earlier test runs within this time ' +
+                        'rather than connecting to the broker to get them. 0 disables the cache. ' +
+                        'Default: %(default)s')
+    parser.add_argument('--broker-connect-timeout', action='store', type=float,
+                        default=qpid_interop_test.broker_properties.DEFAULT_CONNECT_TIMEOUT, metavar='SECONDS',
+                        help='Time allowed to connect to the broker when getting its connection properties. ' +
+                        'Default: %(default)s')
+    parser.add_argument('--broker-open-timeout', action='store', type=float,
+                        default=qpid_interop_test.broker_properties.DEFAULT_OPEN_TIMEOUT, metavar='SECONDS',
+                        help='Time allowed for the broker to open the AMQP connection once connected. ' +
+                        'Default: %(default)s')
+    parser.add_argument('--broker-retries', action='store', type=int,
+                        default=qpid_interop_test.broker_properties.DEFAULT_RETRIES, metavar='N',
+                        help='Number of times to retry connecting to the broker, with increasing delays, ' +
+                        'before giving up. Default: %(default)s')
+    if jobs:
+        parser.add_argument('--jobs', action='store', type=int, default=1, metavar='N',
+                            help='Number of tests (shim pairs) to run concurrently. Default: 1 (run serially)')
+    parser.add_argument('--persistent-shims', action='store_true',
+                        help='Start each shim once and run all its tests on that process rather than starting ' +
+                        'the shim for every test (shims which do not support this are started for every test)')
+    parser.add_argument('--timing-file', action='store', metavar='FILE',
+                        help='File in which the durations of recent runs of each test are kept. The timeout ' +
+                        'for each test is then derived from its previous durations rather than using a fixed ' +
+                        'timeout. The file is created if it does not exist, and is updated after every run.')
+    parser.add_argument('--phase-report', action='store', metavar='FILE',
+                        help='Write a JSON report of the time taken to reach each phase of each test (shim ' +
+                        'process start and exit, connection, first and last message...) to FILE, and print ' +
+                        'a summary table of the phases')
+    parser.add_argument('--json-results', action='store', metavar='FILE',
+                        help='Write the result of each test (test, shims, type, broker, status, duration, bytes ' +
+                        'sent) to FILE as a line of JSON as soon as the test completes. Use "-" for stdout.')
+    parser.add_argument('--junit-xml', action='store', metavar='FILE',
+                        help='Write the results of all the tests to FILE as JUnit XML once the tests complete')
+    parser.add_argument('--result-db', action='store', metavar='FILE',
+                        help='SQLite database in which the result of each test is recorded, together with the ' +
+                        'hashes of its shims and test values and the broker identity. Default with ' +
+                        '--rerun-failed or --changed-only: %s' % qpid_interop_test.result_store.DEFAULT_RESULT_DB)
+    rerun_group = parser.add_mutually_exclusive_group()
+    rerun_group.add_argument('--rerun-failed', action='store_true',
+                             help='Skip the tests which passed when they were last run (see --result-db)')
+    rerun_group.add_argument('--changed-only', action='store_true',
+                             help='Skip the tests which passed when they were last run with the same shims, ' +
+                             'test values and broker (see --result-db)')
+    parser.add_argument('--shim-options', action='store', metavar='JSON',
+                        help='JSON object of tuning options passed to the shims, for example ' +
+                        '\'{"prefetch": 100, "settle_batch": 50}\'. Shims ignore options they do not support.')
+    parser.add_argument('--payload-mode', action='store', default='argv',
+                        choices=qpid_interop_test.shims.PAYLOAD_MODES,
+                        help='How test parameters are passed to the shims: as a command-line argument (argv), ' +
+                        'on stdin, in a temporary file (file) or in a memory-mapped file in shared memory ' +
+                        '(mmap). Shims which do not support the mode use argv. Default: argv')
+
+
+class RunnerOptions(object):
+    """
+    Class controlling command-line arguments used to control the runner. All other arguments are common options,
+    which are passed to every selected test suite.
+    """
+    def __init__(self, argv=None):
+        parser = argparse.ArgumentParser(prog='qpid_interop_test',
+                                         description='Qpid-interop AMQP client interoparability test runner, ' +
+                                         'which runs the tests of several test suites in a single process',
+                                         epilog='All other options are passed to every selected test suite: ' +
+                                         'see the --help of each suite. Options which apply to the whole run ' +
+                                         '(broker address and type, --shim-options, stores and reports) must be ' +
+                                         'given here rather than in --suite-options. ' +
+                                         '--include-shim and --exclude-shim apply to the suites which have the shim.')
+        parser.add_argument('--suite', action='append', choices=SUITE_NAMES, metavar='SUITE',
+                            help='Name of test suite to run. Default: all. Supported suites:\n%s' % SUITE_NAMES)
+        parser.add_argument('--jobs', action='store', type=int, default=1, metavar='N',
+                            help='Number of tests (shim pairs) to run concurrently, across all the suites except ' +
+                            'those whose tests must run on their own (amqp_throughput_test). Default: 1 (run serially)')
+        parser.add_argument('--latency', action='store_true',
+                            help='Measure the latency of each message, and print latency percentiles for each ' +
+                            'test of amqp_types_test and jms_messages_test, including persistent shims (for shims ' +
+                            'which support latency mode). In aggregate mode, the percentiles of all the types ' +
+                            'exchanged are printed once per shim pair, by the test which ran the exchange')
+        parser.add_argument('--suite-options', action='append', default=[], metavar='SUITE=OPTIONS',
+                            help='Options for a single test suite, such as its test types, for example ' +
+                            '"amqp_types_test=--include-type int --include-type long"')
+        self.args, self.common_argv = parser.parse_known_args(argv)
+        self.suite_argv_map = {} # suite name -> list of options for that suite only
+        for suite_options in self.args.suite_options:
+            suite_name, _, options_str = suite_options.partition('=')
+            if suite_name not in SUITE_NAMES:
+                parser.error('unknown suite in --suite-options: "%s"' % suite_name)
+            suite_argv = shlex.split(options_str)
+            for arg in suite_argv:
+                # Options may be abbreviated, and have their value attached with '='
+                option = arg.partition('=')[0]
+                if option.startswith('--') and any(run_wide_option.startswith(option)
+                                                   for run_wide_option in RUN_WIDE_OPTIONS):
+                    parser.error('%s applies to the whole run and may not be given in --suite-options: "%s"' %
+                                 (option, suite_options))
+            self.suite_argv_map.setdefault(suite_name, []).extend(suite_argv)
+
+
+def main():
+    """Main program of the runner: run the tests of the selected test suites"""
+    if getenv('QIT_INSTALL_PREFIX') is None:
+        print 'ERROR: Environment variable QIT_INSTALL_PREFIX is not set'
+        sys.exit(1)
+    runner_options = RunnerOptions()
+    suite_name_list = runner_options.args.suite if runner_options.args.suite is not None else SUITE_NAMES
+    suite_list = []
+    for suite_name in suite_name_list:
+        suite_module = load_suite(suite_name)
+        shim_map = suite_module.create_shim_map()
+        args = suite_module.TestOptions(shim_map, runner_options.common_argv +
+                                        runner_options.suite_argv_map.get(suite_name, [])).args
+        suite_list.append((suite_module, shim_map, args))
+
+    # A shim need only be known to one of the suites, and is tested in those which have it
+    common_args = suite_list[0][2]
+    for shim in (common_args.include_shim or []) + (common_args.exclude_shim or []):
+        if not any(shim in shim_map for _, shim_map, _ in suite_list):
+            print 'No such shim: "%s". Use --help of the test suites for valid shims' % shim
+            sys.exit(1) # Errors or failures present
+    suite_list = [(suite_module, select_shims(shim_map, args, ignore_unknown=True), args)
+                  for suite_module, shim_map, args in suite_list]
+
+    res = run_suites(suite_list, runner_options.args.jobs, runner_options.args.latency)
+    if not res.wasSuccessful():
+        sys.exit(1) # Errors or failures present
+
+
+#--- Main program start ---
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Module containing a test suite which runs independent test cases concurrently on a pool of worker threads
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import unittest
+
+from Queue import Empty, Queue
+from threading import Lock, Thread
+
+import qpid_interop_test.result_reporter
+
+
+class RecordingTestResult(unittest.TestResult):
+    """
+    Test result which records the outcome of a single test so that it can later be replayed into another result.
+    This allows a test to be run on a worker thread while the (non-thread-safe) result of the test runner is only
+    ever updated by one thread at a time.
+    """
+    def __init__(self):
+        super(RecordingTestResult, self).__init__()
+        self.events = []
+
+    def startTest(self, test):
+        qpid_interop_test.result_reporter.start_test_run(test)
+
+    def stopTest(self, test):
+        qpid_interop_test.result_reporter.finish_test_run(test)
+
+    def addSuccess(self, test):
+        self.events.append(('addSuccess', (test,)))
+
+    def addError(self, test, err):
+        self.events.append(('addError', (test, err)))
+
+    def addFailure(self, test, err):
+        self.events.append(('addFailure', (test, err)))
+
+    def addSkip(self, test, reason):
+        self.events.append(('addSkip', (test, reason)))
+
+    def addExpectedFailure(self, test, err):
+        self.events.append(('addExpectedFailure', (test, err)))
+
+    def addUnexpectedSuccess(self, test):
+        self.events.append(('addUnexpectedSuccess', (test,)))
+
+    def replay(self, test, result):
+        """Replay the recorded outcome of test into result"""
+        result.startTest(test)
+        for method_name, args in self.events:
+            getattr(result, method_name)(*args)
+        result.stopTest(test)
+
+
+class ParallelTestSuite(unittest.TestSuite):
+    """
+    Test suite which runs its test cases concurrently on a bounded pool of worker threads. The test cases are
+    flattened out of any nested suites and handed to the workers in suite order. As each test completes, its outcome
+    is merged back into the single result supplied by the test runner.
+
+    Each test method of the interop tests runs one sender/receiver shim pair against its own queue (the queue names
+    contain the test type and the names of both shims), so the tests are independent of one another and may be
+    run in any order.
+    """
+    def __init__(self, tests=(), num_jobs=1):
+        super(ParallelTestSuite, self).__init__(tests)
+        self.num_jobs = max(1, num_jobs)
+        self._result_lock = Lock()
+
+    def run(self, result, debug=False):
+        """Run all the tests in this suite on num_jobs worker threads, merging the outcomes into result"""
+        test_queue = Queue()
+        num_tests = 0
+        for test in self._flatten(self):
+            test_queue.put(test)
+            num_tests += 1
+        workers = []
+        for worker_num in range(min(self.num_jobs, num_tests)):
+            worker = Thread(name='test_worker_%d' % worker_num, target=self._worker, args=(test_queue, result))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        # Join with a timeout so that the main thread stays responsive to KeyboardInterrupt
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(1.0)
+        return result
+
+    def _worker(self, test_queue, result):
+        """Worker thread: take tests from test_queue and run them until the queue is empty"""
+        while not result.shouldStop:
+            try:
+                test = test_queue.get_nowait()
+            except Empty:
+                return
+            test_result = RecordingTestResult()
+            test(test_result)
+            with self._result_lock:
+                test_result.replay(test, result)
+
+    @staticmethod
+    def _flatten(suite):
+        """Generator which yields the individual test cases in suite and all of its nested suites"""
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                for sub_test in ParallelTestSuite._flatten(test):
+                    yield sub_test
+            else:
+                yield test
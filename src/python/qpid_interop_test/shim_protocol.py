@@ -0,0 +1,59 @@
+"""
+Module containing the constants of the protocol between the test program (qpid_interop_test.shims) and the Python
+shims (qpid_interop_test.shim_utils): how a shim is started, how it is passed its test parameters and options, and how
+it returns its results. The shims of other clients implement the same protocol with their own copies of these values.
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+# Command-line argument which starts a shim in server mode, see qpid_interop_test.shims.ShimServer
+SERVER_MODE_ARG = '--server'
+
+# Markers which replace the JSON test parameters on the command line when they are passed to the shim some other
+# way (payload modes), see qpid_interop_test.shims.ShimWorker.get_shim_args()
+PAYLOAD_STDIN_ARG = '@stdin'
+PAYLOAD_FILE_PREFIX = '@file:'
+PAYLOAD_MMAP_PREFIX = '@mmap:'
+
+# Environment variable containing a JSON object of tuning options for the shims
+SHIM_OPTIONS_ENV = 'QIT_SHIM_OPTIONS'
+
+# Result channel: environment variable holding the number of the file descriptor on which a shim may write its
+# results as length-prefixed records rather than printing them on stdout, the struct format of the header of each
+# record (record kind, length) and the record kinds, see qpid_interop_test.shims.ResultDecoder
+RESULT_FD_ENV = 'QIT_RESULT_FD'
+RESULT_RECORD_HEADER = '>cI'
+RESULT_RECORD = 'R' # One of the results of the test
+VALUE_RECORD = 'V' # A single received value (JSON), streamed as soon as it has been received
+TIMING_RECORD = 'T' # JSON map of the phases of the test reached by the shim to their times (seconds since the epoch)
+
+# Phases of a test reached by a shim, whose times are returned to the test program in a TIMING_RECORD (in server mode,
+# in the response to the test)
+PHASE_START = 'start' # shim_main called
+PHASE_CONNECT = 'connect' # Connection to the broker opened
+PHASE_LINK_ATTACH = 'link_attach' # First link attached
+PHASE_FIRST_MESSAGE = 'first_message' # First message sent or received
+PHASE_LAST_MESSAGE = 'last_message' # Last message sent or received
+PHASE_CLOSE = 'close' # Connection closed
+SHIM_PHASES = [PHASE_START, PHASE_CONNECT, PHASE_LINK_ATTACH, PHASE_FIRST_MESSAGE, PHASE_LAST_MESSAGE, PHASE_CLOSE]
+
+# Test key (in place of the AMQP type) which starts an amqp_types_test shim in aggregate mode, in which the values of
+# all the AMQP types under test are exchanged over a single connection, each type on its own queue
+AGGREGATE_TEST_KEY = 'aggregate'
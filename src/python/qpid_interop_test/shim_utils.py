@@ -0,0 +1,418 @@
+"""
+Module containing utilities shared by the Python shims
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+import os
+from StringIO import StringIO
+from struct import pack
+import sys
+from time import time
+from traceback import format_exc
+
+from proton import Delivery, symbol
+from proton.handlers import MessagingHandler
+
+from qpid_interop_test.interop_test_errors import InteropTestError
+from qpid_interop_test.java_obj_codec import JavaObjCodec
+from qpid_interop_test.java_obj_serialization import JavaObjSerializer
+from qpid_interop_test.latency_histogram import LatencyHistogram
+# The protocol between the test program and the shims (see read_test_params(), write_results(), write_value(),
+# record_phase() and get_shim_option())
+from qpid_interop_test.shim_protocol import PAYLOAD_FILE_PREFIX, PAYLOAD_MMAP_PREFIX, PAYLOAD_STDIN_ARG, \
+                                            PHASE_CLOSE, PHASE_CONNECT, PHASE_FIRST_MESSAGE, PHASE_LAST_MESSAGE, \
+                                            PHASE_LINK_ATTACH, PHASE_START, RESULT_FD_ENV, RESULT_RECORD, \
+                                            RESULT_RECORD_HEADER, SERVER_MODE_ARG, SHIM_OPTIONS_ENV, SHIM_PHASES, \
+                                            TIMING_RECORD, VALUE_RECORD
+
+# Message annotations used by the throughput test shims and in latency mode: the time at which a message was sent
+# (microseconds since the epoch, see get_time_us()), and a marker on the last message of a test
+SEND_TIME_ANNOTATION = 'x-opt-qit-send-time'
+LAST_MESSAGE_ANNOTATION = 'x-opt-qit-last'
+
+# Converters of the Java objects of JMS ObjectMessages which shim option "java_obj_codec" selects (see
+# get_java_obj_codec()), and the class path of the Java utility used by JAVA_OBJ_CODEC_JVM, which shim option
+# "java_obj_utils_classpath" overrides
+JAVA_OBJ_CODEC_PYTHON = 'python'
+JAVA_OBJ_CODEC_JVM = 'jvm'
+JAVA_OBJ_UTILS_CLASSPATH = 'target/JavaObjUtils.jar'
+
+# Receiver link prefetch (credit) used unless shim option "prefetch" is set. This is the MessagingHandler default.
+DEFAULT_PREFETCH = 10
+
+
+def is_server_mode(argv):
+    """Return True if the shim command-line argv requests server mode"""
+    return len(argv) == 2 and argv[1] == SERVER_MODE_ARG
+
+
+def serve(shim_main):
+    """
+    Run a shim in server mode. Each line read from stdin is a JSON list containing the command-line arguments for
+    a single test (broker address, queue name, test key, JSON test parameters). shim_main is called with this list
+    exactly as it would have been called with sys.argv[1:] for a single test, and everything it prints is captured.
+    When it returns, a single line containing the JSON object {"stdout": <captured stdout>, "stderr": <captured
+    stderr>, "phases": <map of phase to time>} is written to stdout (see record_phase()). The server exits when stdin
+    is closed.
+    """
+    real_stdout = sys.stdout
+    real_stderr = sys.stderr
+    for line in iter(sys.stdin.readline, ''):
+        if len(line.strip()) == 0:
+            continue
+        captured_stdout = StringIO()
+        captured_stderr = StringIO()
+        sys.stdout = captured_stdout
+        sys.stderr = captured_stderr
+        _PHASE_MAP.clear()
+        record_phase(PHASE_START)
+        try:
+            shim_main([arg.encode('utf-8') for arg in loads(line)])
+        except SystemExit:
+            pass
+        except Exception: # Report anything not handled by shim_main, the server itself must stay up
+            print >> captured_stderr, format_exc()
+        finally:
+            sys.stdout = real_stdout
+            sys.stderr = real_stderr
+        real_stdout.write(dumps({'stdout': captured_stdout.getvalue(), 'stderr': captured_stderr.getvalue(),
+                                 'phases': _PHASE_MAP}))
+        real_stdout.write('\n')
+        real_stdout.flush()
+
+
+def read_test_params(arg):
+    """
+    Return the JSON test parameters passed to the shim as command-line argument arg, which is either the parameters
+    themselves or a marker for another payload mode: PAYLOAD_STDIN_ARG (read stdin to its end), PAYLOAD_FILE_PREFIX
+    followed by the path of a file to read, or PAYLOAD_MMAP_PREFIX followed by the path of a file to map.
+    """
+    if arg == PAYLOAD_STDIN_ARG:
+        return sys.stdin.read()
+    if arg.startswith(PAYLOAD_FILE_PREFIX):
+        with open(arg[len(PAYLOAD_FILE_PREFIX):], 'rb') as payload_file:
+            return payload_file.read()
+    if arg.startswith(PAYLOAD_MMAP_PREFIX):
+        with open(arg[len(PAYLOAD_MMAP_PREFIX):], 'rb') as payload_file:
+            payload_map = mmap(payload_file.fileno(), 0, access=ACCESS_READ)
+            try:
+                return payload_map[:]
+            finally:
+                payload_map.close()
+    return arg
+
+
+def run_shim(shim_main):
+    """
+    Main entry point for Python shims: Run shim_main once with the command-line arguments, or if started with
+    SERVER_MODE_ARG, once for every test command received on stdin (see serve()). The JSON test parameters (the fourth
+    argument) may be passed in any payload mode, see read_test_params(); shim_main always receives the parameters
+    themselves.
+    """
+    if is_server_mode(sys.argv):
+        serve(shim_main)
+    else:
+        record_phase(PHASE_START)
+        args = sys.argv[1:]
+        if len(args) > 3:
+            args[3] = read_test_params(args[3])
+        shim_main(args)
+        _write_phase_record() # For shims which do not call write_results()
+
+
+_RESULT_FILE = None
+
+def _get_result_file():
+    """
+    Return the result channel provided by the test program (the file descriptor in environment variable
+    RESULT_FD_ENV), opening it on first use, or None if there is none
+    """
+    global _RESULT_FILE
+    if _RESULT_FILE is None:
+        result_fd = os.getenv(RESULT_FD_ENV)
+        if result_fd is not None:
+            _RESULT_FILE = os.fdopen(int(result_fd), 'wb')
+    return _RESULT_FILE
+
+
+def _write_record(result_file, record_kind, record):
+    """Write record (a string) of kind record_kind on result_file"""
+    result_file.write(pack(RESULT_RECORD_HEADER, record_kind, len(record)))
+    result_file.write(record)
+
+
+def write_value(value):
+    """
+    Stream value (a single received test value, JSON-compatible) to the test program as soon as it has been received,
+    so that the test program can compare it with the value sent and fail the test at the first wrong value. The
+    value is written on the result channel as a VALUE_RECORD, and must still be included in the results (see
+    write_results()). Does nothing if there is no result channel.
+    """
+    result_file = _get_result_file()
+    if result_file is not None:
+        _write_record(result_file, VALUE_RECORD, dumps(value))
+        result_file.flush()
+
+
+def write_results(test_key, *results):
+    """
+    Return the results of a test to the test program: the test key, followed by each of results as JSON. If the test
+    program provided a result channel (see _get_result_file()), each is written on it as a RESULT_RECORD (a header
+    packed as RESULT_RECORD_HEADER, then its data) and the channel is closed, so that anything else printed by the
+    shim cannot be mistaken for the results. Otherwise each is printed on stdout as a line. Call this once per test.
+    """
+    global _RESULT_FILE
+    record_list = [test_key] + [dumps(result) for result in results]
+    _write_phase_record()
+    result_file = _get_result_file()
+    if result_file is None:
+        for record in record_list:
+            print record
+    else:
+        for record in record_list:
+            _write_record(result_file, RESULT_RECORD, record)
+        result_file.close()
+        _RESULT_FILE = None
+
+
+_PHASE_MAP = {} # phase -> time (seconds since the epoch) at which the shim reached it in the current test
+
+def record_phase(phase, first_only=True):
+    """
+    Record the time at which the current test reached phase (one of SHIM_PHASES). If first_only is False, a later time
+    replaces an earlier one, so that the last occurrence of the phase is kept.
+    """
+    if not first_only or phase not in _PHASE_MAP:
+        _PHASE_MAP[phase] = time()
+
+
+def _write_phase_record():
+    """
+    Write the phases recorded since the last call on the result channel as a TIMING_RECORD, if there are any and
+    there is a result channel. In server mode, there is no result channel, and the phases are returned by serve().
+    """
+    if len(_PHASE_MAP) == 0:
+        return
+    result_file = _get_result_file()
+    if result_file is not None:
+        _write_record(result_file, TIMING_RECORD, dumps(_PHASE_MAP))
+        result_file.flush()
+        _PHASE_MAP.clear()
+
+
+def get_shim_option(name, default=None):
+    """
+    Return the value of shim option name from the JSON object in environment variable SHIM_OPTIONS_ENV (for example
+    QIT_SHIM_OPTIONS='{"send_window": 100}'), or default if it is not set
+    """
+    options_str = os.getenv(SHIM_OPTIONS_ENV)
+    if options_str is None:
+        return default
+    try:
+        options = loads(options_str)
+    except ValueError:
+        print >> sys.stderr, 'Invalid JSON in %s: %s' % (SHIM_OPTIONS_ENV, options_str)
+        return default
+    return options.get(name, default)
+
+
+class SendingEngine(object):
+    """
+    Sends a fixed sequence of num_messages messages on a sender link as link credit allows. A cursor over the
+    sequence holds the index of the next message to be sent, so sending resumes where it stopped each time more
+    credit is granted (call send() from on_sendable()) or the send window opens (call on_accepted() from
+    on_accepted()). Each message is created only when it is about to be sent by calling create_message(index).
+
+    The number of messages sent but not yet accepted may be limited to window messages. If window is None, the
+    shim option "send_window" is used (see get_shim_option()); 0 means no limit other than the link credit.
+
+    If the shim option "latency" is set, the time at which each message is sent is added to it in annotation
+    SEND_TIME_ANNOTATION so that the receiver can measure its latency (see LatencyRecorder). The times at which the
+    first and last messages are sent are recorded as PHASE_FIRST_MESSAGE and PHASE_LAST_MESSAGE (see record_phase()).
+    """
+    def __init__(self, num_messages, create_message, window=None):
+        self.num_messages = num_messages
+        self.create_message = create_message
+        self.window = get_shim_option('send_window', 0) if window is None else window
+        self.latency = get_shim_option('latency', False)
+        self.next_index = 0 # Cursor: index of the next message to be sent
+        self.num_accepted = 0
+
+    def send(self, sender):
+        """
+        Send pending messages on sender while it has credit and the window allows. Return False if a message could
+        not be created (create_message() returned None), in which case nothing further is sent.
+        """
+        while self.next_index < self.num_messages and sender.credit > 0 and \
+              (self.window <= 0 or self.next_index - self.num_accepted < self.window):
+            message = self.create_message(self.next_index)
+            if message is None:
+                return False
+            if self.latency:
+                if message.annotations is None:
+                    message.annotations = {}
+                message.annotations[symbol(SEND_TIME_ANNOTATION)] = get_time_us()
+            sender.send(message)
+            record_phase(PHASE_FIRST_MESSAGE)
+            self.next_index += 1
+            if self.next_index >= self.num_messages:
+                record_phase(PHASE_LAST_MESSAGE, first_only=False)
+        return True
+
+    def on_accepted(self, sender):
+        """Record that a sent message was accepted, and send more messages if the window has opened"""
+        self.num_accepted += 1
+        return self.send(sender)
+
+    def truncate(self, num_messages):
+        """
+        Reduce the number of messages to be sent to num_messages. This is for sequences whose end is only known while
+        sending, for example when sending for a fixed time: create_message() may call it for the message it creates.
+        """
+        self.num_messages = min(self.num_messages, num_messages)
+
+    def rewind(self):
+        """Move the cursor back to the first message not yet accepted, so that unaccepted messages are resent"""
+        self.next_index = self.num_accepted
+
+    def is_complete(self):
+        """Return True once all the messages have been accepted"""
+        return self.num_accepted >= self.num_messages
+
+
+def get_time_us():
+    """Return the current time in microseconds since the epoch, as used in SEND_TIME_ANNOTATION"""
+    return long(time() * 1000000)
+
+
+def get_prefetch():
+    """Return the receiver link prefetch from shim option "prefetch", or DEFAULT_PREFETCH if it is not set"""
+    return get_shim_option('prefetch', DEFAULT_PREFETCH)
+
+
+class TimedMessagingHandler(MessagingHandler):
+    """
+    MessagingHandler which records the phases of a test reached on the connection (see record_phase()): connection
+    opened, first link attached and connection closed. Shims subclass it in place of MessagingHandler; the sending
+    and receiving of the first and last message are recorded by SendingEngine and DeliverySettler. Subclasses which
+    override on_connection_opened(), on_link_opened() or on_connection_closed() must call the method of this class.
+    """
+    def on_connection_opened(self, event):
+        """Event callback for when the connection to the broker has opened"""
+        record_phase(PHASE_CONNECT)
+
+    def on_link_opened(self, event):
+        """Event callback for when a link has attached"""
+        record_phase(PHASE_LINK_ATTACH)
+
+    def on_connection_closed(self, event):
+        """Event callback for when the connection to the broker has closed"""
+        record_phase(PHASE_CLOSE)
+
+
+class DeliverySettler(object):
+    """
+    Accepts and settles received deliveries for a receiver handler created with auto_accept=False. By default each
+    delivery is accepted as soon as it has been processed, as MessagingHandler does with auto_accept=True. The
+    shim options "settle_batch" and "settle_interval" instead defer settlement: deliveries are accepted together
+    once settle_batch of them are pending, or once the oldest has been pending for settle_interval seconds,
+    whichever comes first. This reduces the number of disposition frames sent for large numbers of messages.
+
+    Call accept() from on_message() for every delivery (including those which are ignored), and flush() before
+    closing the receiver link or connection, so that no delivery is left unsettled. The times at which the first and
+    last messages are received are recorded as PHASE_FIRST_MESSAGE and PHASE_LAST_MESSAGE (see record_phase()).
+    """
+    def __init__(self, batch_size=None, interval=None):
+        self.batch_size = get_shim_option('settle_batch', 1) if batch_size is None else batch_size
+        self.interval = get_shim_option('settle_interval', 0) if interval is None else interval
+        self.pending_list = []
+        self.timer_task = None
+
+    def accept(self, event):
+        """Accept the delivery of event, now or (if settlement is deferred) later"""
+        record_phase(PHASE_FIRST_MESSAGE)
+        record_phase(PHASE_LAST_MESSAGE, first_only=False)
+        self.pending_list.append(event.delivery)
+        if len(self.pending_list) >= self.batch_size:
+            self.flush()
+        elif self.interval > 0 and self.timer_task is None:
+            self.timer_task = event.container.schedule(self.interval, self)
+
+    def flush(self):
+        """Accept and settle all pending deliveries"""
+        for delivery in self.pending_list:
+            delivery.update(Delivery.ACCEPTED)
+            delivery.settle()
+        del self.pending_list[:]
+        if self.timer_task is not None:
+            self.timer_task.cancel() # otherwise the container keeps running until the timer expires
+            self.timer_task = None
+
+    def on_timer_task(self, _):
+        """Timer callback for when settle_interval has passed since the oldest pending delivery was received"""
+        self.timer_task = None
+        self.flush()
+
+
+class LatencyRecorder(object):
+    """
+    Records the latency of received messages when the shim option "latency" is set (latency mode). The latency of
+    a message is the time from that in its SEND_TIME_ANNOTATION (set by the sender, see SendingEngine) to the time
+    it was received, in microseconds. Call record() from on_message() for each message (excluding duplicates), and
+    pass get_result_list() after the usual receiver result to write_results(): in latency mode, this adds a third
+    result, the LatencyHistogram of the latencies as JSON (see LatencyHistogram.to_list()). Otherwise nothing is
+    recorded, and the receiver results are unchanged.
+    """
+    def __init__(self):
+        self.enabled = get_shim_option('latency', False)
+        self.histogram = LatencyHistogram()
+
+    def record(self, message):
+        """Record the latency of message if in latency mode and the message has a send time"""
+        if self.enabled and message.annotations is not None:
+            send_time_us = message.annotations.get(symbol(SEND_TIME_ANNOTATION))
+            if send_time_us is not None:
+                self.histogram.record(get_time_us() - send_time_us)
+
+    def get_result_list(self):
+        """Return a list of the results to add in latency mode (the histogram as a list), or an empty list otherwise"""
+        if self.enabled:
+            return [self.histogram.to_list()]
+        return []
+
+
+_JAVA_OBJ_CODEC = None
+
+def get_java_obj_codec():
+    """
+    Return the converter of Java objects to and from their serialized bytes shared by all the tests of this shim
+    process, creating it on first use: a JavaObjSerializer, which needs no JVM, or a JavaObjCodec if shim option
+    "java_obj_codec" is JAVA_OBJ_CODEC_JVM (for example to print Float and Double values as Java versions before 19)
+    """
+    global _JAVA_OBJ_CODEC
+    if _JAVA_OBJ_CODEC is None:
+        if get_shim_option('java_obj_codec', JAVA_OBJ_CODEC_PYTHON) == JAVA_OBJ_CODEC_JVM:
+            _JAVA_OBJ_CODEC = JavaObjCodec(get_shim_option('java_obj_utils_classpath', JAVA_OBJ_UTILS_CLASSPATH))
+        else:
+            _JAVA_OBJ_CODEC = JavaObjSerializer()
+    return _JAVA_OBJ_CODEC
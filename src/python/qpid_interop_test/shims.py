@@ -1,5 +1,5 @@
 """
-Module containing worker thread classes and shims
+Module containing shim worker classes, the shim process supervisor and shims
 """
 #
 # Licensed to the Apache Software Foundation (ASF) under one
@@ -20,167 +20,867 @@ Module containing worker thread classes and shims
 # under the License.
 #
 
-from json import loads
-from os import getenv, getpgid, killpg, path, setsid
+import atexit
+from errno import EAGAIN, EINTR
+from fcntl import F_GETFD, F_GETFL, F_SETFD, F_SETFL, FD_CLOEXEC, fcntl
+from hashlib import sha1
+from json import dumps, loads
+from mmap import mmap
+import os
+from os import getenv, killpg, path, setsid
+from select import error as SelectError, poll, POLLERR, POLLHUP, POLLIN, POLLNVAL
 from signal import SIGKILL, SIGTERM
-from subprocess import Popen, PIPE, CalledProcessError
+from struct import calcsize, unpack_from
+from subprocess import Popen, PIPE
 from sys import stdout
-from threading import Thread
-from time import sleep
+from tempfile import mkstemp, TemporaryFile
+from threading import Event, Lock, Thread
+from time import time
 
+from qpid_interop_test.latency_histogram import LatencyHistogram
+# The protocol between the test program and the shims: server mode (see ShimServer), payload modes (see
+# ShimWorker.get_shim_args()), shim options (see set_shim_options()) and the result channel (see ResultDecoder)
+from qpid_interop_test.shim_protocol import PAYLOAD_FILE_PREFIX, PAYLOAD_MMAP_PREFIX, PAYLOAD_STDIN_ARG, \
+                                            RESULT_FD_ENV, RESULT_RECORD, RESULT_RECORD_HEADER, SERVER_MODE_ARG, \
+                                            SHIM_OPTIONS_ENV, TIMING_RECORD, VALUE_RECORD
+from qpid_interop_test.value_compare import StreamingComparator
 
-THREAD_TIMEOUT = 800.0 # seconds to complete before join is forced
 
+THREAD_TIMEOUT = 800.0 # seconds to complete before join is forced
+TERMINATE_TIMEOUT = 2.0 # seconds for a process to exit after SIGTERM before SIGKILL is sent
+KILL_TIMEOUT = 5.0 # seconds for a process to exit after SIGKILL before it is abandoned
+REAP_INTERVAL = 0.01 # seconds between checks for the exit of a process which has closed its pipes but not exited
+# Modules of this package imported by the Python shims, so that a change to one of them is a change to the shims
+PYTHON_SHIM_MODULES = ['interop_test_errors', 'java_obj_codec', 'java_obj_serialization', 'jms_types',
+                       'large_content', 'latency_histogram', 'shim_protocol', 'shim_utils', 'test_type_map']
+
+# Ways of passing the JSON test parameters to a shim (payload modes), see ShimWorker.get_shim_args(). The last
+# command-line argument is the parameters themselves (argv), or one of the markers of shim_protocol.
+PAYLOAD_MODES = ['argv', 'stdin', 'file', 'mmap']
+SHARED_MEMORY_DIR = '/dev/shm' # tmpfs in which files are created in payload mode "mmap", if present
+
+# Phases of a test measured by the test program for each shim process, see ShimWorker.get_phase_times(). The shims
+# may report further phases of their own (qpid_interop_test.shim_protocol.SHIM_PHASES) in a TIMING_RECORD.
+PHASE_SPAWN = 'spawn' # Process started (Popen has returned)
+PHASE_FIRST_OUTPUT = 'first_output' # First byte received from the process on any of its pipes
+PHASE_EXIT = 'exit' # Process exited and was reaped
+PHASE_PARSE = 'parse' # Duration of the parsing of the results of the process
+PHASE_KILL = 'kill' # Duration of the termination of the process, from SIGTERM until it was reaped
+PROCESS_PHASES = [PHASE_SPAWN, PHASE_FIRST_OUTPUT, PHASE_EXIT, PHASE_PARSE, PHASE_KILL]
+
+# Held while creating a shim process and the pipes it alone must inherit, so that the pipes of one shim are marked
+# close-on-exec before any other shim started concurrently (on another thread) can inherit them
+SPAWN_LOCK = Lock()
+
+
+class SupervisedProcess(object):
+    """
+    State of a single process under the control of the ShimSupervisor: the output read so far from each of its
+    pipes, which pipes are still open and how far termination of the process has been escalated.
+    """
+    def __init__(self, proc, on_exit):
+        self.proc = proc
+        self.on_exit = on_exit
+        self.stdout_fd = None if proc.stdout is None else proc.stdout.fileno()
+        self.stderr_fd = None if proc.stderr is None else proc.stderr.fileno()
+        self.output_map = {} # fd -> list of data chunks read from that fd
+        self.data_handler_map = {} # fd -> function called with each data chunk read, in place of output_map
+        self.handler_error = None # Exception raised by a data handler, after which the data of its fd is discarded
+        self.pipe_map = {} # fd -> pipe file object, for all pipes still open
+        self.kill_signal = None # Last signal sent to the process group, None if not being terminated
+        self.kill_deadline = None # Time at which termination is escalated (or the process abandoned)
+        self.abandoned = False
+        self.finished = Event()
+        self.first_output_time = None # Time at which the first data was read from any of its pipes
+        self.exit_time = None # Time at which the process was reaped
+        self.terminate_time = None # Time at which SIGTERM was sent, None if not terminated
+
+    def get_output(self, fd):
+        """Return all the data read from fd (None returns an empty string)"""
+        return ''.join(self.output_map.get(fd, []))
+
+    def is_reaped(self):
+        """Return True once the process has exited and been reaped"""
+        return self.proc.returncode is not None
+
+    def is_complete(self):
+        """Return True once the process has been reaped and all its pipes have closed"""
+        return self.is_reaped() and len(self.pipe_map) == 0
+
+
+class ShimSupervisor(Thread):
+    """
+    A single daemon thread which supervises all shim processes. Rather than using one thread per process blocked in
+    Popen.communicate(), it multiplexes the reading of the stdout and stderr pipes of all processes using poll(),
+    reaps each process (waitpid() through Popen.poll()) as its pipes close and escalates the termination of
+    processes from SIGTERM to SIGKILL by deadline, so that no thread ever sleeps for a fixed time waiting for a
+    process to exit. Other threads hand work to the supervisor through a queue and a wakeup pipe, so the poll
+    object is only ever used by the supervisor thread.
+    """
+    def __init__(self):
+        super(ShimSupervisor, self).__init__(name='shim_supervisor')
+        self.daemon = True
+        self._lock = Lock()
+        self._new_processes = []
+        self._process_map = {} # pid -> SupervisedProcess, for all processes not yet finished
+        self._fd_map = {} # fd -> SupervisedProcess
+        self._poller = poll()
+        self._wakeup_read_fd, self._wakeup_write_fd = os.pipe()
+        fcntl(self._wakeup_write_fd, F_SETFL, fcntl(self._wakeup_write_fd, F_GETFL) | os.O_NONBLOCK)
+        self._poller.register(self._wakeup_read_fd, POLLIN)
+
+    def supervise(self, proc, on_exit, result_pipe=None, on_result_data=None):
+        """
+        Supervise process proc, which was started with stdout and/or stderr set to PIPE. Once the process has exited
+        and both pipes have closed, on_exit(stdoutdata, stderrdata) is called on the supervisor thread. If
+        result_pipe (the read end of a further pipe written by the process) is given, it is read too, and each chunk
+        of data read from it is passed to on_result_data(data) on the supervisor thread as it arrives; on_exit is
+        called only once it has also closed. Returns the SupervisedProcess.
+        """
+        supervised = SupervisedProcess(proc, on_exit)
+        for pipe in [proc.stdout, proc.stderr]:
+            if pipe is not None:
+                supervised.output_map[pipe.fileno()] = []
+                supervised.pipe_map[pipe.fileno()] = pipe
+        if result_pipe is not None:
+            supervised.data_handler_map[result_pipe.fileno()] = on_result_data
+            supervised.pipe_map[result_pipe.fileno()] = result_pipe
+        with self._lock:
+            self._process_map[proc.pid] = supervised
+            self._new_processes.append(supervised)
+        self._wakeup()
+        return supervised
+
+    def terminate(self, proc):
+        """
+        Terminate the process group of proc: SIGTERM is sent immediately, then SIGKILL if the process has not exited
+        after TERMINATE_TIMEOUT. If it has still not exited KILL_TIMEOUT after that, it is abandoned. proc need not
+        already be supervised (for example a ShimServer process). Returns the SupervisedProcess, whose finished event
+        is set as soon as the process has been reaped (or abandoned).
+        """
+        with self._lock:
+            supervised = self._process_map.get(proc.pid)
+            if supervised is None:
+                supervised = SupervisedProcess(proc, None)
+                self._process_map[proc.pid] = supervised
+                self._new_processes.append(supervised)
+            if supervised.kill_signal is None:
+                supervised.terminate_time = time()
+                supervised.kill_signal = SIGTERM
+                supervised.kill_deadline = time() + TERMINATE_TIMEOUT
+                self._signal(supervised, SIGTERM)
+        self._wakeup()
+        return supervised
 
-class ShimWorkerThread(Thread):
-    """Parent class for shim worker threads and return a string once the thread has ended"""
-    def __init__(self, thread_name):
-        super(ShimWorkerThread, self).__init__(name=thread_name)
+    def run(self):
+        """Thread starts here"""
+        while True:
+            self._register_new_processes()
+            try:
+                events = self._poller.poll(self._get_poll_timeout())
+            except SelectError as exc:
+                if exc.args[0] == EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd == self._wakeup_read_fd:
+                    os.read(fd, 4096)
+                elif event & (POLLIN | POLLHUP | POLLERR | POLLNVAL):
+                    self._read(fd, event)
+            self._check_processes()
+
+    def _wakeup(self):
+        """Wake the supervisor thread from poll()"""
+        try:
+            os.write(self._wakeup_write_fd, 'x')
+        except OSError as exc:
+            if exc.errno != EAGAIN: # Pipe full: a wakeup is already pending
+                raise
+
+    def _register_new_processes(self):
+        """Start polling the pipes of processes handed over by other threads since the last loop"""
+        with self._lock:
+            new_processes = self._new_processes
+            self._new_processes = []
+        for supervised in new_processes:
+            for fd in supervised.pipe_map:
+                self._fd_map[fd] = supervised
+                self._poller.register(fd, POLLIN)
+
+    def _get_poll_timeout(self):
+        """Return the poll() timeout in ms: until the earliest escalation deadline, or None to wait for an event"""
+        timeout = None
+        now = time()
+        with self._lock:
+            for supervised in self._process_map.itervalues():
+                if supervised.kill_deadline is not None:
+                    remaining = max(0.0, supervised.kill_deadline - now)
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                if len(supervised.pipe_map) == 0 and not supervised.is_reaped():
+                    timeout = REAP_INTERVAL if timeout is None else min(timeout, REAP_INTERVAL)
+        return None if timeout is None else int(timeout * 1000) + 1
+
+    def _read(self, fd, event):
+        """Read available data from fd, closing it on EOF"""
+        supervised = self._fd_map.get(fd)
+        if supervised is None:
+            return
+        data = ''
+        if not event & POLLNVAL:
+            try:
+                data = os.read(fd, 65536)
+            except OSError as exc:
+                if exc.errno == EINTR or exc.errno == EAGAIN:
+                    return
+        if len(data) > 0:
+            if supervised.first_output_time is None:
+                supervised.first_output_time = time()
+            if fd in supervised.data_handler_map:
+                try:
+                    supervised.data_handler_map[fd](data)
+                except Exception as exc: # The supervisor must keep running for the other processes
+                    if supervised.handler_error is None:
+                        supervised.handler_error = '%s: %s' % (exc.__class__.__name__, exc)
+                    supervised.data_handler_map[fd] = lambda data: None # Read on to EOF, discarding the data
+            else:
+                supervised.output_map[fd].append(data)
+        else:
+            self._close_fd(supervised, fd)
+
+    def _close_fd(self, supervised, fd):
+        """Stop polling fd and close its pipe"""
+        self._poller.unregister(fd)
+        del self._fd_map[fd]
+        supervised.pipe_map.pop(fd).close()
+
+    def _check_processes(self):
+        """Reap processes which have exited, escalate overdue terminations and finish completed processes"""
+        now = time()
+        with self._lock:
+            process_list = self._process_map.values()
+        for supervised in process_list:
+            if not supervised.is_reaped():
+                supervised.proc.poll() # waitpid(pid, WNOHANG)
+                if supervised.is_reaped():
+                    supervised.exit_time = time()
+            if not supervised.is_complete() and supervised.kill_deadline is not None and \
+               now >= supervised.kill_deadline:
+                with self._lock:
+                    if supervised.kill_signal == SIGTERM:
+                        supervised.kill_signal = SIGKILL
+                        supervised.kill_deadline = now + KILL_TIMEOUT
+                        self._signal(supervised, SIGKILL)
+                    else:
+                        supervised.abandoned = True
+            if supervised.abandoned or supervised.is_complete():
+                self._finish(supervised)
+
+    def _finish(self, supervised):
+        """Stop supervising a process and report its output"""
+        for fd in supervised.pipe_map.keys():
+            self._close_fd(supervised, fd)
+        with self._lock:
+            self._process_map.pop(supervised.proc.pid, None)
+        if supervised.on_exit is not None:
+            try:
+                supervised.on_exit(supervised.get_output(supervised.stdout_fd),
+                                   supervised.get_output(supervised.stderr_fd))
+            except Exception as exc: # The supervisor must keep running for the other processes
+                print 'ERROR: shims.ShimSupervisor: Exception handling exit of pid %d: %s' % (supervised.proc.pid, exc)
+        supervised.finished.set()
+
+    @staticmethod
+    def _signal(supervised, sig):
+        """
+        Send signal sig to the process group of the supervised process, if it still exists. Shims are started with
+        setsid(), so the process group id is the pid of the shim, even once the shim itself has been reaped.
+        """
+        try:
+            killpg(supervised.proc.pid, sig)
+        except OSError: # Process has already exited
+            pass
+
+
+_SUPERVISOR = None
+_SUPERVISOR_LOCK = Lock()
+
+def get_supervisor():
+    """Return the ShimSupervisor, starting it on first use"""
+    global _SUPERVISOR
+    with _SUPERVISOR_LOCK:
+        if _SUPERVISOR is None:
+            _SUPERVISOR = ShimSupervisor()
+            _SUPERVISOR.start()
+        return _SUPERVISOR
+
+
+def set_shim_options(options_str):
+    """
+    Pass the tuning options in options_str (a JSON object, for example '{"prefetch": 100}') to all shims started
+    from now on through environment variable SHIM_OPTIONS_ENV. Raises ValueError if options_str is not a JSON object.
+    The options supported by the Python shims are described in qpid_interop_test.shim_utils.
+    """
+    if not isinstance(loads(options_str), dict):
+        raise ValueError('Shim options must be a JSON object')
+    os.environ[SHIM_OPTIONS_ENV] = options_str
+
+
+def add_shim_option(name, value):
+    """Add option name with value (JSON-compatible) to the options passed to the shims (see set_shim_options())"""
+    options = loads(os.environ.get(SHIM_OPTIONS_ENV, '{}'))
+    options[name] = value
+    os.environ[SHIM_OPTIONS_ENV] = dumps(options)
+
+
+class ResultDecoder(object):
+    """
+    Decodes the results written by a shim on its result channel (see RESULT_FD_ENV) as the data arrives. The channel
+    carries a sequence of records, each of which is a header (RESULT_RECORD_HEADER: its kind and length) followed by
+    its data. The RESULT_RECORD records are those which the shim would otherwise have printed on stdout one per
+    line: the test key, the JSON result and any further JSON results (see ShimWorker._process_output()). As the
+    channel is separate from stdout and stderr, diagnostics printed by the shim cannot corrupt the results.
+
+    A receiver may also stream each value as it receives it in a VALUE_RECORD, before its results. Each streamed
+    value is passed to on_value(value) as soon as it has been decoded, if on_value is given. The times at which the
+    shim reached each phase of the test, if it reports them in a TIMING_RECORD, are kept in phase_map.
+    """
+    HEADER_SIZE = calcsize(RESULT_RECORD_HEADER)
+
+    def __init__(self, on_value=None):
+        self.record_list = []
+        self.phase_map = {} # phase -> time (seconds since the epoch) reported by the shim
+        self.on_value = on_value
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Decode the records completed by data, the next chunk read from the result channel"""
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.HEADER_SIZE:
+            record_kind, record_size = unpack_from(RESULT_RECORD_HEADER, buffer(self._buffer))
+            if len(self._buffer) < self.HEADER_SIZE + record_size:
+                break
+            record = str(self._buffer[self.HEADER_SIZE:self.HEADER_SIZE + record_size])
+            del self._buffer[:self.HEADER_SIZE + record_size]
+            if record_kind == RESULT_RECORD:
+                self.record_list.append(record)
+            elif record_kind == VALUE_RECORD and self.on_value is not None:
+                try:
+                    self.on_value(loads(record))
+                except ValueError: # Not JSON: pass it on as it is, so that it is reported as a wrong value
+                    self.on_value(record)
+            elif record_kind == TIMING_RECORD:
+                try:
+                    self.phase_map.update(loads(record))
+                except (TypeError, ValueError): # Timing is diagnostic only, it must not fail the test
+                    pass
+
+    def is_truncated(self):
+        """Return True if the channel ended part way through a record"""
+        return len(self._buffer) > 0
+
+
+class ShimWorker(object):
+    """
+    Parent class for shim workers, each of which runs a single test on a shim and returns a string once it has ended.
+    Shim processes are run under the control of the ShimSupervisor rather than each on its own thread.
+    """
+    def __init__(self, name):
+        self.name = name
         self.arg_list = []
+        self.use_shell_flag = False
         self.return_obj = None
+        self.latency_list = None
+        self.result_decoder = None
+        self.value_comparator = None
+        self.payload_mode = 'argv'
+        self.payload_path = None # File holding the test parameters in payload modes "file" and "mmap"
         self.proc = None
+        self.supervised = None
+        self._started = False
+        self._done = Event()
+        self.start_time = None
+        self.finish_time = None
+        self.phase_map = {} # phase -> seconds since start_time, measured by the test program
+        self.shim_phase_map = {} # phase -> time (seconds since the epoch) reported by a shim server
+
+    def start(self):
+        """Start the shim process under the control of the shim supervisor"""
+        self._started = True
+        self.start_time = time()
+        stdin_file = None
+        result_fds = []
+        def preexec():
+            """Runs in the shim process before exec: inherit only the write end of this shim's result channel"""
+            setsid()
+            fcntl(result_fds[1], F_SETFD, fcntl(result_fds[1], F_GETFD) & ~FD_CLOEXEC)
+        try:
+            shim_args, stdin_file = self.get_shim_args()
+            #print '\n>>SHIM>>', shim_args # DEBUG - useful to see command-line sent to shim
+            with SPAWN_LOCK:
+                result_fds.extend(os.pipe())
+                for fd in result_fds: # Not inherited by the other shims started concurrently
+                    fcntl(fd, F_SETFD, fcntl(fd, F_GETFD) | FD_CLOEXEC)
+                self.proc = Popen(shim_args, stdin=stdin_file, stdout=PIPE, stderr=PIPE, shell=self.use_shell_flag,
+                                  preexec_fn=preexec, env=dict(os.environ, **{RESULT_FD_ENV: str(result_fds[1])}))
+            self.phase_map[PHASE_SPAWN] = time() - self.start_time
+        except (IOError, OSError) as exc:
+            self.return_obj = str(exc) + ': shim=' + self.arg_list[0]
+            self._set_done()
+            return
+        finally:
+            # Only the shim writes results; the channel ends when the shim closes it. The read end is closed too if
+            # the shim could not be started, whatever the error.
+            for fd in result_fds[1:] if self.proc is not None else result_fds:
+                os.close(fd)
+            if stdin_file is not None:
+                stdin_file.close() # The shim has its own descriptor
+        self.result_decoder = ResultDecoder(None if self.value_comparator is None else self._on_value)
+        self.supervised = get_supervisor().supervise(self.proc, self._on_exit, os.fdopen(result_fds[0], 'rb'),
+                                                     self.result_decoder.feed)
+
+    def get_shim_args(self):
+        """
+        Return a tuple (command-line argument list, stdin file) with which to start the shim, passing the JSON test
+        parameters (the last element of arg_list) according to payload_mode (see PAYLOAD_MODES):
+        * argv: As the last command-line argument. Its size is limited by the operating system (ARG_MAX).
+        * stdin: As the contents of a temporary file which becomes the stdin of the shim. The last argument is
+          PAYLOAD_STDIN_ARG.
+        * file: In a temporary file. The last argument is PAYLOAD_FILE_PREFIX followed by the path of the file.
+        * mmap: Written through a memory map to a file in shared memory (SHARED_MEMORY_DIR), which the shim maps
+          in turn. The last argument is PAYLOAD_MMAP_PREFIX followed by the path of the file.
+        The stdin file is None except in payload mode stdin. Files are removed once the shim has finished.
+        """
+        json_test_str = self.arg_list[-1]
+        if self.payload_mode == 'stdin':
+            stdin_file = TemporaryFile()
+            stdin_file.write(json_test_str)
+            stdin_file.seek(0)
+            return (self.arg_list[:-1] + [PAYLOAD_STDIN_ARG], stdin_file)
+        if self.payload_mode == 'file':
+            payload_fd, self.payload_path = mkstemp(prefix='qit-', suffix='.json')
+            with os.fdopen(payload_fd, 'wb') as payload_file:
+                payload_file.write(json_test_str)
+            return (self.arg_list[:-1] + [PAYLOAD_FILE_PREFIX + self.payload_path], None)
+        if self.payload_mode == 'mmap':
+            payload_dir = SHARED_MEMORY_DIR if path.isdir(SHARED_MEMORY_DIR) else None
+            payload_fd, self.payload_path = mkstemp(prefix='qit-', suffix='.json', dir=payload_dir)
+            try:
+                os.ftruncate(payload_fd, len(json_test_str))
+                payload_map = mmap(payload_fd, len(json_test_str))
+                payload_map[:] = json_test_str
+                payload_map.close()
+            finally:
+                os.close(payload_fd)
+            return (self.arg_list[:-1] + [PAYLOAD_MMAP_PREFIX + self.payload_path], None)
+        return (self.arg_list, None)
+
+    def compare_values(self, sent_value_list):
+        """
+        Compare each value streamed by the shim on its result channel (see ResultDecoder) with sent_value_list as soon
+        as it arrives. At the first mismatch, the shim is terminated rather than left to receive the remaining values
+        (or to time out waiting for them), and get_value_mismatch() then describes the mismatch. Shims which do not
+        stream their values are unaffected. Call this before start().
+        """
+        self.value_comparator = StreamingComparator(sent_value_list)
+
+    def get_value_mismatch(self):
+        """Return a description of the first streamed value which differs from the value sent, or None"""
+        if self.value_comparator is None:
+            return None
+        return self.value_comparator.get_mismatch()
+
+    def get_value_mismatch_index(self):
+        """Return the index of the first streamed value which differs from the value sent, or None"""
+        if self.value_comparator is None:
+            return None
+        return self.value_comparator.get_mismatch_index()
+
+    def _on_value(self, value):
+        """Called by the shim supervisor for each value streamed by the shim"""
+        if not self.value_comparator.check(value) and self.proc is not None:
+            get_supervisor().terminate(self.proc)
+
+    def _on_exit(self, stdoutdata, stderrdata):
+        """Called by the shim supervisor once the shim process has exited"""
+        try:
+            parse_start_time = time()
+            self._process_output(stdoutdata, stderrdata)
+            self.phase_map[PHASE_PARSE] = time() - parse_start_time
+        finally:
+            self._set_done()
+
+    def _set_done(self):
+        """Mark the shim as finished"""
+        if self.payload_path is not None:
+            try:
+                os.remove(self.payload_path)
+            except OSError:
+                pass
+            self.payload_path = None
+        self.finish_time = time()
+        self._done.set()
+
+    def is_alive(self):
+        """Return True if the shim has been started and has not yet finished"""
+        return self._started and not self._done.is_set()
+
+    def join(self, timeout=None):
+        """Wait up to timeout (seconds) for the shim to finish"""
+        self._done.wait(timeout)
 
     def get_return_object(self):
-        """Get the return object from the completed thread"""
+        """Get the return object from the completed shim"""
         return self.return_obj
 
+    def get_payload_size(self):
+        """Return the size of the test parameters (the JSON string of test values) passed to the shim"""
+        if len(self.arg_list) == 0:
+            return 0
+        return len(self.arg_list[-1])
+
+    def get_phase_times(self):
+        """
+        Return a map of the phases of the completed test reached by this shim to their times in seconds since the shim
+        was started: those measured by the test program (PROCESS_PHASES, of which PHASE_PARSE and PHASE_KILL are
+        durations instead) and those reported by the shim itself (see qpid_interop_test.shim_utils.record_phase()).
+        Phases which were not reached, or not reported, are absent.
+        """
+        phase_map = dict(self.phase_map)
+        supervised = self.supervised
+        if supervised is not None:
+            if supervised.first_output_time is not None:
+                phase_map[PHASE_FIRST_OUTPUT] = supervised.first_output_time - self.start_time
+            if supervised.exit_time is not None:
+                phase_map[PHASE_EXIT] = supervised.exit_time - self.start_time
+                if supervised.terminate_time is not None:
+                    phase_map[PHASE_KILL] = supervised.exit_time - supervised.terminate_time
+        shim_phase_map = dict(self.shim_phase_map)
+        if self.result_decoder is not None:
+            shim_phase_map.update(self.result_decoder.phase_map)
+        for phase, phase_time in shim_phase_map.iteritems():
+            if isinstance(phase_time, (int, long, float)):
+                phase_map[phase] = phase_time - self.start_time
+        return phase_map
+
+    def get_latency_histogram(self):
+        """
+        Get the LatencyHistogram of the messages received by the completed shim in latency mode, or None if it did
+        not return one
+        """
+        if self.latency_list is None:
+            return None
+        return LatencyHistogram.from_list(self.latency_list)
+
+    def _process_output(self, stdoutdata, stderrdata):
+        """
+        Set the return object from the output of a shim. If the shim returned two results (the test key and a JSON
+        string) and printed nothing on stderr, the return object is a tuple (test key, JSON object). Otherwise it is
+        the shim output itself. A receiver in latency mode returns a third result, the JSON list of its latency
+        histogram, which is kept separately (see get_latency_histogram()). The results are the records written on the
+        result channel (see ResultDecoder) or, if the shim wrote none, the lines printed on stdout.
+        """
+        if len(stderrdata) > 0:
+            #print '<<SHIM ERROR<<', stderrdata # DEBUG - useful to see shim's failure message
+            self.return_obj = (stdoutdata, stderrdata)
+        elif self.supervised is not None and self.supervised.handler_error is not None:
+            self.return_obj = 'Error handling shim result channel: %s\n%s' % (self.supervised.handler_error,
+                                                                               stdoutdata)
+        elif self.result_decoder is not None and self.result_decoder.is_truncated():
+            self.return_obj = 'Shim result channel ended part way through a result:\n%s' % stdoutdata
+        else:
+            #print '<<SHIM<<', stdoutdata # DEBUG - useful to see text received from shim
+            if self.result_decoder is not None and len(self.result_decoder.record_list) > 0:
+                str_tvl = self.result_decoder.record_list
+            else:
+                str_tvl = stdoutdata.split('\n')[0:-1] # remove trailing \n
+            if len(str_tvl) == 2 or len(str_tvl) == 3:
+                try:
+                    self.return_obj = (str_tvl[0], loads(str_tvl[1]))
+                    if len(str_tvl) == 3:
+                        self.latency_list = loads(str_tvl[2])
+                except ValueError:
+                    self.return_obj = stdoutdata
+            else: # Make a single line of all the bits and return that
+                self.return_obj = stdoutdata
+
     def join_or_kill(self, timeout):
         """
-        Wait for thread to join after timeout (seconds). If still alive, it is then terminated, then if still alive,
-        killed
+        Wait up to timeout (seconds) for the shim to finish. If still alive, its process group is terminated, then if
+        still alive after TERMINATE_TIMEOUT, killed (see ShimSupervisor.terminate()). This returns as soon as the
+        process has exited. Return True if the shim finished within timeout.
         """
         self.join(timeout)
-        if self.is_alive():
-            if self.proc is not None:
-                if self._terminate_pg_loop():
-                    if self._kill_pg_loop():
-                        print '\n  ERROR: Thread %s (pid=%d) alive after kill' % (self.name, self.proc.pid)
-                    else:
-                        print 'Killed'
-                        stdout.flush()
-                else:
-                    print 'Terminated'
-                    stdout.flush()
-            else:
-                print 'ERROR: shims.join_or_kill(): Process joined and is alive, yet proc is None.'
-
-    def _terminate_pg_loop(self, num_attempts=2, wait_time=2):
-        cnt = 0
-        while cnt < num_attempts and self.is_alive():
-            cnt += 1
-            print '\n  Thread %s (pid=%d) alive after timeout, terminating (try #%d)...' % (self.name, self.proc.pid,
-                                                                                            cnt),
+        if not self.is_alive():
+            return True
+        if self.proc is not None:
+            print '\n  Shim %s (pid=%d) alive after timeout, terminating...' % (self.name, self.proc.pid),
             stdout.flush()
-            killpg(getpgid(self.proc.pid), SIGTERM)
-            sleep(wait_time)
-        return self.is_alive()
-
-    def _kill_pg_loop(self, num_attempts=2, wait_time=5):
-        cnt = 0
-        while cnt < num_attempts and self.is_alive():
-            cnt += 1
-            print '\n  Thread %s (pid=%d) alive after terminate, killing (try #%d)...' % (self.name, self.proc.pid,
-                                                                                          cnt),
+            supervised = get_supervisor().terminate(self.proc)
+            supervised.finished.wait(TERMINATE_TIMEOUT + KILL_TIMEOUT + 1.0)
+            if supervised.is_reaped():
+                self.join(KILL_TIMEOUT)
+                print 'Killed' if supervised.kill_signal == SIGKILL else 'Terminated'
+            else:
+                print '\n  ERROR: Shim %s (pid=%d) alive after kill' % (self.name, self.proc.pid)
             stdout.flush()
-            killpg(getpgid(self.proc.pid), SIGKILL)
-            sleep(wait_time)
-        return self.is_alive()
+        else:
+            print 'ERROR: shims.join_or_kill(): Shim started and is alive, yet proc is None.'
+        return False
 
 
-class Sender(ShimWorkerThread):
-    """Sender class for multi-threaded send"""
-    def __init__(self, use_shell_flag, send_shim_args, broker_addr, queue_name, test_key, json_test_str):
-        super(Sender, self).__init__('sender_thread_%s' % queue_name)
+class Sender(ShimWorker):
+    """Sender class for concurrent send"""
+    def __init__(self, use_shell_flag, send_shim_args, broker_addr, queue_name, test_key, json_test_str,
+                 payload_mode='argv'):
+        super(Sender, self).__init__('sender_%s' % queue_name)
         if send_shim_args is None:
             print 'ERROR: Sender: send_shim_args == None'
         self.use_shell_flag = use_shell_flag
+        self.payload_mode = payload_mode
         self.arg_list.extend(send_shim_args)
         self.arg_list.extend([broker_addr, queue_name, test_key, json_test_str])
 
-    def run(self):
-        """Thread starts here"""
-        try:
-            #print '\n>>SNDR>>', self.arg_list # DEBUG - useful to see command-line sent to shim
-            self.proc = Popen(self.arg_list, stdout=PIPE, stderr=PIPE, shell=self.use_shell_flag, preexec_fn=setsid)
-            (stdoutdata, stderrdata) = self.proc.communicate()
-            if len(stderrdata) > 0:
-                #print '<<SNDR ERROR<<', stderrdata # DEBUG - useful to see shim's failure message
-                self.return_obj = (stdoutdata, stderrdata)
-            else:
-                #print '<<SNDR<<', stdoutdata # DEBUG - useful to see text received from shim
-                str_tvl = stdoutdata.split('\n')[0:-1] # remove trailing \n
-                if len(str_tvl) == 2:
-                    try:
-                        self.return_obj = (str_tvl[0], loads(str_tvl[1]))
-                    except ValueError:
-                        self.return_obj = stdoutdata
-                else: # Make a single line of all the bits and return that
-                    self.return_obj = stdoutdata
-        except OSError as exc:
-            self.return_obj = str(exc) + ': shim=' + self.arg_list[0] 
-        except CalledProcessError as exc:
-            self.return_obj = str(exc) + '\n\nOutput:\n' + exc.output
-
 
-class Receiver(ShimWorkerThread):
-    """Receiver class for multi-threaded receive"""
-    def __init__(self, receive_shim_args, broker_addr, queue_name, test_key, json_test_str):
-        super(Receiver, self).__init__('receiver_thread_%s' % queue_name)
+class Receiver(ShimWorker):
+    """Receiver class for concurrent receive"""
+    def __init__(self, receive_shim_args, broker_addr, queue_name, test_key, json_test_str, payload_mode='argv'):
+        super(Receiver, self).__init__('receiver_%s' % queue_name)
         if receive_shim_args is None:
             print 'ERROR: Receiver: receive_shim_args == None'
+        self.payload_mode = payload_mode
         self.arg_list.extend(receive_shim_args)
         self.arg_list.extend([broker_addr, queue_name, test_key, json_test_str])
 
-    def run(self):
+
+class ShimServer(object):
+    """
+    A long-lived shim process started in server mode (with the single command-line argument SERVER_MODE_ARG).
+    Instead of running a single test using its command-line arguments, the shim reads one test at a time from
+    stdin, each as a single line containing a JSON list of the command-line arguments it would otherwise have been
+    started with. For each test, it writes a single line on stdout containing a JSON object {"stdout": <text>,
+    "stderr": <text>} holding the output that it would have printed had it been started for that test alone, and
+    optionally "phases": <map of phase to time> (see TIMING_RECORD). The shim exits when stdin is closed.
+    """
+    def __init__(self, shim_args):
+        self.stderr_file = TemporaryFile()
+        with SPAWN_LOCK:
+            self.proc = Popen(shim_args + [SERVER_MODE_ARG], stdin=PIPE, stdout=PIPE, stderr=self.stderr_file,
+                              preexec_fn=setsid)
+
+    def is_alive(self):
+        """Return True if the shim process is still running"""
+        return self.proc.poll() is None
+
+    def run_test(self, test_args):
+        """
+        Send a single test to the shim and wait for its output. Return a tuple (stdoutdata, stderrdata, phase map),
+        the phase map being the times at which the shim reached each phase of the test, or None if the shim exited
+        before returning its output.
+        """
+        try:
+            self.proc.stdin.write(dumps(test_args) + '\n')
+            self.proc.stdin.flush()
+        except IOError: # Broken pipe: shim has exited
+            return None
+        response_str = self.proc.stdout.readline()
+        if len(response_str) == 0:
+            return None
+        response = loads(response_str)
+        return (response['stdout'].encode('utf-8'), response['stderr'].encode('utf-8'), response.get('phases', {}))
+
+    def get_stderr(self):
+        """Return everything the shim process has written on stderr outside of a test"""
+        self.stderr_file.seek(0)
+        return self.stderr_file.read()
+
+    def stop(self):
+        """Close the shim's stdin, which causes it to exit"""
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+
+
+class ShimServerPool(object):
+    """
+    Pool of ShimServer instances for one shim program. A server is started only when no idle server is available,
+    so tests run serially share a single shim process for the entire test suite.
+    """
+    def __init__(self, shim_args):
+        self.shim_args = shim_args
+        self.idle_servers = []
+        self.servers = []
+        self.lock = Lock()
+        atexit.register(self.stop)
+
+    def acquire(self):
+        """Return an idle running server, starting a new one if none is available"""
+        with self.lock:
+            while len(self.idle_servers) > 0:
+                server = self.idle_servers.pop()
+                if server.is_alive():
+                    return server
+            server = ShimServer(self.shim_args)
+            self.servers.append(server)
+            return server
+
+    def release(self, server):
+        """Return server to the pool once a test has completed. Servers which have exited are discarded."""
+        with self.lock:
+            if server.is_alive():
+                self.idle_servers.append(server)
+
+    def stop(self):
+        """Stop all servers started by this pool"""
+        with self.lock:
+            for server in self.servers:
+                server.stop()
+            self.idle_servers = []
+
+
+class PooledShimWorker(ShimWorker):
+    """
+    Pooled variant of the shim worker which runs a test on a persistent shim process taken from a ShimServerPool
+    rather than starting a new shim process for the test. As the exchange with the server is a blocking
+    request/response on its pipes, each test runs on its own (daemon) thread. The server process may still be
+    terminated by the ShimSupervisor through join_or_kill(). As the test arguments are sent to the server on its
+    stdin, the payload mode does not apply.
+    """
+    def __init__(self, name, server_pool, broker_addr, queue_name, test_key, json_test_str):
+        super(PooledShimWorker, self).__init__(name)
+        self.server_pool = server_pool
+        self.arg_list.extend([broker_addr, queue_name, test_key, json_test_str])
+
+    def start(self):
+        """Start the test on a thread"""
+        self._started = True
+        self.start_time = time()
+        thread = Thread(name=self.name, target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def _run(self):
         """Thread starts here"""
         try:
-            #print '\n>>RCVR>>', self.arg_list # DEBUG - useful to see command-line sent to shim
-            self.proc = Popen(self.arg_list, stdout=PIPE, stderr=PIPE, preexec_fn=setsid)
-            (stdoutdata, stderrdata) = self.proc.communicate()
-            if len(stderrdata) > 0:
-                #print '<<RCVR ERROR<<', stderrdata # DEBUG - useful to see shim's failure message
-                self.return_obj = (stdoutdata, stderrdata)
+            try:
+                server = self.server_pool.acquire()
+            except OSError as exc:
+                self.return_obj = str(exc) + ': shim=' + self.server_pool.shim_args[0]
+                return
+            self.proc = server.proc
+            try:
+                shim_output = server.run_test(self.arg_list)
+            finally:
+                self.server_pool.release(server)
+            if shim_output is None:
+                self.return_obj = 'Shim server (pid=%d) exited during test, return code %s:\n%s' % \
+                                  (server.proc.pid, server.proc.poll(), server.get_stderr())
             else:
-                #print '<<RCVR<<', stdoutdata # DEBUG - useful to see text received from shim
-                str_tvl = stdoutdata.split('\n')[0:-1] # remove trailing \n
-                if len(str_tvl) == 2:
-                    try:
-                        self.return_obj = (str_tvl[0], loads(str_tvl[1]))
-                    except ValueError:
-                        self.return_obj = stdoutdata
-                else: # Make a single line of all the bits and return that
-                    self.return_obj = stdoutdata
-        except OSError as exc:
-            self.return_obj = str(exc) + ': shim=' + self.arg_list[0]
-        except CalledProcessError as exc:
-            self.return_obj = str(exc) + '\n\n' + exc.output
+                self.shim_phase_map = shim_output[2]
+                parse_start_time = time()
+                self._process_output(shim_output[0], shim_output[1])
+                self.phase_map[PHASE_PARSE] = time() - parse_start_time
+        finally:
+            self._set_done()
+
+
+def hash_shim_files(shim_args, module_names=()):
+    """
+    Return a hash of the contents of the files named in the shim command-line arguments shim_args (including the
+    files in a ':'-separated class path) and of the modules of this package named in module_names which the shim
+    imports (see Shim.SHARED_MODULES), which changes when the shim is rebuilt or a module it shares is changed
+    """
+    package_dir = path.dirname(path.abspath(__file__))
+    shim_hash = sha1()
+    for shim_arg in list(shim_args) + [path.join(package_dir, '%s.py' % name) for name in module_names]:
+        for file_name in shim_arg.split(':'):
+            if path.isfile(file_name):
+                shim_hash.update(file_name)
+                with open(file_name, 'rb') as shim_file:
+                    for block in iter(lambda: shim_file.read(1 << 16), b''):
+                        shim_hash.update(block)
+    return shim_hash.hexdigest()
+
 
 class Shim(object):
     """Abstract shim class, parent of all shims."""
     NAME = None
     JMS_CLIENT = False # Enables certain JMS-specific message checks
+    SERVER_MODE = False # Shim can be started in server mode, see ShimServer
+    AGGREGATE_TYPES = False # amqp_types_test shims can exchange all AMQP types in one invocation (aggregate mode)
+    PAYLOAD_MODES = ['argv'] # Payload modes supported by the shim, see ShimWorker.get_shim_args()
+    SHARED_MODULES = [] # Modules of this package imported by the shim, hashed with its files (see hash_shim_files())
     def __init__(self, sender_shim, receiver_shim):
         self.sender_shim = sender_shim
         self.receiver_shim = receiver_shim
         self.send_params = None
         self.receive_params = None
         self.use_shell_flag = False
+        self.sender_pool = None
+        self.receiver_pool = None
+        self.payload_mode = 'argv'
+        self.sender_hash = None # Created on first use, see get_sender_hash()
+        self.receiver_hash = None # Created on first use, see get_receiver_hash()
+
+    def get_sender_hash(self):
+        """Return a hash of the files of the send shim (see hash_shim_files())"""
+        if self.sender_hash is None:
+            self.sender_hash = hash_shim_files(self.send_params, self.SHARED_MODULES)
+        return self.sender_hash
+
+    def get_receiver_hash(self):
+        """Return a hash of the files of the receive shim (see hash_shim_files())"""
+        if self.receiver_hash is None:
+            self.receiver_hash = hash_shim_files(self.receive_params, self.SHARED_MODULES)
+        return self.receiver_hash
+
+    def enable_server_mode(self):
+        """
+        Run all tests for this shim on persistent shim processes (see ShimServer) instead of starting the shim once
+        per test. Has no effect if the shim does not support server mode. Return True if server mode was enabled.
+        """
+        if self.SERVER_MODE:
+            self.sender_pool = ShimServerPool(self.send_params)
+            self.receiver_pool = ShimServerPool(self.receive_params)
+        return self.SERVER_MODE
+
+    def set_payload_mode(self, payload_mode):
+        """
+        Pass the JSON test parameters to the shim in payload_mode (one of PAYLOAD_MODES) rather than as a command-line
+        argument. Has no effect if the shim does not support payload_mode. Return True if the payload mode was set.
+        """
+        if payload_mode in self.PAYLOAD_MODES:
+            self.payload_mode = payload_mode
+            return True
+        return False
 
     def create_sender(self, broker_addr, queue_name, test_key, json_test_str):
         """Create a new sender instance"""
-        sender = Sender(self.use_shell_flag, self.send_params, broker_addr, queue_name, test_key, json_test_str)
-        sender.daemon = True
+        if self.sender_pool is not None:
+            sender = PooledShimWorker('sender_%s' % queue_name, self.sender_pool, broker_addr, queue_name,
+                                      test_key, json_test_str)
+        else:
+            sender = Sender(self.use_shell_flag, self.send_params, broker_addr, queue_name, test_key,
+                            json_test_str, self.payload_mode)
         return sender
 
     def create_receiver(self, broker_addr, queue_name, test_key, json_test_str):
         """Create a new receiver instance"""
-        receiver = Receiver(self.receive_params, broker_addr, queue_name, test_key, json_test_str)
-        receiver.daemon = True
+        if self.receiver_pool is not None:
+            receiver = PooledShimWorker('receiver_%s' % queue_name, self.receiver_pool, broker_addr, queue_name,
+                                        test_key, json_test_str)
+        else:
+            receiver = Receiver(self.receive_params, broker_addr, queue_name, test_key, json_test_str,
+                                self.payload_mode)
         return receiver
 
 class ProtonPythonShim(Shim):
     """Shim for qpid-proton Python client"""
     NAME = 'ProtonPython'
+    SERVER_MODE = True
+    AGGREGATE_TYPES = True
+    PAYLOAD_MODES = PAYLOAD_MODES
+    SHARED_MODULES = PYTHON_SHIM_MODULES
     def __init__(self, sender_shim, receiver_shim):
         super(ProtonPythonShim, self).__init__(sender_shim, receiver_shim)
         self.send_params = [self.sender_shim]
@@ -209,6 +909,7 @@ class QpidJmsShim(Shim):
     """Shim for qpid-jms JMS client"""
     NAME = 'QpidJms'
     JMS_CLIENT = True
+    SERVER_MODE = True
 
     # Installed versions
     # TODO: Automate this - it gets out of date quickly
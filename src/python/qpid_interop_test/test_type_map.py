@@ -20,8 +20,11 @@ Module containing Error classes for interop testing
 # under the License.
 #
 
+from json import dumps
 import sys
 
+from qpid_interop_test.value_generator import DEFAULT_SEED, ValueGenerator
+
 class TestTypeMap(object):
     """
     Class which contains all the described types and the test values to be used in testing against those types.
@@ -54,8 +57,67 @@ class TestTypeMap(object):
     # connection property string it returns.
     BROKER_SKIP = {}
 
-    def __init__(self):
-        pass
+    # RANDOM_VALUE_FUNCTIONS: Map of types to a function which returns a random test value of that type from the
+    # random.Random instance it is passed. Random values are added to the TYPE_MAP values only if requested, see
+    # create_type_map(). Types which are not in this map have no random values.
+    # Format: {'type_1' : function_1,
+    #          'type_2' : function_2,
+    #          ...
+    #         }
+    RANDOM_VALUE_FUNCTIONS = {}
+
+    # FUZZ_VALUE_FUNCTIONS: Map of types to a function which returns a fuzz test value of that type from the
+    # random.Random instance it is passed, in the same format as RANDOM_VALUE_FUNCTIONS. Fuzz values favour the edge
+    # cases of their type (see value_generator.fuzz_int() for example), and are intended to be generated in large
+    # numbers. They are added to the TYPE_MAP values only if requested, when the values of a type are first used (see
+    # get_test_values()). Where the TYPE_MAP values of a type are a map of value types to lists of values (as for JMS
+    # message types), the keys of this map are those value types.
+    FUZZ_VALUE_FUNCTIONS = {}
+
+    def __init__(self, seed=DEFAULT_SEED, num_random_values=0, num_fuzz_values=0):
+        self.json_test_values_map = {} # test type -> test values serialized as JSON, see get_json_test_values()
+        self.value_generator = ValueGenerator(seed)
+        self.num_fuzz_values = num_fuzz_values
+        self.fuzz_type_map = {} # test type -> TYPE_MAP values with fuzz values added, see get_test_values()
+        self.TYPE_MAP = self.create_type_map(num_random_values)
+
+    def create_generated_values(self):
+        """
+        Return a map of types to a list of test values which are added to the TYPE_MAP values of that type. This is
+        for values which cannot be fixed in TYPE_MAP (such as timestamps and UUIDs), which should be derived from
+        self.value_generator so that they are the same in every run with the same seed.
+        """
+        return {}
+
+    def create_type_map(self, num_random_values):
+        """
+        Return a copy of TYPE_MAP to which the generated values (see create_generated_values()) and num_random_values
+        random values of each type in RANDOM_VALUE_FUNCTIONS have been added.
+        """
+        type_map = dict(self.TYPE_MAP)
+        for test_type, value_list in self.create_generated_values().iteritems():
+            type_map[test_type] = type_map[test_type] + value_list
+        if num_random_values > 0:
+            for test_type, random_value_function in self.RANDOM_VALUE_FUNCTIONS.iteritems():
+                rand = self.value_generator.get_random(test_type)
+                type_map[test_type] = type_map[test_type] + [random_value_function(rand)
+                                                             for _ in range(num_random_values)]
+        return type_map
+
+    def add_fuzz_values(self, name, value_type, test_values):
+        """
+        Return a copy of test_values (the values of value_type) with num_fuzz_values fuzz values added from the random
+        numbers generated for name. If test_values is a map of value types to lists of values, fuzz values of each
+        value type are added to its list.
+        """
+        if isinstance(test_values, dict):
+            return dict((sub_type, self.add_fuzz_values('%s:%s' % (name, sub_type), sub_type, sub_values))
+                        for sub_type, sub_values in test_values.iteritems())
+        if value_type not in self.FUZZ_VALUE_FUNCTIONS:
+            return test_values
+        fuzz_value_function = self.FUZZ_VALUE_FUNCTIONS[value_type]
+        rand = self.value_generator.get_random('fuzz:%s' % name)
+        return test_values + [fuzz_value_function(rand) for _ in range(self.num_fuzz_values)]
 
     def get_type_list(self):
         """Return a list of types which this test suite supports"""
@@ -81,11 +143,27 @@ class TestTypeMap(object):
         return self
 
     def get_test_values(self, test_type):
-        """Return test values to use when testing the supplied type."""
+        """
+        Return test values to use when testing the supplied type. If fuzz values were requested, they are generated
+        (once) on first use.
+        """
         if test_type not in self.TYPE_MAP.keys():
             return None
+        if self.num_fuzz_values > 0:
+            if test_type not in self.fuzz_type_map:
+                self.fuzz_type_map[test_type] = self.add_fuzz_values(test_type, test_type, self.TYPE_MAP[test_type])
+            return self.fuzz_type_map[test_type]
         return self.TYPE_MAP[test_type]
 
+    def get_json_test_values(self, test_type):
+        """
+        Return the test values to use when testing the supplied type serialized as JSON, as passed to the sender shims.
+        The values of each type are serialized only once, and shared by the tests of all shim pairs.
+        """
+        if test_type not in self.json_test_values_map:
+            self.json_test_values_map[test_type] = dumps(self.get_test_values(test_type))
+        return self.json_test_values_map[test_type]
+
     def skip_test_message(self, test_type, broker_name):
         """Return the message to use if a test is skipped"""
         if test_type in self.BROKER_SKIP.keys():
@@ -0,0 +1,150 @@
+"""
+Module containing a store of historical test durations, used to derive per-test timeouts
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from json import dump, load
+from math import ceil
+from os import makedirs, path, rename
+from threading import Lock
+from time import time
+
+import qpid_interop_test.shims
+
+
+class TimingStore(object):
+    """
+    Store of the durations of recent runs of each test, kept in a small JSON file. Each test is identified by the
+    test suite, the broker and a test key (normally the test type and the names of the send and receive shims).
+    The timeout for a test is then derived from the durations of its previous runs:
+
+        timeout = PERCENTILE percentile of recent durations * FACTOR + MARGIN
+
+    limited to shims.THREAD_TIMEOUT. Until a test has MIN_SAMPLES recorded durations, shims.THREAD_TIMEOUT is used.
+    Only the durations of passing tests are recorded (see record_duration()): a failed test may stop early, and would
+    lower the timeout. The durations of a test which times out are discarded, so that its next run again uses
+    shims.THREAD_TIMEOUT rather than the timeout it has outgrown. If file_name is None, no durations are loaded or
+    saved, and every test uses shims.THREAD_TIMEOUT.
+    """
+
+    MAX_SAMPLES = 20 # Number of recent durations kept for each test
+    MIN_SAMPLES = 3 # Number of durations required before the timeout is derived from them
+    PERCENTILE = 95
+    FACTOR = 3.0
+    MARGIN = 10.0 # seconds
+
+    def __init__(self, file_name, suite_name, broker_name):
+        self.file_name = file_name
+        self.suite_name = suite_name
+        self.broker_name = str(broker_name)
+        self.duration_map = {} # store key -> list of recent durations (oldest first)
+        self.updated_keys = set()
+        self.lock = Lock()
+        if self.file_name is not None and path.isfile(self.file_name):
+            self.duration_map = self._load()
+
+    def get_timeout(self, test_key):
+        """Return the timeout (seconds) for the test identified by test_key (a tuple of strings)"""
+        with self.lock:
+            duration_list = self.duration_map.get(self._store_key(test_key), [])
+            if len(duration_list) < self.MIN_SAMPLES:
+                return qpid_interop_test.shims.THREAD_TIMEOUT
+            sorted_list = sorted(duration_list)
+            rank = int(ceil(self.PERCENTILE / 100.0 * len(sorted_list))) # nearest-rank percentile
+            return min(sorted_list[rank - 1] * self.FACTOR + self.MARGIN, qpid_interop_test.shims.THREAD_TIMEOUT)
+
+    def record(self, test_key, duration):
+        """Record duration (seconds) of a completed run of the test identified by test_key"""
+        store_key = self._store_key(test_key)
+        with self.lock:
+            duration_list = self.duration_map.setdefault(store_key, [])
+            duration_list.append(round(duration, 3))
+            del duration_list[:-self.MAX_SAMPLES]
+            self.updated_keys.add(store_key)
+
+    def record_duration(self, test_key, shim_worker_list):
+        """
+        Record the duration of a passing run of the test identified by test_key, from the start of the first of the
+        (finished) shim workers in shim_worker_list to the finish of the last
+        """
+        self.record(test_key, max(worker.finish_time for worker in shim_worker_list) -
+                    min(worker.start_time for worker in shim_worker_list))
+
+    def discard(self, test_key):
+        """Discard the recorded durations of the test identified by test_key"""
+        store_key = self._store_key(test_key)
+        with self.lock:
+            if store_key in self.duration_map:
+                self.duration_map[store_key] = []
+                self.updated_keys.add(store_key)
+
+    def join_or_kill(self, test_key, shim_worker_list, timeout=None):
+        """
+        Wait for all the (already started) shim workers in shim_worker_list to finish within the timeout for the test
+        identified by test_key (or within timeout seconds if given), measured from the start of the first worker.
+        Workers still running at the timeout are terminated (see ShimWorker.join_or_kill()), and unless timeout was
+        given, the recorded durations of the test are discarded. Return True if all the workers finished in time. The
+        duration of the test is not recorded here, as whether the test passed is not yet known: see
+        record_duration().
+        """
+        start_time = min(worker.start_time for worker in shim_worker_list)
+        deadline = start_time + (self.get_timeout(test_key) if timeout is None else timeout)
+        in_time = True
+        for worker in shim_worker_list:
+            if not worker.join_or_kill(max(0.0, deadline - time())):
+                in_time = False
+        if not in_time and timeout is None:
+            self.discard(test_key)
+        return in_time
+
+    def save(self):
+        """
+        Save the durations recorded since the store was loaded. The file is re-read first so that durations saved
+        by other test suites in the meantime are kept, and is then replaced atomically.
+        """
+        if self.file_name is None:
+            return
+        with self.lock:
+            duration_map = self._load() if path.isfile(self.file_name) else {}
+            for store_key in self.updated_keys:
+                duration_map[store_key] = self.duration_map[store_key]
+            dir_name = path.dirname(path.abspath(self.file_name))
+            if not path.isdir(dir_name):
+                makedirs(dir_name)
+            tmp_file_name = '%s.tmp' % self.file_name
+            with open(tmp_file_name, 'w') as tmp_file:
+                dump(duration_map, tmp_file, indent=2, sort_keys=True)
+            rename(tmp_file_name, self.file_name)
+
+    def _load(self):
+        """Read the durations from the store file, ignoring a damaged file"""
+        try:
+            with open(self.file_name, 'r') as store_file:
+                duration_map = load(store_file)
+            if isinstance(duration_map, dict):
+                return duration_map
+        except (IOError, ValueError) as exc:
+            print 'WARNING: Unable to read test timing file "%s": %s' % (self.file_name, exc)
+        return {}
+
+    def _store_key(self, test_key):
+        """Return the key under which the durations for test_key are stored"""
+        return '/'.join([self.suite_name] + [str(key) for key in test_key] + [self.broker_name])
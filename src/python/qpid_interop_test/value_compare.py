@@ -0,0 +1,116 @@
+"""
+Module containing the comparison of sent and received test values, both incrementally as a receiver shim streams
+the values it receives and of complete value lists, with failure messages of bounded size
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from threading import Lock
+
+MAX_REPR_LENGTH = 200 # Longest value representation shown in a failure message before it is abbreviated
+
+
+def abbreviate(value):
+    """Return the repr of value, abbreviated to MAX_REPR_LENGTH characters if it is longer"""
+    value_repr = repr(value)
+    if len(value_repr) <= MAX_REPR_LENGTH:
+        return value_repr
+    return '%s... (%d characters)' % (value_repr[:MAX_REPR_LENGTH], len(value_repr))
+
+
+def describe_value_mismatch(index, num_sent_values, sent_value, received_value):
+    """Return a description of the difference between value index of the sent and received values"""
+    return 'Value %d of %d differs:\n    sent: %s\nreceived: %s' % \
+           (index, num_sent_values, abbreviate(sent_value), abbreviate(received_value))
+
+
+def find_value_list_mismatch(sent_value_list, received_value_list):
+    """
+    Return the index of the first value which differs between sent_value_list and received_value_list (or which is
+    missing from either), or None if they are equal
+    """
+    if not isinstance(received_value_list, list):
+        return 0
+    for index, (sent_value, received_value) in enumerate(zip(sent_value_list, received_value_list)):
+        if received_value != sent_value:
+            return index
+    if len(received_value_list) != len(sent_value_list):
+        return min(len(received_value_list), len(sent_value_list))
+    return None
+
+
+def describe_value_list_mismatch(sent_value_list, received_value_list):
+    """
+    Return a description of the first difference between sent_value_list and received_value_list, or None if they
+    are equal. Unlike a representation of both lists, its size does not depend on the number of values.
+    """
+    if not isinstance(received_value_list, list):
+        return 'Received %s in place of a list of %d values' % (abbreviate(received_value_list), len(sent_value_list))
+    for index, (sent_value, received_value) in enumerate(zip(sent_value_list, received_value_list)):
+        if received_value != sent_value:
+            return describe_value_mismatch(index, len(sent_value_list), sent_value, received_value)
+    if len(received_value_list) < len(sent_value_list):
+        return 'Received %d of %d values, first missing value: %s' % \
+               (len(received_value_list), len(sent_value_list), abbreviate(sent_value_list[len(received_value_list)]))
+    if len(received_value_list) > len(sent_value_list):
+        return 'Received %d values, but only %d were sent. First unexpected value: %s' % \
+               (len(received_value_list), len(sent_value_list), abbreviate(received_value_list[len(sent_value_list)]))
+    return None
+
+
+class StreamingComparator(object):
+    """
+    Compares the values streamed by a receiver shim, one at a time as they arrive, with sent_value_list, so that a
+    test can fail as soon as the first wrong value is received rather than once the receiver has finished. Only the
+    first mismatch is kept.
+    """
+    def __init__(self, sent_value_list):
+        self.sent_value_list = sent_value_list
+        self.num_received = 0
+        self.mismatch = None
+        self.mismatch_index = None
+        self._lock = Lock()
+
+    def check(self, received_value):
+        """Compare the next received value with the value sent. Return False if it differs (or was not sent)."""
+        with self._lock:
+            index = self.num_received
+            self.num_received += 1
+            if self.mismatch is not None:
+                return False
+            if index >= len(self.sent_value_list):
+                self.mismatch = 'Received more than the %d values sent. First unexpected value: %s' % \
+                                (len(self.sent_value_list), abbreviate(received_value))
+            elif received_value != self.sent_value_list[index]:
+                self.mismatch = describe_value_mismatch(index, len(self.sent_value_list), self.sent_value_list[index],
+                                                        received_value)
+            if self.mismatch is not None:
+                self.mismatch_index = index
+            return self.mismatch is None
+
+    def get_mismatch(self):
+        """Return a description of the first mismatch, or None if all values received so far are as sent"""
+        with self._lock:
+            return self.mismatch
+
+    def get_mismatch_index(self):
+        """Return the index of the first mismatched value, or None if all values received so far are as sent"""
+        with self._lock:
+            return self.mismatch_index
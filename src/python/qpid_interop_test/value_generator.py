@@ -0,0 +1,324 @@
+"""
+Module containing the seeded generation of test values, so that test values which are not fixed (such as timestamps,
+UUIDs, additional random values and fuzz values) are the same in every run using the same seed, and the shrinking of
+failing fuzz values
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+from hashlib import sha1
+from random import Random
+import re
+from string import ascii_letters, digits, punctuation
+from time import time
+from uuid import UUID
+
+DEFAULT_SEED = 0
+
+MAX_TIMESTAMP = 4102444800000 # Generated timestamps lie between the Unix epoch and 2100-01-01 (in milliseconds)
+MAX_TEXT_LENGTH = 64 # Longest generated string, symbol or binary value
+TEXT_CHARS = ascii_letters + digits + punctuation + ' '
+SYMBOL_CHARS = ascii_letters + digits + '.-_'
+
+EDGE_CASE_PROBABILITY = 0.3 # Proportion of fuzz values chosen from the edge cases of their type rather than uniformly
+MAX_COMPOSITE_DEPTH = 3 # Deepest nesting of lists and maps in fuzz values
+MAX_COMPOSITE_SIZE = 8 # Largest number of items in a fuzz list or map
+# Code points at the boundaries of the UTF-8 and UTF-16 encodings, and the surrogates (which are not valid characters
+# on their own, but can be sent as AMQP chars)
+EDGE_CASE_CODE_POINTS = [0x1, 0x7f, 0x80, 0xff, 0x100, 0x7ff, 0x800, 0xd7ff, 0xd800, 0xdbff, 0xdc00, 0xdfff, 0xe000,
+                         0xfffd, 0xfffe, 0xffff, 0x10000, 0x10ffff]
+# Non-ASCII characters used in fuzz strings, from each length of their UTF-8 encoding
+# (a list, as characters outside the BMP are two surrogates long in narrow Python builds)
+NON_ASCII_TEXT_CHARS = [u'\u00e9', u'\u00ff', u'\u0100', u'\u07ff', u'\u0800', u'\u4e2d', u'\ufffd', u'\U00010000',
+                        u'\U0001f600', u'\U0010fffd']
+
+DEFAULT_SHRINK_LIMIT = 50 # Largest number of candidate values tried when shrinking a failing value
+HEX_VALUE_RE = re.compile(r'^(-?)0x([0-9a-f]+)$')
+
+
+class ValueGenerator(object):
+    """
+    Source of reproducible random test values. Each name (normally a test type) has its own sequence of random
+    numbers derived from the seed and that name only, so the values generated for a type do not depend on which
+    other types are being tested or in which order the values are generated.
+    """
+    def __init__(self, seed=DEFAULT_SEED):
+        self.seed = seed
+
+    def get_random(self, name):
+        """Return a new random number generator for name, which always produces the same sequence for a seed"""
+        return Random(int(sha1('%s:%s' % (self.seed, name)).hexdigest(), 16))
+
+
+def random_unsigned_int(rand, bits):
+    """Return a random unsigned integer of size bits as a hex string, for example '0x1f'"""
+    return '0x%x' % rand.getrandbits(bits)
+
+
+def random_signed_int(rand, bits):
+    """Return a random signed integer of size bits as a hex string, for example '-0x1f'"""
+    value = rand.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+    if value < 0:
+        return '-0x%x' % -value
+    return '0x%x' % value
+
+
+def random_float_bits(rand, exponent_bits, mantissa_bits):
+    """
+    Return the binary representation of a random finite IEEE-754 floating point number with the given exponent and
+    mantissa sizes as a zero-padded hex string, for example '0x40490fdb'. Infinities and NaNs are not generated, as
+    their support varies between clients (see the fixed float and double test values).
+    """
+    exponent = rand.randint(0, (1 << exponent_bits) - 2)
+    bits = (rand.getrandbits(1) << (exponent_bits + mantissa_bits)) | (exponent << mantissa_bits) | \
+           rand.getrandbits(mantissa_bits)
+    return '0x%0*x' % ((1 + exponent_bits + mantissa_bits) // 4, bits)
+
+
+def random_bits(rand, bits):
+    """Return random binary data of size bits as a zero-padded hex string, for example '0x0000ffff'"""
+    return '0x%0*x' % (bits // 4, rand.getrandbits(bits))
+
+
+def random_char(rand):
+    """
+    Return a random unicode code point (other than a surrogate) in the format of the char test values: the character
+    itself if it is a printable ASCII character (see TEXT_CHARS), otherwise as a hex string, for example '0x16b5'
+    """
+    code_point = rand.randint(0x1, 0x10ffff - 0x800)
+    if code_point >= 0xd800:
+        code_point += 0x800 # skip the surrogates 0xd800 - 0xdfff
+    if code_point < 0x80 and chr(code_point) in TEXT_CHARS:
+        return unichr(code_point)
+    return u'0x%x' % code_point
+
+
+def random_timestamp(rand):
+    """Return a random timestamp in milliseconds since the Unix epoch"""
+    return rand.randint(0, MAX_TIMESTAMP)
+
+
+def random_uuid(rand):
+    """Return a random (version 4) UUID as a string"""
+    return str(UUID(int=rand.getrandbits(128), version=4))
+
+
+def random_text(rand, chars=TEXT_CHARS, max_length=MAX_TEXT_LENGTH):
+    """Return a string of random length up to max_length made up of random characters from chars"""
+    return ''.join(rand.choice(chars) for _ in range(rand.randint(0, max_length)))
+
+
+def fuzz_int(rand, bits, signed):
+    """
+    Return a random integer of size bits as a hex string (see random_signed_int() and random_unsigned_int()). Values
+    are either chosen uniformly, or are edge cases: the limits of the type, values either side of 0 and of a random
+    power of 2.
+    """
+    if signed:
+        min_value, max_value = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    else:
+        min_value, max_value = 0, (1 << bits) - 1
+    if rand.random() < EDGE_CASE_PROBABILITY:
+        power = 1 << rand.randint(0, bits - 1)
+        value = min(max_value, max(min_value, rand.choice([min_value, min_value + 1, -1, 0, 1, max_value - 1,
+                                                           max_value, power - 1, power, power + 1, -power,
+                                                           -power - 1])))
+    else:
+        value = rand.randint(min_value, max_value)
+    if value < 0:
+        return '-0x%x' % -value
+    return '0x%x' % value
+
+
+def fuzz_float_bits(rand, exponent_bits, mantissa_bits, nan=True, infinity=True):
+    """
+    Return the binary representation of a random IEEE-754 floating point number with the given exponent and mantissa
+    sizes as a zero-padded hex string (see random_float_bits()). Edge cases are zeros, denormalized numbers, the
+    largest and smallest normalized numbers and (unless disabled) infinities and NaNs with random payload bits.
+    """
+    max_exponent = (1 << exponent_bits) - 1
+    mantissa = rand.getrandbits(mantissa_bits)
+    if rand.random() < EDGE_CASE_PROBABILITY:
+        edge_case_list = ['zero', 'denormalized', 'smallest', 'largest']
+        if nan:
+            edge_case_list.append('nan')
+        if infinity:
+            edge_case_list.append('infinity')
+        edge_case = rand.choice(edge_case_list)
+        if edge_case == 'zero':
+            exponent, mantissa = 0, 0
+        elif edge_case == 'denormalized':
+            exponent = 0
+        elif edge_case == 'smallest':
+            exponent, mantissa = 1, 0
+        elif edge_case == 'largest':
+            exponent, mantissa = max_exponent - 1, (1 << mantissa_bits) - 1
+        elif edge_case == 'infinity':
+            exponent, mantissa = max_exponent, 0
+        else: # NaN, with a random payload (quiet or signalling), which must not be 0
+            exponent, mantissa = max_exponent, mantissa or 1
+    else:
+        exponent = rand.randint(0, max_exponent - 1)
+    bits = (rand.getrandbits(1) << (exponent_bits + mantissa_bits)) | (exponent << mantissa_bits) | mantissa
+    return '0x%0*x' % ((1 + exponent_bits + mantissa_bits) // 4, bits)
+
+
+def fuzz_char(rand, surrogates=True):
+    """
+    Return a random unicode code point in the format of random_char(), or one of EDGE_CASE_CODE_POINTS (excluding the
+    surrogates if surrogates is False)
+    """
+    if rand.random() < EDGE_CASE_PROBABILITY:
+        code_point = rand.choice([code_point for code_point in EDGE_CASE_CODE_POINTS
+                                  if surrogates or not 0xd800 <= code_point <= 0xdfff])
+        if code_point < 0x80 and chr(code_point) in TEXT_CHARS:
+            return unichr(code_point)
+        return u'0x%x' % code_point
+    return random_char(rand)
+
+
+def fuzz_text(rand, max_length=MAX_TEXT_LENGTH):
+    """Return a unicode string of random length up to max_length, mostly of printable ASCII characters"""
+    return u''.join(rand.choice(NON_ASCII_TEXT_CHARS) if rand.random() < EDGE_CASE_PROBABILITY
+                    else unicode(rand.choice(TEXT_CHARS))
+                    for _ in range(rand.randint(0, max_length)))
+
+
+def fuzz_composite_item(rand):
+    """Return a random AMQP simple value in the 'type:value' format of the items of list and map test values"""
+    item_type = rand.choice(['none', 'boolean', 'ubyte', 'short', 'int', 'long', 'ulong', 'string', 'symbol'])
+    if item_type == 'none':
+        return 'none:'
+    if item_type == 'boolean':
+        return 'boolean:%s' % rand.choice(['True', 'False'])
+    if item_type == 'string':
+        return u'string:%s' % fuzz_text(rand, MAX_COMPOSITE_SIZE)
+    if item_type == 'symbol':
+        return 'symbol:%s' % random_text(rand, SYMBOL_CHARS, MAX_COMPOSITE_SIZE)
+    bits, signed = {'ubyte': (8, False), 'short': (16, True), 'int': (32, True), 'long': (64, True),
+                    'ulong': (64, False)}[item_type]
+    return '%s:%d' % (item_type, int(fuzz_int(rand, bits, signed), 16))
+
+
+def fuzz_list(rand, depth=MAX_COMPOSITE_DEPTH):
+    """Return a random list test value, nested up to depth levels of lists and maps"""
+    return [fuzz_composite_value(rand, depth - 1) for _ in range(rand.randint(0, MAX_COMPOSITE_SIZE))]
+
+
+def fuzz_map(rand, depth=MAX_COMPOSITE_DEPTH):
+    """Return a random map test value with string keys, nested up to depth levels of lists and maps"""
+    return dict((u'string:%s' % fuzz_text(rand, MAX_COMPOSITE_SIZE), fuzz_composite_value(rand, depth - 1))
+                for _ in range(rand.randint(0, MAX_COMPOSITE_SIZE)))
+
+
+def fuzz_composite_value(rand, depth):
+    """Return a random item of a list or map: a nested list or map (if depth allows) or a simple value"""
+    if depth > 0:
+        choice = rand.random()
+        if choice < 0.15:
+            return fuzz_list(rand, depth)
+        if choice < 0.3:
+            return fuzz_map(rand, depth)
+    return fuzz_composite_item(rand)
+
+
+def shrink_candidates(value, hex_digits=0):
+    """
+    Generate values smaller than value (in the formats of the test values), simplest first: lists and maps with
+    fewer or smaller nested lists and maps (their simple 'type:value' items are left as they are), hex numbers closer
+    to 0 (zero-padded to hex_digits digits), and shorter strings
+    """
+    if isinstance(value, list):
+        if len(value) > 0:
+            yield []
+        for length in [len(value) // 2, len(value) - 1]:
+            if 0 < length < len(value):
+                yield value[:length]
+                yield value[-length:]
+        for index, item in enumerate(value):
+            if isinstance(item, (list, dict)):
+                for smaller_item in shrink_candidates(item):
+                    yield value[:index] + [smaller_item] + value[index + 1:]
+    elif isinstance(value, dict):
+        if len(value) > 0:
+            yield {}
+        for key in sorted(value):
+            yield dict((other_key, other_value) for other_key, other_value in value.iteritems() if other_key != key)
+        for key in sorted(value):
+            if isinstance(value[key], (list, dict)):
+                for smaller_item in shrink_candidates(value[key]):
+                    smaller_value = dict(value)
+                    smaller_value[key] = smaller_item
+                    yield smaller_value
+    elif isinstance(value, basestring):
+        match = HEX_VALUE_RE.match(value)
+        if match is not None:
+            sign, hex_str = match.groups()
+            number = int(hex_str, 16)
+            for smaller_number in sorted(set([0, number // 2, number - 1])):
+                if smaller_number < number:
+                    yield '%s0x%0*x' % (sign if smaller_number > 0 else '', hex_digits, smaller_number)
+        elif len(value) > 0:
+            yield value[:0]
+            code_point_list = split_code_points(value)
+            half = len(code_point_list) // 2
+            for smaller_list in [code_point_list[:half], code_point_list[half:], code_point_list[:-1],
+                                 code_point_list[1:]]:
+                if 0 < len(smaller_list) < len(code_point_list):
+                    yield value[:0].join(smaller_list)
+
+
+def split_code_points(text):
+    """
+    Return the list of the characters of text, keeping together the surrogate pairs which encode a single code point
+    in a unicode string of a narrow Python build, so that shrinking a string never splits a character
+    """
+    if not isinstance(text, unicode):
+        return list(text)
+    code_point_list = []
+    for char in text:
+        if u'\udc00' <= char <= u'\udfff' and len(code_point_list) > 0 and len(code_point_list[-1]) == 1 and \
+           u'\ud800' <= code_point_list[-1] <= u'\udbff':
+            code_point_list[-1] += char
+        else:
+            code_point_list.append(char)
+    return code_point_list
+
+
+def shrink_value(value, fails, hex_digits=0, limit=DEFAULT_SHRINK_LIMIT, deadline=None):
+    """
+    Return a tuple (smallest value, number of candidates tried) of the smallest value derived from value (a failing
+    test value) for which function fails also returns True, trying at most limit candidate values and, if deadline
+    (a time as returned by time.time()) is given, no more candidates once it has passed. At each step, the first
+    candidate from shrink_candidates() which still fails replaces the value, until none fails.
+    """
+    num_tried = 0
+    shrunk = True
+    while shrunk and num_tried < limit:
+        shrunk = False
+        for candidate in shrink_candidates(value, hex_digits):
+            if num_tried >= limit or (deadline is not None and time() >= deadline):
+                break
+            num_tried += 1
+            if fails(candidate):
+                value = candidate
+                shrunk = True
+                break
+    return value, num_tried
@@ -0,0 +1,106 @@
+"""
+Tests of the pure-Python Java serialization codec (qpid_interop_test.java_obj_serialization) against the Java utility
+it replaces, run through the JVM codec (qpid_interop_test.java_obj_codec.JavaObjCodec). The tests need java 19 or
+later (which prints Float and Double values as the pure-Python codec does) and JavaObjUtils.jar, whose class path is
+taken from environment variable QIT_JAVA_OBJ_UTILS_CLASSPATH (default: utils/target/JavaObjUtils.jar). They are
+skipped if either is missing, or if the qpid_interop_test package cannot be imported (it needs proton). Run from the
+top of the source tree:
+
+    python -m unittest discover -s src/python/tests
+"""
+
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+#
+
+import unittest
+
+from distutils.spawn import find_executable
+from os import getenv, path
+
+try:
+    from qpid_interop_test.java_obj_codec import JavaObjCodec
+    from qpid_interop_test.java_obj_serialization import deserialize_java_obj, serialize_java_obj, JAVA_CLASS_MAP, \
+                                                         JAVA_STRING_CLASS, VERIFICATION_VALUE_MAP
+    from qpid_interop_test.value_compare import abbreviate
+    IMPORT_ERROR = None
+except ImportError as exc: # The tests are skipped, see JavaObjSerializationTestCase.setUpClass()
+    IMPORT_ERROR = exc
+    VERIFICATION_VALUE_MAP = {}
+
+JAVA_OBJ_UTILS_CLASSPATH = getenv('QIT_JAVA_OBJ_UTILS_CLASSPATH', path.join('utils', 'target', 'JavaObjUtils.jar'))
+
+
+class JavaObjSerializationTestCase(unittest.TestCase):
+    """
+    Test case which compares the serialization and deserialization of each value of VERIFICATION_VALUE_MAP by the
+    pure-Python codec with those of the Java utility. A test method is created for each value (see
+    add_test_method()).
+    """
+
+    java_obj_codec = None
+
+    @classmethod
+    def setUpClass(cls):
+        if IMPORT_ERROR is not None:
+            raise unittest.SkipTest('qpid_interop_test cannot be imported: %s' % IMPORT_ERROR)
+        if find_executable('java') is None:
+            raise unittest.SkipTest('java not found')
+        if not path.isfile(JAVA_OBJ_UTILS_CLASSPATH):
+            raise unittest.SkipTest('%s not found (set QIT_JAVA_OBJ_UTILS_CLASSPATH)' % JAVA_OBJ_UTILS_CLASSPATH)
+        cls.java_obj_codec = JavaObjCodec(JAVA_OBJ_UTILS_CLASSPATH)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.java_obj_codec is not None:
+            cls.java_obj_codec.close()
+            cls.java_obj_codec = None
+
+    def test_verification_classes(self):
+        """Check that VERIFICATION_VALUE_MAP has values of each Java class supported by the pure-Python codec"""
+        self.assertEqual(set(VERIFICATION_VALUE_MAP), set(JAVA_CLASS_MAP) | set([JAVA_STRING_CLASS]))
+
+    def check_value(self, java_class_name, ctor_arg_str):
+        """
+        Check that the pure-Python codec serializes the Java object of class java_class_name constructed from
+        ctor_arg_str to the same bytes as the Java utility, and deserializes those bytes to the same string
+        """
+        java_class_str = u'%s:%s' % (java_class_name, ctor_arg_str)
+        java_obj_bytes = self.java_obj_codec.get_java_obj_bytes(java_class_str)
+        self.assertEqual(serialize_java_obj(java_class_name, ctor_arg_str), java_obj_bytes,
+                         'Serialization of %s differs from Java' % abbreviate(java_class_str))
+        self.assertEqual(u'%s:%s' % deserialize_java_obj(java_obj_bytes),
+                         self.java_obj_codec.get_java_obj_str(java_obj_bytes),
+                         'Deserialization of %s differs from Java' % abbreviate(java_class_str))
+
+
+def add_test_method(java_class_name, value_index, ctor_arg_str):
+    """Add a test method to JavaObjSerializationTestCase for value ctor_arg_str of class java_class_name"""
+    def inner_test_method(self):
+        self.check_value(java_class_name, ctor_arg_str)
+    inner_test_method.__name__ = 'test_%s_%d' % (java_class_name.split('.')[-1], value_index)
+    setattr(JavaObjSerializationTestCase, inner_test_method.__name__, inner_test_method)
+
+
+for JAVA_CLASS_NAME, CTOR_ARG_STR_LIST in VERIFICATION_VALUE_MAP.iteritems():
+    for VALUE_INDEX, CTOR_ARG_STR in enumerate(CTOR_ARG_STR_LIST):
+        add_test_method(JAVA_CLASS_NAME, VALUE_INDEX, CTOR_ARG_STR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+/**
+ * Licensed to the Apache Software Foundation (ASF) under one or more
+ * contributor license agreements.  See the NOTICE file distributed with
+ * this work for additional information regarding copyright ownership.
+ * The ASF licenses this file to You under the Apache License, Version 2.0
+ * (the "License"); you may not use this file except in compliance with
+ * the License.  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+package org.apache.qpid.interop_test.obj_util;
+
+import java.io.BufferedReader;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * Long-running version of JavaObjToBytes and BytesToJavaObj, which performs any number of conversions in a single JVM
+ * so that the JVM start-up time is paid once per shim rather than once per value. Requests are read from stdin and
+ * responses written to stdout, one line each, in order:
+ *
+ *   request "E <hex>": serialize the Java object described by hex, the UTF-8 encoded string
+ *                      "<java_class_name>:<ctor_arg_str>" (as the argument of JavaObjToBytes)
+ *   request "D <hex>": deserialize the Java object serialized in the bytes hex (as the argument of BytesToJavaObj)
+ *   response "OK <hex>": the serialized object (E), or the UTF-8 encoded string "<java_class_name>:<value>" (D)
+ *   response "ERR <message>": the conversion failed
+ *
+ * The hex encoding keeps every request and response on a single line whatever the values contain. Diagnostics
+ * printed by the converters are sent to stderr so that they cannot be mistaken for responses. The server exits at
+ * the end of stdin.
+ */
+public class ObjCodecServer {
+    private final BufferedReader in;
+    private final PrintStream out;
+
+    public ObjCodecServer(BufferedReader in, PrintStream out) {
+        this.in = in;
+        this.out = out;
+    }
+
+    public void run() throws IOException {
+        String request;
+        while ((request = in.readLine()) != null) {
+            out.println(handleRequest(request));
+            out.flush();
+        }
+    }
+
+    protected String handleRequest(String request) {
+        int spaceIndex = request.indexOf(' ');
+        if (spaceIndex < 0) {
+            return "ERR Malformed request: " + request;
+        }
+        String command = request.substring(0, spaceIndex);
+        String arg = request.substring(spaceIndex + 1);
+        try {
+            if (command.equals("E")) {
+                String javaClassStr = new String(hexStrToByteArray(arg), StandardCharsets.UTF_8);
+                int colonIndex = javaClassStr.indexOf(":");
+                if (colonIndex < 0) {
+                    return "ERR Incorrect argument format: " + javaClassStr;
+                }
+                JavaObjToBytes jotb = new JavaObjToBytes(javaClassStr.substring(0, colonIndex),
+                                                         javaClassStr.substring(colonIndex+1));
+                byte[] bytes = jotb.run();
+                if (bytes == null) {
+                    return "ERR Unable to serialize " + javaClassStr;
+                }
+                return "OK " + byteArrayToHexStr(bytes);
+            }
+            if (command.equals("D")) {
+                BytesToJavaObj btjo = new BytesToJavaObj(arg);
+                return "OK " + byteArrayToHexStr(btjo.run().getBytes(StandardCharsets.UTF_8));
+            }
+            return "ERR Unknown command: " + command;
+        } catch (RuntimeException e) {
+            return "ERR " + e.toString().replace('\n', ' ');
+        }
+    }
+
+    protected static byte[] hexStrToByteArray(String hexStr) {
+        int len = hexStr.length();
+        byte[] data = new byte[len / 2];
+        for(int i=0; i<len; i+=2) {
+            data[i/2] = (byte)((Character.digit(hexStr.charAt(i), 16) << 4) + Character.digit(hexStr.charAt(i+1), 16));
+        }
+        return data;
+    }
+
+    protected static String byteArrayToHexStr(byte[] bytes) {
+        StringBuilder sb = new StringBuilder(bytes.length * 2);
+        for (byte b: bytes) {
+            sb.append(String.format("%02x", b));
+        }
+        return sb.toString();
+    }
+
+    // ========= main ==========
+
+    public static void main(String[] args) {
+        if (args.length != 0) {
+            System.out.println("ObjCodecServer: Incorrect argument count");
+            System.out.println("ObjCodecServer: Expected no arguments, requests are read from stdin");
+            System.exit(1);
+        }
+        PrintStream responseStream = System.out;
+        System.setOut(System.err);
+        BufferedReader requestReader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        try {
+            new ObjCodecServer(requestReader, responseStream).run();
+        } catch (IOException e) {
+            e.printStackTrace(System.err);
+            System.exit(1);
+        }
+    }
+}